@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Compares allocations of the old copying doc accessors against DocView.
+
+Simulates what the cluster table does on every frame: reading the namespace, kind,
+name and local port of every resource.
+
+Usage: python -m benchmarks.doc_view [document count] [frame count]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from benchmarks.serialization import make_doc
+from devexy.k8s.models.doc_view import DocView
+from devexy.settings import LOCAL_PORT_ANNOTATION
+
+
+# The accessors as they were, copying every mapping they return
+def _get_metadata(doc: dict):
+  return dict(doc.get("metadata", {}))
+
+
+def _get_annotations(doc: dict):
+  return dict(_get_metadata(doc).get("annotations", {}))
+
+
+def _get_row_values(doc: dict):
+  local_port = _get_annotations(doc).get(LOCAL_PORT_ANNOTATION)
+  return (
+    str(_get_metadata(doc).get("namespace", "default")),
+    str(doc.get("kind", "Unknown")),
+    str(_get_metadata(doc).get("name", "unknown")),
+    int(local_port) if local_port is not None else None,
+  )
+
+
+def measure(label: str, render):
+  tracemalloc.start()
+  start = time.perf_counter()
+  render()
+  elapsed = time.perf_counter() - start
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  print(f"{label:<24} {elapsed * 1000:>10.1f} ms {peak / 1024:>10.1f} KiB peak")
+  return elapsed
+
+
+def main(count: int = 1000, frames: int = 100):
+  docs = [make_doc(i) for i in range(count)]
+  views = [DocView(doc) for doc in docs]
+
+  def render_copying():
+    for _ in range(frames):
+      _ = [_get_row_values(doc) for doc in docs]
+
+  def render_views():
+    for _ in range(frames):
+      _ = [(v.namespace, v.kind, v.name, v.local_port) for v in views]
+
+  print(f"{count} documents, {frames} frames\n")
+  baseline = measure("copying accessors", render_copying)
+  candidate = measure("DocView", render_views)
+  print(f"\nspeedup: {baseline / candidate:.1f}x")
+
+
+if __name__ == "__main__":
+  main(*(int(arg) for arg in sys.argv[1:]))
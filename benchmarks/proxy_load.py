@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""Measures requests per second through the local mode reverse proxy.
+
+Serves a small response from a local backend, and loads it directly, through nginx
+with the proxy configuration as it was (a fresh upstream connection per request),
+and through nginx with the current configuration (kept alive upstream connections).
+The proxies need `nginx` on the PATH, and are skipped without it.
+
+The load comes from one Python process, so compare the runs against each other
+rather than against the numbers of a dedicated load generator.
+
+Usage: python -m benchmarks.proxy_load [seconds] [connections]
+"""
+
+import asyncio
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from devexy import settings
+from devexy.k8s.utils import get_reverse_proxy_config
+
+BODY = b"ok\n" * 64
+RESPONSE = (
+  b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n"
+  b"Content-Length: %d\r\n\r\n" % len(BODY) + BODY
+)
+REQUEST = b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n"
+
+
+# The proxy configuration as it was, without upstream keepalive
+def _get_legacy_config(local_port: int, container_port: int) -> str:
+  return (
+    "events {}\n"
+    "http {\n"
+    "  server {\n"
+    f"    listen {container_port};\n"
+    "    location / {\n"
+    f"      proxy_pass http://127.0.0.1:{local_port};\n"
+    "      proxy_set_header Host $host;\n"
+    "      proxy_set_header X-Real-IP $remote_addr;\n"
+    "      proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;\n"
+    "      proxy_set_header X-Forwarded-Proto $scheme;\n"
+    "    }\n"
+    "  }\n"
+    "}\n"
+  )
+
+
+def _free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+
+async def _serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+  """Answers requests until the client closes, honouring Connection: close."""
+  try:
+    while head := await reader.readuntil(b"\r\n\r\n"):
+      writer.write(RESPONSE)
+      await writer.drain()
+      if b"connection: close" in head.lower():
+        break
+  except (asyncio.IncompleteReadError, ConnectionError):
+    pass
+  finally:
+    writer.close()
+
+
+async def _client(port: int, deadline: float) -> int:
+  reader, writer = await asyncio.open_connection("127.0.0.1", port)
+  count = 0
+  try:
+    while time.monotonic() < deadline:
+      writer.write(REQUEST)
+      head = await reader.readuntil(b"\r\n\r\n")
+      length = 0
+      for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+          length = int(line.split(b":", 1)[1])
+      await reader.readexactly(length)
+      count += 1
+  finally:
+    writer.close()
+  return count
+
+
+async def _load(port: int, seconds: float, connections: int) -> float:
+  deadline = time.monotonic() + seconds
+  started = time.perf_counter()
+  counts = await asyncio.gather(*(_client(port, deadline) for _ in range(connections)))
+  return sum(counts) / (time.perf_counter() - started)
+
+
+async def _wait_for_port(port: int, timeout: float = 5.0):
+  deadline = time.monotonic() + timeout
+  while True:
+    try:
+      _, writer = await asyncio.open_connection("127.0.0.1", port)
+      writer.close()
+      return
+    except OSError:
+      if time.monotonic() > deadline:
+        raise
+      await asyncio.sleep(0.01)
+
+
+async def _measure_proxy(
+  label: str, config: str, port: int, seconds: float, connections: int
+):
+  with tempfile.TemporaryDirectory() as prefix:
+    # nginx resolves its default log and temp paths against the prefix
+    (Path(prefix) / "logs").mkdir()
+    config_file = Path(prefix) / "nginx.conf"
+    config_file.write_text(config)
+    process = await asyncio.create_subprocess_exec(
+      "nginx",
+      "-p",
+      prefix,
+      "-c",
+      str(config_file),
+      "-g",
+      f"daemon off; pid {prefix}/nginx.pid; error_log stderr error;",
+      stdout=subprocess.DEVNULL,
+    )
+    try:
+      await _wait_for_port(port)
+      report(label, await _load(port, seconds, connections))
+    finally:
+      process.terminate()
+      await process.wait()
+
+
+def report(label: str, rate: float):
+  print(f"{label:<24} {rate:>10.0f} req/s")
+
+
+async def run(seconds: float, connections: int):
+  backend = await asyncio.start_server(_serve, "127.0.0.1", 0)
+  local_port = backend.sockets[0].getsockname()[1]
+  print(f"{connections} connections, {seconds:.0f}s per run\n")
+
+  report("direct", await _load(local_port, seconds, connections))
+  if shutil.which("nginx") is None:
+    print("\nnginx not found on PATH, skipping the proxies", file=sys.stderr)
+  else:
+    port = _free_port()
+    await _measure_proxy(
+      "proxy (as it was)",
+      _get_legacy_config(local_port, port),
+      port,
+      seconds,
+      connections,
+    )
+    # One worker, like the configuration as it was
+    settings.configure(PROXY_WORKER_PROCESSES="1")
+    await _measure_proxy(
+      "proxy (tuned)",
+      get_reverse_proxy_config(local_port, local_host="127.0.0.1", container_port=port),
+      port,
+      seconds,
+      connections,
+    )
+
+  backend.close()
+  await backend.wait_closed()
+
+
+def main(seconds: float = 5, connections: int = 32):
+  asyncio.run(run(float(seconds), int(connections)))
+
+
+if __name__ == "__main__":
+  main(*sys.argv[1:])
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Compares the serialization layer against plain PyYAML on a 1,000-document manifest.
+
+Usage: python -m benchmarks.serialization [document count]
+"""
+
+import json
+import sys
+import timeit
+
+import yaml
+
+from devexy.utils import serialization
+
+
+def make_doc(i: int) -> dict:
+  doc = {
+    "apiVersion": "apps/v1",
+    "kind": "Deployment",
+    "metadata": {
+      "name": f"app-{i}",
+      "namespace": f"ns-{i % 40}",
+      "labels": {"app": f"app-{i}", "tier": "backend"},
+      "annotations": {"devexy/local-port": str(8000 + i)},
+    },
+    "spec": {
+      "replicas": 1,
+      "selector": {"matchLabels": {"app": f"app-{i}"}},
+      "template": {
+        "metadata": {"labels": {"app": f"app-{i}"}},
+        "spec": {
+          "containers": [
+            {
+              "name": f"app-{i}",
+              "image": f"registry.local/app-{i}:1.0.{i}",
+              "ports": [{"containerPort": 8080, "protocol": "TCP"}],
+              "env": [{"name": f"VAR_{j}", "value": str(j)} for j in range(10)],
+              "resources": {
+                "limits": {"cpu": "500m", "memory": "256Mi"},
+                "requests": {"cpu": "100m", "memory": "128Mi"},
+              },
+            }
+          ]
+        },
+      },
+    },
+  }
+  annotation = json.dumps(doc)
+  doc["metadata"]["annotations"]["kubectl.kubernetes.io/last-applied-configuration"] = (
+    annotation
+  )
+  return doc
+
+
+def measure(label: str, baseline, candidate, number: int = 3):
+  baseline_time = min(timeit.repeat(baseline, number=1, repeat=number))
+  candidate_time = min(timeit.repeat(candidate, number=1, repeat=number))
+  print(
+    f"{label:<32} {baseline_time * 1000:>10.1f} ms {candidate_time * 1000:>10.1f} ms"
+    f" {baseline_time / candidate_time:>8.1f}x"
+  )
+
+
+def main(count: int = 1000):
+  docs = [make_doc(i) for i in range(count)]
+  manifest = "---\n".join(yaml.dump(doc) for doc in docs)
+  annotations = [
+    doc["metadata"]["annotations"]["kubectl.kubernetes.io/last-applied-configuration"]
+    for doc in docs
+  ]
+
+  print(f"{count} documents, libyaml: {yaml.__with_libyaml__}, ", end="")
+  print(f"orjson: {serialization.orjson is not None}\n")
+  print(f"{'':<32} {'PyYAML':>13} {'devexy':>13} {'speedup':>9}")
+
+  measure(
+    "load manifest",
+    lambda: list(yaml.safe_load_all(manifest)),
+    lambda: list(serialization.load_yaml_all(manifest)),
+  )
+  measure(
+    "dump documents",
+    lambda: [yaml.dump(doc, sort_keys=True, default_flow_style=False) for doc in docs],
+    lambda: [serialization.dump_yaml(doc) for doc in docs],
+  )
+  measure(
+    "parse last-applied annotations",
+    lambda: [yaml.safe_load(annotation) for annotation in annotations],
+    lambda: [serialization.load_json(annotation) for annotation in annotations],
+  )
+  measure(
+    "serialize for hashing",
+    lambda: [yaml.dump(doc, sort_keys=True, default_flow_style=False) for doc in docs],
+    lambda: [serialization.canonicalize(doc) for doc in docs],
+  )
+
+
+if __name__ == "__main__":
+  main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Measures how long the devexy CLI takes to start, for commands that should be instant.
+
+Usage: python -m benchmarks.startup [run count]
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = (
+  ["version"],
+  ["--help"],
+)
+# How much longer than a bare interpreter a command may take to start
+BUDGET_MS = 100
+
+
+def measure(args: list[str], runs: int) -> list[float]:
+  timings = []
+  for _ in range(runs):
+    start = time.perf_counter()
+    subprocess.run(
+      [sys.executable, "-m", "devexy.main", *args],
+      check=True,
+      stdout=subprocess.DEVNULL,
+    )
+    timings.append((time.perf_counter() - start) * 1000)
+  return timings
+
+
+def main(runs: int = 10):
+  baseline = statistics.median(measure_interpreter(runs))
+  print(f"{'command':<24} {'median':>10} {'min':>10} {'overhead':>11}")
+  print(f"{'(bare interpreter)':<24} {baseline:>7.1f} ms")
+  over_budget = False
+  for args in COMMANDS:
+    timings = measure(args, runs)
+    median = statistics.median(timings)
+    overhead = median - baseline
+    over_budget |= overhead > BUDGET_MS
+    print(
+      f"{' '.join(args):<24} {median:>7.1f} ms {min(timings):>7.1f} ms"
+      f" {overhead:>8.1f} ms"
+    )
+  if over_budget:
+    print(
+      f"\nSome commands took over {BUDGET_MS} ms longer to start than the interpreter"
+    )
+    sys.exit(1)
+
+
+def measure_interpreter(runs: int) -> list[float]:
+  timings = []
+  for _ in range(runs):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    timings.append((time.perf_counter() - start) * 1000)
+  return timings
+
+
+if __name__ == "__main__":
+  main(*(int(arg) for arg in sys.argv[1:]))
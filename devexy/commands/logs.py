@@ -1,24 +1,70 @@
-import os
+import collections
+import logging
+import re
 import signal
 import time
 
 import typer
 
-from devexy.utils.logging import LOG_FILE
+from devexy.utils.log_files import follow_lines, tail_lines
+from devexy.utils.log_search import parse_time, search_logs
+from devexy.utils.logging import get_log_file
 
 app = typer.Typer()
 
 
 @app.command()
 def logs(
-  lines: int = typer.Option(20, help="Number of lines to display."),
+  lines: int = typer.Option(
+    None,
+    help="Number of lines to display, 20 by default. When filtering, the number of"
+    " records, all by default.",
+  ),
   follow: bool = typer.Option(False, "--follow", "-f", help="Follow the log file."),
-  update_interval: float = typer.Option(0.1, help="Update interval in seconds."),
+  update_interval: float = typer.Option(
+    0.5, help="Longest wait between checks for new lines, in seconds."
+  ),
+  since: str = typer.Option(
+    None, help="Only records since a date and time, or a duration ago like 15m."
+  ),
+  until: str = typer.Option(
+    None, help="Only records until a date and time, or a duration ago like 15m."
+  ),
+  level: str = typer.Option(None, help="Only records of this level or above."),
+  logger: str = typer.Option(None, help="Only records of this logger or its children."),
+  grep: str = typer.Option(None, help="Only records containing this text."),
+  regex: bool = typer.Option(False, help="Treat --grep as a regular expression."),
 ):
   """
   Display the last N lines of the log file, or follow the log file.
+
+  Filtering searches the rotated log files too.
   """
-  if follow:
+  log_file = get_log_file()
+  if any((since, until, level, logger, grep)):
+    try:
+      min_level = None
+      if level:
+        min_level = logging.getLevelName(level.upper())
+        if not isinstance(min_level, int):
+          raise typer.BadParameter(f"Unknown level: {level}", param_hint="--level")
+      records = search_logs(
+        log_file,
+        since=parse_time(since) if since else None,
+        until=parse_time(until) if until else None,
+        level=min_level,
+        logger_name=logger,
+        pattern=grep,
+        regex=regex,
+      )
+      if lines:
+        records = collections.deque(records, maxlen=lines)
+      for record in records:
+        typer.echo(record)
+    except (ValueError, re.error) as e:
+      typer.echo(f"Invalid filter: {e}", err=True)
+      raise typer.Exit(1)
+  elif follow:
     try:
       stop_flag = False
       line_count = 0
@@ -33,26 +79,20 @@ def logs(
 
       signal.signal(signal.SIGINT, signal_handler)
 
-      with open(LOG_FILE, "r") as f:
-        f.seek(0, os.SEEK_END)
-        while not stop_flag:
-          line = f.readline()
-          if line:
-            typer.echo(line.strip())
-            line_count += 1
-          time.sleep(update_interval)
+      for batch in follow_lines(
+        log_file, stop=lambda: stop_flag, max_interval=update_interval
+      ):
+        typer.echo("\n".join(batch))
+        line_count += len(batch)
     except FileNotFoundError:
-      typer.echo(f"Log file not found: {LOG_FILE}", err=True)
+      typer.echo(f"Log file not found: {log_file}", err=True)
     except Exception as e:
       typer.echo(f"An error occurred: {e}", err=True)
   else:
     try:
-      with open(LOG_FILE, "r") as f:
-        log_lines = f.readlines()
-        last_lines = log_lines[-lines:]
-        for line in last_lines:
-          typer.echo(line.strip())
+      for line in tail_lines(log_file, lines or 20):
+        typer.echo(line)
     except FileNotFoundError:
-      typer.echo(f"Log file not found: {LOG_FILE}", err=True)
+      typer.echo(f"Log file not found: {log_file}", err=True)
     except Exception as e:
       typer.echo(f"An error occurred: {e}", err=True)
@@ -0,0 +1,39 @@
+import typer
+from rich.table import Table
+
+from devexy.utils.cli import console
+from devexy.utils.tool_stats import get_stats_file, load_calls, summarize
+
+app = typer.Typer()
+
+
+@app.command()
+def stats(
+  sessions: int = typer.Option(
+    10, help="Number of recent sessions to include, 0 for all."
+  ),
+  tool: str = typer.Option(None, help="Only show calls to this tool."),
+):
+  """Show the latency of external tool calls, per subcommand."""
+  calls = load_calls()
+  if tool:
+    calls = [call for call in calls if call.get("tool") == tool]
+  summaries = summarize(calls, sessions=sessions or None)
+  if not summaries:
+    typer.echo(f"No tool calls recorded in {get_stats_file()}")
+    return
+
+  table = Table(title=f"Tool calls over the last {sessions or 'all'} sessions")
+  table.add_column("Tool")
+  table.add_column("Subcommand")
+  for column in ("Calls", "Failures", "p50 ms", "p95 ms", "p99 ms"):
+    table.add_column(column, justify="right")
+  for summary in summaries:
+    table.add_row(
+      summary["tool"],
+      summary["subcommand"],
+      str(summary["calls"]),
+      str(summary["failures"]),
+      *(f"{summary[p] * 1000:.1f}" for p in ("p50", "p95", "p99")),
+    )
+  console.print(table)
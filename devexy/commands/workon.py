@@ -1,9 +1,11 @@
+import asyncio
+import bisect
+import datetime
+import signal
+import sys
 import threading
-import time
-from os import sep
 from pathlib import Path
-from turtle import st
-from typing import Iterator, List
+from typing import Any, Callable, Iterator, List
 
 import typer
 import yaml
@@ -11,26 +13,235 @@ from blessed import Terminal
 
 from devexy import settings
 from devexy.exceptions import ToolError
-from devexy.k8s.models.resource import Resource
+from devexy.k8s.models.doc_view import DocView
+from devexy.k8s.models.resource import Resource, apply_resources
+from devexy.k8s.tunnel import TunnelForward
 from devexy.k8s.utils import (
   SCALABLE_KINDS,
   clear_cache,
-  get_key,
-  get_last_applied_configuration,
   get_replicas,
   yaml_to_dicts,
 )
-from devexy.settings import KUSTOMIZE_OVERLAY_DIR, KUSTOMIZE_ROOT
 from devexy.tools.kubectl import kubectl
 from devexy.tools.kustomize import kustomize
 from devexy.utils.cli import begin, fail, ok, say
 from devexy.utils.logging import get_logger
+from devexy.utils.threading import cleanup
 
 logger = get_logger(__name__)
 app = typer.Typer()
 term = Terminal()
 
 
+# A rendered row: whether it is selected, and the text of each cell
+Row = tuple[bool, tuple[str, ...]]
+
+
+def diff_frames(previous: list[Row], current: list[Row]) -> Iterator[tuple[int, int]]:
+  """
+  Finds what changed between two frames.
+
+  Yields:
+      (row, cell) pairs to redraw, where cell is -1 when the whole row must be redrawn.
+  """
+  for y, row in enumerate(current):
+    if y >= len(previous) or previous[y][0] != row[0]:
+      yield y, -1
+      continue
+    for x, (old, new) in enumerate(zip(previous[y][1], row[1])):
+      if old != new:
+        yield y, x
+
+
+def fit_cell(text: str, width: int) -> str:
+  """
+  Centers text in exactly `width` terminal columns, cutting it if it is longer.
+  Emoji and other wide characters take two columns, so they are measured by the
+  terminal rather than counted.
+  """
+  if text.isascii():
+    return f"{text[:width]:^{width}}"
+  return term.ljust(term.truncate(term.center(text, width), width), width)
+
+
+def format_duration(seconds: float) -> str:
+  """Formats a duration compactly, to the largest two units, like 5s, 3m20s or 2h5m."""
+  seconds = int(seconds)
+  if seconds < 60:
+    return f"{seconds}s"
+  minutes, seconds = divmod(seconds, 60)
+  if minutes < 60:
+    return f"{minutes}m{seconds:02d}s"
+  hours, minutes = divmod(minutes, 60)
+  if hours < 24:
+    return f"{hours}h{minutes:02d}m"
+  days, hours = divmod(hours, 24)
+  return f"{days}d{hours:02d}h"
+
+
+def format_latency(seconds: float) -> str:
+  """Formats a short wait precisely, like 85ms or 2.4s, and longer ones like 3m20s."""
+  if seconds < 1:
+    return f"{seconds * 1000:.0f}ms"
+  if seconds < 60:
+    return f"{seconds:.1f}s"
+  return format_duration(seconds)
+
+
+def format_bytes(count: float) -> str:
+  """Formats a byte count compactly, like 512B, 1.5K or 20.0M."""
+  for unit in ("B", "K", "M"):
+    if count < 1024:
+      return f"{count:.0f}{unit}" if unit == "B" else f"{count:.1f}{unit}"
+    count /= 1024
+  return f"{count:.1f}G"
+
+
+class Viewport:
+  """Tracks the selected row, and the slice of rows that fits on screen around it."""
+
+  def __init__(self, row_count: int = 0, height: int = 1):
+    self.row_count = row_count
+    self.height = max(1, height)
+    self.selected = 0
+    self.offset = 0
+
+  @property
+  def visible(self) -> range:
+    return range(self.offset, min(self.offset + self.height, self.row_count))
+
+  def resize(self, height: int = None, row_count: int = None):
+    if height is not None:
+      self.height = max(1, height)
+    if row_count is not None:
+      self.row_count = row_count
+    self.select(self.selected)
+
+  def select(self, index: int):
+    """Selects a row, scrolling as little as possible to keep it visible."""
+    self.selected = min(max(index, 0), max(self.row_count - 1, 0))
+    if self.selected < self.offset:
+      self.offset = self.selected
+    elif self.selected >= self.offset + self.height:
+      self.offset = self.selected - self.height + 1
+    self.offset = min(max(self.offset, 0), max(self.row_count - self.height, 0))
+
+  def move(self, delta: int):
+    """Moves the selection by one or more rows, wrapping around at either end."""
+    if self.row_count:
+      self.select((self.selected + delta) % self.row_count)
+
+  def page(self, pages: int):
+    self.select(self.selected + pages * self.height)
+
+  def home(self):
+    self.select(0)
+
+  def end(self):
+    self.select(self.row_count - 1)
+
+
+class TableIndex:
+  """
+  The resources shown in the table, filtered by a search query and kept sorted.
+
+  A change to one resource moves only that resource, found by binary search,
+  instead of filtering and sorting every resource again.
+  """
+
+  def __init__(
+    self,
+    resources: list[Resource],
+    sort_key: Callable[[Resource], Any] = lambda res: (),
+    search_text: Callable[[Resource], str] = str,
+  ):
+    self.resources = list(resources)
+    self.sort_key = sort_key
+    self.search_text = search_text
+    self.query = ""
+    self.reverse = False
+    self.lock = threading.RLock()
+    # Ties are broken by the original order, so entries never compare resources
+    self._order = {res: i for i, res in enumerate(self.resources)}
+    self._entries: dict[Resource, tuple] = {}
+    self._sorted: list[tuple] = []
+    self.rebuild()
+
+  def __len__(self):
+    return len(self._sorted)
+
+  def __getitem__(self, position: int) -> Resource:
+    if not 0 <= position < len(self._sorted):
+      raise IndexError(position)
+    if self.reverse:
+      position = len(self._sorted) - 1 - position
+    return self.resources[self._sorted[position][1]]
+
+  def _matches(self, resource: Resource) -> bool:
+    return not self.query or self.query in self.search_text(resource).lower()
+
+  def _entry(self, resource: Resource) -> tuple | None:
+    if not self._matches(resource):
+      return None
+    return (self.sort_key(resource), self._order[resource])
+
+  def rebuild(self):
+    with self.lock:
+      entries = ((res, self._entry(res)) for res in self.resources)
+      self._entries = {res: entry for res, entry in entries if entry is not None}
+      self._sorted = sorted(self._entries.values())
+
+  def update(self, resource: Resource) -> bool:
+    """Re-indexes a resource after it changed. Returns whether it moved."""
+    with self.lock:
+      if resource not in self._order:
+        return False
+      entry = self._entry(resource)
+      previous = self._entries.get(resource)
+      if entry == previous:
+        return False
+      if previous is not None:
+        del self._sorted[bisect.bisect_left(self._sorted, previous)]
+        del self._entries[resource]
+      if entry is not None:
+        bisect.insort(self._sorted, entry)
+        self._entries[resource] = entry
+      return True
+
+  def position(self, resource: Resource) -> int | None:
+    """Returns where a resource is shown, or None if it is filtered out."""
+    with self.lock:
+      entry = self._entries.get(resource)
+      if entry is None:
+        return None
+      position = bisect.bisect_left(self._sorted, entry)
+      return len(self._sorted) - 1 - position if self.reverse else position
+
+  def sort(self, sort_key: Callable[[Resource], Any], reverse: bool = False):
+    with self.lock:
+      self.sort_key = sort_key
+      self.reverse = reverse
+      self.rebuild()
+
+  def search(self, query: str):
+    query = query.lower()
+    with self.lock:
+      narrowing = query.startswith(self.query)
+      self.query = query
+      if not narrowing:
+        self.rebuild()
+        return
+      # A longer query can only drop resources, which keeps the rest in order
+      matching = {
+        res: entry for res, entry in self._entries.items() if self._matches(res)
+      }
+      if len(matching) < len(self._entries):
+        self._entries = matching
+        self._sorted = [
+          entry for entry in self._sorted if self.resources[entry[1]] in matching
+        ]
+
+
 class ClusterTable:
   columns = (
     ("Namespace", 15),
@@ -38,18 +249,54 @@ class ClusterTable:
     ("Name", 20),
     ("Local Port", 15),
     ("Status", 15),
+    ("Forward", 15),
+    ("Ready", 16),
   )
+  header_height = 2
+  # Forward uptimes change without any resource announcing it
+  refresh_interval = 1.0
+  input_timeout = 0.1
+
+  @property
+  def selected_resource(self) -> Resource | None:
+    with self.index.lock:
+      if self.selected_index < len(self.index):
+        return self.index[self.selected_index]
+    return None
+
+  @property
+  def selected_index(self) -> int:
+    return self.viewport.selected
 
   @property
-  def selected_resource(self) -> Resource:
-    return self.resources[self.selected_index]
+  def body_height(self) -> int:
+    return term.height - self.header_height - 1
 
   def __init__(self, resources):
     self.resources = [*resources]
     self.row_count = len(resources)
-    self.selected_index = 0
+    self.index = TableIndex(self.resources, search_text=self._get_search_text)
+    self.viewport = Viewport(self.row_count)
+    self.sort_column: int | None = None
+    self.searching = False
     self.running = True
     self.input_thread = None
+    self._selected = self.resources[0] if self.resources else None
+    self._changed = threading.Condition()
+    self._dirty = True
+    self._frame: list[Row] = []
+    self._chrome = None
+    self._size = None
+
+  def invalidate(self, *_):
+    """Wakes the render loop to draw a new frame."""
+    with self._changed:
+      self._dirty = True
+      self._changed.notify()
+
+  def _on_resource_changed(self, resource: Resource):
+    self.index.update(resource)
+    self.invalidate()
 
   @staticmethod
   def get_status(res: Resource):
@@ -80,91 +327,265 @@ class ClusterTable:
 
     return "unknown"
 
-  def render_table(self):
-    row_template = "|".join(f"{{:^{x[1]}}}" for x in self.columns)
-
-    def _clear_terminal():
-      print(term.home + term.clear)
-
-    def _render_header():
-      header = row_template.format(*(x[0] for x in self.columns))
-      print(term.bold(term.white(header)))
+  @staticmethod
+  def get_forward_status(res: Resource) -> str:
+    forward = res.forward
+    if forward is None:
+      return ""
+    uptime = forward.uptime
+    if uptime is None:
+      text = "restarting"
+    elif not res.is_forward_ready:
+      text = "connecting"
+    else:
+      text = f"up {format_duration(uptime)}"
+    if forward.restarts:
+      text += f" ↻{forward.restarts}"
+    if isinstance(forward, TunnelForward):
+      text += f" {format_bytes(forward.bytes_in + forward.bytes_out)}"
+    return text
 
-    def _render_separator():
-      separator = "|".join("-" * x[1] for x in self.columns)
-      print(term.bold(term.white(separator)))
+  @staticmethod
+  def get_ready_status(res: Resource) -> str:
+    """When the forwarded port first accepted a connection, and how long it took."""
+    state = res.forward_readiness
+    if state is None or state.ready_at is None:
+      return ""
+    ready_at = datetime.datetime.fromtimestamp(state.ready_at).strftime("%H:%M:%S")
+    return f"{ready_at} +{format_latency(state.time_to_ready)}"
+
+  def _get_row_values(self, res: Resource):
+    local_port = res.local_port or "undefined"
+    status = self.get_status(res)
+
+    return (
+      res.namespace,
+      res.kind,
+      res.name,
+      local_port,
+      status,
+      self.get_forward_status(res),
+      self.get_ready_status(res),
+    )
 
-    def _render_footer():
-      footer = "[↑/↓] Move  [s] Start/Stop  [m] Remote/Local Mode  [q] Quit"
-      print(
-        term.move_xy(0, term.height - 1) + term.center(term.bold(term.cyan(footer))),
-        end="",
-        flush=True,
+  def _get_search_text(self, res: Resource) -> str:
+    return " ".join(str(value) for value in self._get_row_values(res))
+
+  def _get_sort_key(self, column: int) -> Callable[[Resource], Any]:
+    def sort_key(res: Resource):
+      if column == 3:
+        value = (res.local_port is None, res.local_port or 0)
+      elif column == 4:
+        value = self.get_status(res)
+      elif column == 5:
+        forward = res.forward
+        value = -1.0 if forward is None else (forward.uptime or 0.0)
+      elif column == 6:
+        state = res.forward_readiness
+        ready = state is not None and state.ready_at is not None
+        value = (not ready, state.time_to_ready if ready else 0.0)
+      else:
+        value = self._get_row_values(res)[column]
+      return (value, res.namespace, res.kind, res.name)
+
+    return sort_key
+
+  def sort_by(self, column: int):
+    """Sorts by a column, or reverses the order if it is already sorted by it."""
+    reverse = column == self.sort_column and not self.index.reverse
+    self.sort_column = column
+    self.index.sort(self._get_sort_key(column), reverse=reverse)
+
+  def search(self, query: str):
+    self.index.search(query)
+
+  def _select(self, move: Callable[[], None]):
+    """Moves the selection, and remembers which resource is selected."""
+    with self.index.lock:
+      self.viewport.resize(row_count=len(self.index))
+      move()
+      self._selected = self.selected_resource
+
+  def _sync_selection(self):
+    """Keeps the same resource selected as the index changes around it."""
+    self.viewport.resize(row_count=len(self.index))
+    position = self.index.position(self._selected) if self._selected else None
+    if position is not None:
+      self.viewport.select(position)
+    else:
+      self._selected = self.selected_resource
+
+  def _get_frame(self) -> list[Row]:
+    """Formats the rows in the viewport, and no others."""
+    return [
+      (
+        i == self.selected_index,
+        tuple(
+          fit_cell(str(value), width)
+          for value, (_, width) in zip(
+            self._get_row_values(self.index[i]), self.columns
+          )
+        ),
       )
+      for i in self.viewport.visible
+    ]
+
+  def _get_header(self) -> str:
+    names = []
+    for i, (name, width) in enumerate(self.columns):
+      if i == self.sort_column:
+        name += " ▼" if self.index.reverse else " ▲"
+      names.append(fit_cell(name, width))
+    return "|".join(names)
+
+  def _get_footer(self) -> str:
+    if self.searching:
+      return f"/{self.index.query}"
+    footer = (
+      f"[↑/↓] Move  [/] Search  [1-{len(self.columns)}] Sort  [s] Start/Stop"
+      "  [m] Mode  [q] Quit"
+    )
+    if self.index.query:
+      matches = f"{len(self.index)}/{self.row_count}"
+      footer = f"/{self.index.query} ({matches})  [Esc] Clear  {footer}"
+    return footer
+
+  def _render_chrome(self) -> str:
+    header, footer = self._chrome
+    footer = term.bold(term.cyan(footer))
+    return (
+      term.move_xy(0, 0)
+      + term.clear_eol
+      + term.bold(term.white(header))
+      + term.move_xy(0, term.height - 1)
+      + term.clear_eol
+      + (footer if self.searching else term.center(footer))
+    )
 
-    def _render_rows():
-      for i, resource in enumerate(self.resources):
-        row_values = _get_row_values(resource)
-        _render_row(i, row_values)
-
-    def _get_row_values(res: Resource):
-      local_port = res.local_port or "undefined"
-      status = self.get_status(res)
-
-      return (
-        res.namespace,
-        res.kind,
-        res.name,
-        local_port,
-        status,
+  def _render_frame(self) -> str:
+    """Renders what changed since the previous frame, as one string."""
+    output = []
+    size = (term.width, term.height)
+    if size != self._size:
+      self._size = size
+      self._frame = []
+      self._chrome = None
+      self.viewport.resize(height=self.body_height)
+      separator = "|".join("-" * width for _, width in self.columns)
+      output.append(
+        term.home + term.clear + term.move_xy(0, 1) + term.bold(term.white(separator))
       )
 
-    def _render_row(i, row_values):
-      row = row_template.format(*row_values)
+    with self.index.lock:
+      self._sync_selection()
+      frame = self._get_frame()
 
-      if i == self.selected_index:
-        row = term.reverse(row)
+    chrome = (self._get_header(), self._get_footer())
+    if chrome != self._chrome:
+      self._chrome = chrome
+      output.append(self._render_chrome())
 
-      print(term.move_xy(0, 3 + i) + row)
+    offsets = [0]
+    for _, width in self.columns:
+      offsets.append(offsets[-1] + width + 1)
 
-    with term.fullscreen(), term.cbreak(), term.hidden_cursor():
-      _clear_terminal()
-      _render_header()
-      _render_separator()
-      _render_footer()
+    for y, x in diff_frames(self._frame, frame):
+      selected, cells = frame[y]
+      if x < 0:
+        text, offset = "|".join(cells), 0
+      else:
+        text, offset = cells[x], offsets[x]
+      if selected:
+        text = term.reverse(text)
+      output.append(term.move_xy(offset, self.header_height + y) + text)
+    for y in range(len(frame), len(self._frame)):
+      output.append(term.move_xy(0, self.header_height + y) + term.clear_eol)
+
+    self._frame = frame
+    return "".join(output)
 
+  def render_table(self):
+    if hasattr(signal, "SIGWINCH"):
+      signal.signal(signal.SIGWINCH, self.invalidate)
+    with term.fullscreen(), term.cbreak(), term.hidden_cursor():
       while self.running:
-        _render_rows()
-        time.sleep(0.05)
+        with self._changed:
+          self._changed.wait_for(
+            lambda: self._dirty or not self.running, timeout=self.refresh_interval
+          )
+          self._dirty = False
+        if not self.running:
+          break
+
+        output = self._render_frame()
+        if output:
+          sys.stdout.write(output)
+          sys.stdout.flush()
+
+  def _handle_search_input(self, key):
+    if key.code == term.KEY_ENTER:
+      self.searching = False
+    elif key.code == term.KEY_ESCAPE:
+      self.searching = False
+      self.search("")
+    elif key.code in (term.KEY_BACKSPACE, term.KEY_DELETE):
+      self.search(self.index.query[:-1])
+    elif not key.is_sequence and key.isprintable():
+      self.search(self.index.query + key)
 
   def handle_input(self):
     while self.running:
-      key = term.inkey()
+      key = term.inkey(timeout=self.input_timeout)
       if not key:
         continue
 
       logger.debug(f"key pressed: {key}")
 
-      if key.code == term.KEY_UP:
-        self.selected_index = (self.selected_index - 1) % self.row_count
+      if self.searching:
+        self._handle_search_input(key)
+      elif key.code == term.KEY_UP:
+        self._select(lambda: self.viewport.move(-1))
       elif key.code == term.KEY_DOWN:
-        self.selected_index = (self.selected_index + 1) % self.row_count
+        self._select(lambda: self.viewport.move(1))
+      elif key.code == term.KEY_PGUP:
+        self._select(lambda: self.viewport.page(-1))
+      elif key.code == term.KEY_PGDOWN:
+        self._select(lambda: self.viewport.page(1))
+      elif key.code == term.KEY_HOME:
+        self._select(self.viewport.home)
+      elif key.code == term.KEY_END:
+        self._select(self.viewport.end)
+      elif key.code == term.KEY_ESCAPE:
+        self.search("")
+      elif key == "/":
+        self.searching = True
+      elif key.isdigit() and 1 <= int(key) <= len(self.columns):
+        self.sort_by(int(key) - 1)
       elif key == "s":
         res = self.selected_resource
-        if res.replicas:
+        if not res:
+          pass
+        elif res.replicas:
           res.set_replicas(0, apply=True)
         else:
           res.set_replicas(1, apply=True)
           res.enable_services()
       elif key == "m":
-        self.selected_resource.toggle_forwarding_mode()
+        if res := self.selected_resource:
+          res.toggle_forwarding_mode()
       elif key == "q":
         self.running = False
+      self.invalidate()
 
   def run(self):
+    Resource.add_listener(self._on_resource_changed)
     self.input_thread = threading.Thread(target=self.handle_input, daemon=True)
     self.input_thread.start()
-    self.render_table()
+    try:
+      self.render_table()
+    finally:
+      self.running = False
+      Resource.remove_listener(self._on_resource_changed)
     self.input_thread.join()
 
 
@@ -174,33 +595,36 @@ def workon(
     False,
     help="Apply the current YAML sate to the cluster.",
   ),
+  force: bool = typer.Option(
+    False,
+    "--force",
+    help="Ignore all caches, rebuilding the overlay and re-applying everything.",
+  ),
 ):
   """Forward ports between localhost and the cluster, or vice-versa."""
-  if apply:
+  # Forwards are first started from the table's input thread, which cannot do this
+  cleanup.install()
+  if force:
     with begin("clearing state cache"):
       print("")  # dumb hack to make the message appear
       clear_cache()
       ok()
-    apply_cluster_config()
+  if apply:
+    apply_cluster_config(use_cache=not force)
 
-  namespaces = kubectl.get_namespaces()
   scalable_resources = []
 
   with begin("querying cluster for scalable resources"):
-    for namespace in namespaces:
-      for kind in SCALABLE_KINDS:
-        try:
-          docs = kubectl.get_resource_docs(kind=kind, namespace=namespace)
-          for doc in docs:
-            last_applied = get_last_applied_configuration(doc)
-            if last_applied:
-              scalable_resources.append(Resource(last_applied))
-            else:
-              logger.warning(
-                f"resource {get_key(doc)} has no last applied configuration."
-              )
-        except Exception as e:
-          fail(f"failed while querying {kind} resources: {e}")
+    try:
+      docs = kubectl.discover_resource_docs(SCALABLE_KINDS)
+    except Exception as e:
+      fail(f"failed while querying scalable resources: {e}")
+    for key, doc in docs.items():
+      last_applied = DocView(doc).last_applied
+      if last_applied:
+        scalable_resources.append(Resource(last_applied))
+      else:
+        logger.warning(f"resource {key} has no last applied configuration.")
     scalable_count = len(scalable_resources)
     if scalable_count:
       ok(f"found {scalable_count} scalable resources")
@@ -213,22 +637,26 @@ def workon(
   ClusterTable(scalable_resources).run()
 
 
-def ensure_namespaces(resources: list[Resource]):
-  """Extracts namespaces from the provided documents and ensures they exist using kubectl."""
-  namespaces = set()
+def _get_namespaces(resources: list[Resource]) -> set[str]:
+  return {resource.namespace for resource in resources if resource.namespace}
 
-  for resource in resources:
-    namespace = resource.namespace
-    if namespace:
-      namespaces.add(namespace)
 
-  if not namespaces:
-    return
+async def aensure_namespaces(namespaces: set[str]):
+  """Ensures the namespaces exist, creating the missing ones concurrently."""
 
-  with begin("checking namespaces"):
-    for namespace in namespaces:
-      kubectl.create_namespace_if_not_exists(namespace)
-      ok(namespace)
+  async def ensure(namespace: str) -> str:
+    await kubectl.acreate_namespace_if_not_exists(namespace)
+    return namespace
+
+  tasks = [asyncio.ensure_future(ensure(ns)) for ns in sorted(namespaces)]
+  try:
+    for created in asyncio.as_completed(tasks):
+      ok(await created)
+  finally:
+    # If one fails, the others are not left running unobserved
+    for task in tasks:
+      task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 
 def _iter_resources(yaml_content: str) -> Iterator[Resource]:
@@ -236,20 +664,102 @@ def _iter_resources(yaml_content: str) -> Iterator[Resource]:
     yield Resource(doc)
 
 
-def _set_initial_replicas(res: Resource):
+def _get_resource_types(resources: list[Resource]) -> list[str]:
+  return sorted({res.resource_type for res in resources})
+
+
+def _get_all_namespaces(resources: list[Resource]) -> list[str]:
+  # Cluster scoped resources are keyed under the default namespace
+  return sorted({res.namespace for res in resources})
+
+
+async def _aget_cluster_docs(
+  resources: list[Resource],
+) -> tuple[dict[str, dict], set[str]]:
+  """
+  Fetches the cluster state of every resource, in one call when the cluster knows
+  every type. Otherwise each type is listed on its own, so one the cluster does not
+  know yet (a custom resource whose definition is in the same overlay, say) does
+  not hide the state of the others.
+
+  Returns:
+      The cluster state of the resources by key, and the types that could not be
+      listed.
+  """
+  if not resources:
+    return {}, set()
+  types = _get_resource_types(resources)
+  namespaces = _get_all_namespaces(resources)
+  try:
+    return await kubectl.adiscover_resource_docs(types, namespaces=namespaces), set()
+  except Exception as e:
+    if len(types) == 1:
+      logger.warning(f"error querying {types[0]} resources: {e}")
+      return {}, set(types)
+    logger.info(f"error querying resources, listing each type on its own: {e}")
+
+  results = await asyncio.gather(
+    *(
+      kubectl.adiscover_resource_docs([resource_type], namespaces=namespaces)
+      for resource_type in types
+    ),
+    return_exceptions=True,
+  )
+  cluster_docs = {}
+  unlisted = set()
+  for resource_type, result in zip(types, results):
+    if isinstance(result, BaseException):
+      logger.warning(f"error querying {resource_type} resources: {result}")
+      unlisted.add(resource_type)
+    else:
+      cluster_docs.update(result)
+  return cluster_docs, unlisted
+
+
+async def _prepare_cluster(
+  resources: list[Resource],
+) -> tuple[dict[str, dict], set[str]]:
+  """
+  Ensures the namespaces of the resources exist while fetching the cluster state of
+  all of them, so preparing takes as long as the slowest call, not all of them.
+
+  Returns:
+      The cluster state of the resources by key, and the types that could not be
+      listed.
+  """
+  cluster_docs = asyncio.ensure_future(_aget_cluster_docs(resources))
+  namespaces = _get_namespaces(resources)
+  try:
+    if namespaces:
+      await aensure_namespaces(namespaces)
+  except BaseException:
+    cluster_docs.cancel()
+    await asyncio.gather(cluster_docs, return_exceptions=True)
+    raise
+  return await cluster_docs
+
+
+def _get_last_applied_replicas(cluster_docs: dict[str, dict]) -> dict[str, int]:
+  last_applied_replicas = {}
+  for key, doc in cluster_docs.items():
+    last_applied = DocView(doc).last_applied
+    if last_applied:
+      last_applied_replicas[key] = get_replicas(last_applied)
+  return last_applied_replicas
+
+
+def _set_initial_replicas(res: Resource, last_applied_replicas: dict[str, int]):
   if res.is_scalable:
-    last_applied = kubectl.get_last_applied_doc(
-      kind=res.kind,
-      name=res.name,
-      namespace=res.namespace,
-    )
-    res.set_replicas(get_replicas(last_applied) if last_applied else 0)
+    res.set_replicas(last_applied_replicas.get(res.key, 0))
 
 
-def apply_cluster_config():
+def apply_cluster_config(use_cache: bool = True):
   """Builds cluster config via Kustomize and applies via kubectl.
+  The Kustomize output is cached until the overlay's inputs change, unless
+  `use_cache` is False.
   Scalable resources will be set to 0 replicas when deployed for the first time.
-  Unchanged resources will not be re-deployed.
+  Unchanged resources will not be re-deployed, or even sent to the cluster if they
+  match what was last applied from here.
   """
   resources: List[Resource] = []
   changed_count = 0
@@ -259,11 +769,11 @@ def apply_cluster_config():
   if not kustomize.is_installed:
     fail("kustomize is not installed")
 
-  kustomize_path = Path(KUSTOMIZE_ROOT).resolve()
+  kustomize_path = Path(settings.KUSTOMIZE_ROOT).resolve()
   if not kustomize_path.is_dir():
-    fail(f"invalid kustomize root directory: {KUSTOMIZE_ROOT}")
+    fail(f"invalid kustomize root directory: {settings.KUSTOMIZE_ROOT}")
 
-  overlay_path = KUSTOMIZE_OVERLAY_DIR.resolve()
+  overlay_path = settings.KUSTOMIZE_OVERLAY_DIR.resolve()
   if not overlay_path.is_dir():
     fail(f"invalid overlay directory: {overlay_path}")
   if settings.DEBUG:
@@ -271,7 +781,7 @@ def apply_cluster_config():
 
   try:
     with begin("loading cluster configuration"):
-      yaml_output = kustomize.build(overlay_path)
+      yaml_output = kustomize.build(overlay_path, use_cache=use_cache)
       # Resources will be grouped according to dependencies, so process in receive order
       for resource in _iter_resources(yaml_output):
         resources.append(resource)
@@ -283,16 +793,25 @@ def apply_cluster_config():
     fail(f"error parsing YAML: {e}")
     return []
 
-  ensure_namespaces(resources)
+  with begin("checking namespaces"):
+    cluster_docs, unlisted = asyncio.run(_prepare_cluster(resources))
 
   with begin("applying configuration"):
+    last_applied_replicas = _get_last_applied_replicas(cluster_docs)
     for resource in resources:
+      if resource.resource_type in unlisted:
+        # Without its cluster state, drift cannot be ruled out, so send it anyway
+        resource.forget_applied()
+      else:
+        # Forgets the last applied hash of anything changed or deleted in the cluster
+        resource.observe(cluster_docs.get(resource.key))
       try:
-        _set_initial_replicas(resource)
+        # Scalable resources that could not be listed start at 0 replicas
+        _set_initial_replicas(resource, last_applied_replicas)
       except Exception as e:
         logger.exception(f"error setting replicas for {resource.key}: {e}")
 
-      result = resource.apply()
+    for result in apply_resources(resources):
       if result is None:
         skipped_count += 1
       elif result:
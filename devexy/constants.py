@@ -8,3 +8,4 @@ K8S_DEFAULT_NAMESPACE = "default"
 K8S_DEFAULT_RESOURCE_KIND = "__unspecified_kind__"
 K8S_DEFAULT_RESOURCE_NAME = "__unspecified_name__"
 K8S_REVERSE_PROXY_CONTAINER_NAME = "devexy-nginx-reverse-proxy"
+K8S_REVERSE_PROXY_CONFIG_SUFFIX = "devexy-proxy-config"
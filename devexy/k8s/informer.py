@@ -0,0 +1,200 @@
+import atexit
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable, Iterator
+
+from devexy.k8s.utils import get_key
+from devexy.tools.kubectl import kubectl
+from devexy.utils.logging import get_logger
+from devexy.utils.threading import cleanup
+
+logger = get_logger(__name__)
+
+WATCH_BACKOFF_MIN = 1.0
+WATCH_BACKOFF_MAX = 30.0
+TERMINATE_TIMEOUT = 2.0
+
+
+def iter_json_documents(lines: Iterable[str]) -> Iterator[dict]:
+  """
+  Incrementally decodes a stream of concatenated JSON documents, as written by
+  `kubectl get --watch -o json`.
+
+  Decoding is only attempted on lines that can close a top-level document (no
+  indentation, ending with `}`), so the cost stays linear in the stream size.
+  """
+  decoder = json.JSONDecoder()
+  buffer = []
+  for line in lines:
+    buffer.append(line)
+    if line[:1].isspace() or not line.rstrip().endswith("}"):
+      continue
+
+    text = "".join(buffer).lstrip()
+    while text:
+      try:
+        doc, end = decoder.raw_decode(text)
+      except json.JSONDecodeError:
+        break
+      if isinstance(doc, dict):
+        yield doc
+      text = text[end:].lstrip()
+    buffer = [text] if text else []
+
+
+class Informer:
+  """
+  Keeps subscribed resources up to date using one watch stream per kind, shared by
+  every resource of that kind, instead of polling each resource separately.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._subscribers: dict[str, list] = defaultdict(list)
+    self._observed: dict[str, dict] = {}
+    self._watchers: dict[str, threading.Thread] = {}
+    self._processes: dict[str, subprocess.Popen] = {}
+    self._stopping = False
+
+  def subscribe(self, resource):
+    """Starts delivering observed cluster state to `resource.observe`."""
+    kind = resource.kind.lower()
+    with self._lock:
+      self._subscribers[resource.key].append(resource)
+      observed = self._observed.get(resource.key)
+      if kind not in self._watchers:
+        if not self._watchers:
+          atexit.register(self.stop_all)
+          cleanup.register(self.stop_all)
+        watcher = threading.Thread(
+          target=self._watch,
+          args=(kind,),
+          name=f"informer-{kind}",
+          daemon=True,
+        )
+        self._watchers[kind] = watcher
+        watcher.start()
+
+    if observed is not None:
+      resource.observe(observed)
+
+  def unsubscribe(self, resource):
+    with self._lock:
+      subscribers = self._subscribers.get(resource.key, [])
+      if resource in subscribers:
+        subscribers.remove(resource)
+
+  def stop_all(self):
+    """Stops every watch process, for good."""
+    with self._lock:
+      self._stopping = True
+      processes = list(self._processes.values())
+      self._processes.clear()
+    for process in processes:
+      try:
+        process.terminate()
+        process.wait(TERMINATE_TIMEOUT)
+      except subprocess.TimeoutExpired:
+        process.kill()
+      except Exception as e:
+        logger.warning("Error while terminating watch process: %s", e)
+
+  def dispatch(self, event: dict):
+    """Applies a single watch event to the subscribers of the affected resource."""
+    if "object" in event and "type" in event:
+      event_type, doc = event["type"], event["object"]
+    else:
+      event_type, doc = "MODIFIED", event
+
+    key = get_key(doc)
+    with self._lock:
+      if event_type == "DELETED":
+        self._observed.pop(key, None)
+        doc = None
+      else:
+        self._observed[key] = doc
+      subscribers = [*self._subscribers.get(key, [])]
+
+    for resource in subscribers:
+      try:
+        resource.observe(doc)
+      except Exception as e:
+        logger.warning("Failed to deliver %s event for %s: %s", event_type, key, e)
+
+  def reconcile(self, kind: str, known: set[str]):
+    """
+    Dispatches deletions for the resources of a kind that were observed before the
+    watch restarted, but are gone now, since the new watch only reports those that
+    still exist.
+
+    Args:
+        kind: The lowercase kind being watched.
+        known: The keys observed before the restart.
+    """
+    try:
+      existing = kubectl.discover_resource_docs([kind])
+    except Exception as e:
+      logger.warning("Could not reconcile %s resources: %s", kind, e)
+      return
+    for key in sorted(known - set(existing)):
+      with self._lock:
+        doc = self._observed.get(key)
+      if doc is not None:
+        logger.info("%s was deleted while its watch was down", key)
+        self.dispatch({"type": "DELETED", "object": doc})
+
+  def _get_observed_keys(self, kind: str) -> set[str]:
+    with self._lock:
+      return {key for key in self._observed if key.split("/")[1] == kind}
+
+  def _watch(self, kind: str):
+    backoff = WATCH_BACKOFF_MIN
+    restarted = False
+    while not self._stopping:
+      started_at = time.monotonic()
+      known = self._get_observed_keys(kind) if restarted else set()
+      restarted = True
+      try:
+        process = kubectl.watch(kind)
+        with self._lock:
+          if self._stopping:
+            process.terminate()
+            return
+          self._processes[kind] = process
+        logger.info("Watching %s resources (PID: %d)", kind, process.pid)
+        threading.Thread(
+          target=_log_errors,
+          args=(kind, process.stderr),
+          name=f"informer-{kind}-errors",
+          daemon=True,
+        ).start()
+        # Listed after the watch started, so later deletions still arrive as events
+        if known:
+          self.reconcile(kind, known)
+        for event in iter_json_documents(process.stdout):
+          self.dispatch(event)
+        returncode = process.wait()
+        if self._stopping:
+          return
+        logger.warning("Watch for %s resources exited with %s", kind, returncode)
+      except Exception as e:
+        logger.warning("Watch for %s resources failed: %s", kind, e)
+
+      if time.monotonic() - started_at > WATCH_BACKOFF_MAX:
+        backoff = WATCH_BACKOFF_MIN
+      time.sleep(random.uniform(backoff / 2, backoff))
+      backoff = min(backoff * 2, WATCH_BACKOFF_MAX)
+
+
+def _log_errors(kind: str, stderr: Iterable[str]):
+  """Drains what kubectl writes to stderr, so a full pipe never stalls the watch."""
+  for line in stderr:
+    if line.strip():
+      logger.warning("Watch for %s resources: %s", kind, line.rstrip())
+
+
+informer = Informer()
@@ -0,0 +1,68 @@
+from typing import Any, Callable
+
+from devexy.k8s.utils import (
+  get_annotations,
+  get_first_container,
+  get_key,
+  get_kind,
+  get_last_applied_configuration,
+  get_local_port,
+  get_name,
+  get_namespace,
+)
+
+
+class _CachedField:
+  """Computes a field from the viewed doc on first access, then stores it in a slot."""
+
+  def __init__(self, getter: Callable[[dict], Any]):
+    self.getter = getter
+
+  def __set_name__(self, owner, name):
+    self.slot = f"_{name}"
+
+  def __get__(self, view: "DocView", owner=None):
+    if view is None:
+      return self
+    try:
+      return getattr(view, self.slot)
+    except AttributeError:
+      value = self.getter(view.doc)
+      setattr(view, self.slot, value)
+      return value
+
+
+class DocView:
+  """
+  A read-only view over a Kubernetes document, which is never copied.
+
+  Fields are computed once, on first access. Create a new view if the document is
+  modified.
+  """
+
+  __slots__ = (
+    "_annotations",
+    "_first_container",
+    "_key",
+    "_kind",
+    "_last_applied",
+    "_local_port",
+    "_name",
+    "_namespace",
+    "doc",
+  )
+
+  kind = _CachedField(get_kind)
+  name = _CachedField(get_name)
+  namespace = _CachedField(get_namespace)
+  key = _CachedField(get_key)
+  annotations = _CachedField(get_annotations)
+  local_port = _CachedField(get_local_port)
+  first_container = _CachedField(get_first_container)
+  last_applied = _CachedField(get_last_applied_configuration)
+
+  def __init__(self, doc: dict):
+    self.doc = doc
+
+  def __repr__(self):
+    return f"DocView({self.key})"
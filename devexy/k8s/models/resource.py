@@ -1,46 +1,46 @@
-import atexit
 import copy
 import datetime
 import functools
-import json
-import random
-import subprocess
-import threading
-import time
-from pathlib import Path
-from typing import Any
-
-from devexy.constants import K8S_REVERSE_PROXY_CONTAINER_NAME
+from typing import Any, Callable, ClassVar
+
+from devexy import settings
+from devexy.k8s.informer import informer
+from devexy.k8s.models.doc_view import DocView
+from devexy.k8s.port_forward import PortForward, port_forwards
+from devexy.k8s.readiness import Probe, readiness
+from devexy.k8s.tunnel import TunnelForward, pod_stream_opener, tunnels
 from devexy.k8s.utils import (
+  PROXY_CONFIG_DIGEST_ANNOTATION,
   SCALABLE_KINDS,
-  STATE_CACHE_ROOT,
   dict_to_yaml,
-  get_first_container,
-  get_key,
-  get_kind,
-  get_local_port,
-  get_name,
-  get_namespace,
+  get_digest,
+  get_metadata,
   get_replicas,
+  get_resource_type,
+  get_reverse_proxy_config,
+  get_reverse_proxy_config_map,
   get_reverse_proxy_container,
+  get_reverse_proxy_volume,
+  get_state_store,
+  is_proxy_installed,
 )
 from devexy.tools.kubectl import kubectl
 from devexy.utils.logging import get_logger
 from devexy.utils.safe_dict import SafeDict
 from devexy.utils.text import quick_hash
-from devexy.utils.threading import cleanup
 
 logger = get_logger(__name__)
 
 
 class Resource:
-  _monitor_thread: threading.Thread = None
-  _forwarding_thread: threading.Thread = None
-  _forwarding_process: subprocess.Popen = None
+  # Called with the resource whenever anything shown about it may have changed
+  _listeners: ClassVar[list[Callable[["Resource"], None]]] = []
+  _monitoring: bool = False
 
   def __init__(self, doc: dict):
     self._original_doc = doc
-    self._doc = copy.deepcopy(doc)
+    # The original doc is shared, and only copied once it needs to be modified
+    self._view = DocView(doc)
 
     self._k8s_state = SafeDict()
     try:
@@ -56,21 +56,61 @@ class Resource:
   def __repr__(self):
     return self.key
 
-  @functools.cached_property
+  @classmethod
+  def add_listener(cls, listener: Callable[["Resource"], None]):
+    cls._listeners.append(listener)
+
+  @classmethod
+  def remove_listener(cls, listener: Callable[["Resource"], None]):
+    if listener in cls._listeners:
+      cls._listeners.remove(listener)
+
+  def _notify(self):
+    for listener in list(self._listeners):
+      try:
+        listener(self)
+      except Exception as e:
+        logger.warning("State change listener failed for %s: %s", self.key, e)
+
+  @property
+  def _doc(self) -> dict:
+    return self._view.doc
+
+  @_doc.setter
+  def _doc(self, doc: dict):
+    self._view = DocView(doc)
+
+  def _edit_doc(self) -> dict:
+    """Returns the doc for modification, copying the original first if needed."""
+    doc = self._doc
+    if doc is self._original_doc:
+      doc = copy.deepcopy(doc)
+    self._doc = doc
+    return doc
+
+  @property
+  def view(self) -> DocView:
+    return self._view
+
+  @property
   def name(self):
-    return get_name(self._doc)
+    return self._view.name
 
-  @functools.cached_property
+  @property
   def kind(self):
-    return get_kind(self._doc)
+    return self._view.kind
 
-  @functools.cached_property
+  @property
   def namespace(self):
-    return get_namespace(self._doc)
+    return self._view.namespace
 
-  @functools.cached_property
+  @property
   def key(self):
-    return get_key(self._doc)
+    return self._view.key
+
+  @property
+  def resource_type(self) -> str:
+    return get_resource_type(self._doc)
 
   @functools.cached_property
   def is_scalable(self):
@@ -78,7 +118,7 @@ class Resource:
 
   @property
   def is_monitoring(self):
-    return self._monitor_thread is not None
+    return self._monitoring
 
   @property
   def is_proxying(self):
@@ -86,8 +126,7 @@ class Resource:
 
   @property
   def local_port(self):
-    port = get_local_port(self._doc)
-    return port
+    return self._view.local_port
 
   @property
   def k8s_status(self):
@@ -99,47 +138,25 @@ class Resource:
 
   def set_replicas(self, replicas: int, apply=False):
     logger.info("Setting replicas for %s to %d", self.key, replicas)
-    if "spec" not in self._doc:
-      self._doc["spec"] = {}
-    self._doc["spec"]["replicas"] = replicas
+    doc = self._edit_doc()
+    if "spec" not in doc:
+      doc["spec"] = {}
+    doc["spec"]["replicas"] = replicas
     if apply:
       self.apply()
+    self._notify()
 
   @property
   def yaml(self):
     return dict_to_yaml(self._doc)
 
-  @functools.cached_property
-  def key_hash(self):
-    return quick_hash(self.key)
-
-  @functools.cached_property
-  def _k8s_state_file_name(self) -> Path:
-    filename = f"{self.key_hash}.json"
-    return filename
-
-  @functools.cached_property
-  def _k8s_state_file_path(self) -> Path:
-    filepath = STATE_CACHE_ROOT / self._k8s_state_file_name
-    return filepath
-
   def _load_k8s_state(self):
-    state_file = self._k8s_state_file_path
-
-    if not state_file.exists():
-      logger.debug("Cache file for %s does not exist: %s", self.key, state_file)
+    state = get_state_store().get(self.key)
+    if state is None:
+      logger.debug("No state cached for %s", self.key)
       return {}
-
-    with open(state_file, "r") as f:
-      content = f.read()
-      if content:
-        state = json.loads(content)
-        logger.info("Loaded state cache for %s from %s", self.key, state_file)
-        logger.debug("State for %s: %s", self.key, state)
-        return state
-      else:
-        logger.debug("Cache file for %s is empty: %s", self.key, state_file)
-        return {}
+    logger.debug("State for %s: %s", self.key, state)
+    return state
 
   def _set_state(self, key: str, value: Any, commit=True):
     self._k8s_state[key] = value
@@ -154,19 +171,8 @@ class Resource:
       self._dump_k8s_state()
 
   def _dump_k8s_state(self):
-    try:
-      with open(self._k8s_state_file_path, "w") as f:
-        json.dump(self._k8s_state, f, indent=2)
-      logger.debug(
-        "Saved state cache for %s to %s", self.key, self._k8s_state_file_path
-      )
-    except (IOError, TypeError, ValueError) as e:
-      logger.error(
-        "Failed to save state cache for %s to %s: %s",
-        self.key,
-        self._k8s_state_file_path,
-        e,
-      )
+    """Queues the state to be saved, together with that of other resources."""
+    get_state_store().put(self.key, self._k8s_state)
 
   def enable_services(self):
     if not self.is_scalable:
@@ -175,52 +181,86 @@ class Resource:
     if not self.is_monitoring:
       self.start_monitoring()
 
-    if not self.is_proxying and not self.is_forwarding:
+    if not self.is_proxying and not self.forward:
       self.start_forwarding()
 
   def start_monitoring(self):
     try:
-      self._monitor_thread = threading.Thread(target=self._monitor_state, daemon=True)
-      self._monitor_thread.start()
+      informer.subscribe(self)
+      self._monitoring = True
       return True
     except Exception as e:
-      logger.error(
-        "Failed to start monitoring thread for %s: %s", self.key, e, exc_info=True
-      )
+      logger.error("Failed to start monitoring for %s: %s", self.key, e, exc_info=True)
       return False
 
-  def _monitor_state(self):
-    if threading.current_thread() is threading.main_thread():
-      raise RuntimeError("State monitor must not be started from the main thread.")
+  def observe(self, current_state: dict | None):
+    """Records the state of the resource as observed in the cluster."""
+    try:
+      self._check_drift(current_state)
+      current_state = current_state or {}
+      self._set_state("status", current_state.get("status", {}), commit=False)
+      self._set_state(
+        "proxy_installed", is_proxy_installed(current_state), commit=False
+      )
+      now = datetime.datetime.now(datetime.timezone.utc)
+      self._set_state("observed_at", now.isoformat(), commit=True)
+    except Exception as e:
+      logger.warning("Failed to update state cache for %s: %s", self.key, e)
+    self._notify()
 
-    while True:
-      try:
-        current_state = kubectl.get_current_state(self.kind, self.name, self.namespace)
-      except Exception as e:
-        logger.warning("Failed to get current state for %s: %s", self.key, e)
-        continue
+  @property
+  def digest(self):
+    return get_digest(self._doc)
 
-      try:
-        status = current_state.get("status", {})
-        self._set_state("status", status, commit=False)
+  @property
+  def is_applied(self) -> bool:
+    """Whether this exact document was the last one successfully applied."""
+    return self._k8s_state.get("last_applied_hash") == self.digest
 
-        container = get_first_container(current_state) or {}
-        proxy_installed = container.get("name") == K8S_REVERSE_PROXY_CONTAINER_NAME
-        self._set_state("proxy_installed", proxy_installed)
+  def _record_applied(self, digest: str):
+    self._set_state("last_applied_hash", digest)
 
-        now = datetime.datetime.now(datetime.timezone.utc)
-        self._set_state("observed_at", now.isoformat(), commit=True)
-      except Exception as e:
-        logger.warning("Failed to update state cache for %s: %s", self.key, e)
+  def forget_applied(self):
+    """Forgets what was last applied, so the next apply sends the resource."""
+    self._del_state("last_applied_hash")
+
+  def _check_drift(self, current_state: dict | None):
+    """Forgets the last applied hash if the cluster no longer matches it."""
+    last_applied_hash = self._k8s_state.get("last_applied_hash")
+    if not last_applied_hash:
+      return
 
-      time.sleep(random.uniform(1, 2))
+    if current_state is None:
+      logger.info("%s no longer exists in the cluster", self.key)
+      self._del_state("last_applied_hash")
+      return
+
+    resource_version = get_metadata(current_state).get("resourceVersion")
+    if resource_version == self._k8s_state.get("resource_version"):
+      return
+
+    last_applied = DocView(current_state).last_applied
+    if not last_applied or get_digest(last_applied) != last_applied_hash:
+      logger.info("%s was changed in the cluster since it was last applied", self.key)
+      self._del_state("last_applied_hash")
+    self._set_state("resource_version", resource_version, commit=False)
 
   def apply(self):
+    digest = self.digest
+    if self._k8s_state.get("last_applied_hash") == digest:
+      logger.debug("Skipping apply for %s, unchanged since last applied", self.key)
+      return False
+
     logger.info("Applying resource %s", self.key)
     try:
-      return kubectl.apply(self.yaml)
+      result = kubectl.apply(self.yaml)
     except Exception as e:
       logger.error("Failed to apply resource %s: %s", self.key, e)
+      return None
+
+    if result is not None:
+      self._record_applied(digest)
+    return result
 
   def _infer_target_port(self) -> int | None:
     """Tries to infer a suitable target port from the resource spec."""
@@ -261,78 +301,95 @@ class Resource:
     return None
 
   @property
-  def is_forwarding(self) -> bool:
-    if process := self._forwarding_process:
-      return process.poll() is None
-    return False
+  def forward(self) -> PortForward | TunnelForward | None:
+    """The port forward of this resource, if it is forwarding."""
+    return port_forwards.get(self.key) or tunnels.get(self.key)
 
-  def _forwarding_cleanup(self):
-    if process := self._forwarding_process:
-      try:
-        logger.info("Terminating port forward process for %s", self.key)
-        process.terminate()
-      except Exception as e:
-        logger.warning("Error while terminating port forward process: %s", e)
+  @property
+  def is_forwarding(self) -> bool:
+    forward = self.forward
+    return forward is not None and forward.is_running
 
-  def start_forwarding(self):
-    try:
-      self._forwarding_thread = threading.Thread(
-        target=self._start_forwarding_process, daemon=True
-      )
-      self._forwarding_thread.start()
-      return True
-    except Exception as e:
-      logger.error(
-        "Failed to start forwarding thread for %s: %s", self.key, e, exc_info=True
-      )
-      return False
+  @property
+  def forward_readiness(self) -> Probe | TunnelForward | None:
+    """When the forwarded port became reachable, and how long that took."""
+    forward = self.forward
+    if forward is None or isinstance(forward, TunnelForward):
+      return forward
+    return readiness.get(self.key)
 
-  def _start_forwarding_process(self, local_port: int = None) -> bool:
-    if threading.current_thread() is threading.main_thread():
-      raise RuntimeError(
-        "Port forwarding process must not be started from the main thread."
-      )
+  @property
+  def is_forward_ready(self) -> bool:
+    """Whether the forwarded port accepts connections, not just its process running."""
+    state = self.forward_readiness
+    return self.is_forwarding and state is not None and state.ready_at is not None
+
+  def _on_forward_changed(self, forward: PortForward | TunnelForward):
+    if isinstance(forward, PortForward):
+      # Every kubectl process has to bind the port again before it is reachable
+      if forward.is_running:
+        readiness.probe(
+          self.key,
+          self.local_port,
+          on_ready=self._on_forward_ready,
+          started_at=forward.started_at,
+        )
+      else:
+        readiness.cancel(self.key)
+    self._notify()
 
-    if self.is_forwarding:
-      logger.warning("Port forwarding is already active for %s", self)
-      return True
+  def _on_forward_ready(self, probe: Probe):
+    self._notify()
 
+  def start_forwarding(self) -> bool:
+    """
+    Starts forwarding the local port, through a supervised kubectl process or, with
+    the "tunnel" forward backend, from inside devexy.
+    """
     local_port = self.local_port
     if not local_port:
       logger.warning("Skipping port forwarding - No local port defined for %s.", self)
       return False
 
-    try:
-      target_port = self._infer_target_port()
-      self._forwarding_process = kubectl.port_forward(
-        self.kind,
-        self.name,
-        self.namespace,
+    target_port = self._infer_target_port()
+    if settings.FORWARD_BACKEND == "tunnel":
+      tunnels.forward(
+        self.key,
         local_port,
-        target_port,
+        pod_stream_opener(self.namespace, self.kind, self.name, target_port),
+        on_change=self._on_forward_changed,
       )
-      logger.info("Started port forwarding for %s on %s", self, local_port)
-    except Exception as e:
-      logger.error("Failed to start port forwarding - %s", e, exc_info=True)
-
-    try:
-      atexit.register(self._forwarding_cleanup)
-      cleanup.register(lambda *_: self._forwarding_cleanup())
-    except Exception as e:
-      logger.error("Failed to set port forwarding cleanup hooks - %s", e, exc_info=True)
-
-    return self.is_forwarding
+    else:
+      port_forwards.forward(
+        self.key,
+        functools.partial(
+          kubectl.port_forward,
+          self.kind,
+          self.name,
+          self.namespace,
+          local_port,
+          target_port,
+        ),
+        on_change=self._on_forward_changed,
+      )
+    logger.info("Started port forwarding for %s on %s", self, local_port)
+    self._notify()
+    return True
 
   def stop_forwarding(self) -> bool:
-    """Stops the active port forwarding process for this resource."""
-    if not self.is_forwarding:
+    """Stops the port forwarding of this resource."""
+    stopped = port_forwards.stop(self.key)
+    stopped = tunnels.stop(self.key) or stopped
+    readiness.cancel(self.key)
+    if not stopped:
       logger.debug("Port forwarding is not active for %s, nothing to stop.", self.key)
       return False
 
-    self._forwarding_cleanup()
+    self._notify()
+    return True
 
   def _get_container_port(self):
-    container = get_first_container(self._doc)
+    container = self._view.first_container
     if container:
       ports = container.get("ports") or []
       if ports:
@@ -352,20 +409,37 @@ class Resource:
       return False
 
     container_port = self._get_container_port()
-
-    reverse_proxy_container = get_reverse_proxy_container(
+    config = get_reverse_proxy_config(
       local_port=local_port,
       container_port=container_port,
     )
+    # The pods mount the configuration, so it has to exist before they start
+    config_map = get_reverse_proxy_config_map(self.name, self.namespace, config)
+    try:
+      kubectl.apply(dict_to_yaml(config_map))
+    except Exception as e:
+      logger.error("Failed to apply reverse proxy config for %s: %s", self.key, e)
+      return False
 
-    self._doc["spec"]["template"]["spec"]["containers"] = [reverse_proxy_container]
+    doc = self._edit_doc()
+    template = doc["spec"]["template"]
+    annotations = template.setdefault("metadata", {}).setdefault("annotations", {})
+    annotations[PROXY_CONFIG_DIGEST_ANNOTATION] = quick_hash(config)
+    pod_spec = template["spec"]
+    pod_spec["containers"] = [get_reverse_proxy_container(container_port)]
+    volume = get_reverse_proxy_volume(self.name)
+    pod_spec["volumes"] = [
+      *(v for v in pod_spec.get("volumes") or () if v.get("name") != volume["name"]),
+      volume,
+    ]
 
     logger.info("Injected reverse proxy container for %s", self.key)
+    return True
 
   def _remove_reverse_proxy(self):
     try:
       current_replicas = self.replicas
-      self._doc = copy.deepcopy(self._original_doc)
+      self._doc = self._original_doc
       self.set_replicas(current_replicas, apply=True)
       logger.info("Removed reverse proxy for %s", self.key)
       return True
@@ -377,6 +451,49 @@ class Resource:
     if self.is_proxying:
       self._remove_reverse_proxy()
     else:
+      # The local port is about to be served locally, so stop forwarding it
+      self.stop_forwarding()
       self._inject_reverse_proxy()
       self.apply()
     self.enable_services()
+
+
+def apply_resources(
+  resources: list[Resource], use_cache: bool = True
+) -> list[bool | None]:
+  """Applies resources in order, in as few kubectl invocations as possible.
+
+  Resources that are unchanged since they were last applied are skipped. The cache
+  only knows what was applied from here, so callers must first have each resource
+  `observe` its state in the cluster, or pass `use_cache=False` to send them all.
+  Resources that kubectl did not report as applied in bulk (for example, custom
+  resources whose definition was created in the same batch) are retried one by one.
+
+  Returns:
+      For each resource, True if it changed, False if it was unchanged, or None if
+      it could not be applied.
+  """
+  pending = [
+    i for i, resource in enumerate(resources) if not (use_cache and resource.is_applied)
+  ]
+  logger.info(
+    "Applying %d resources, %d unchanged since last applied",
+    len(pending),
+    len(resources) - len(pending),
+  )
+
+  try:
+    pending_results = kubectl.apply_many([resources[i]._doc for i in pending])
+  except Exception as e:
+    logger.error("Failed to apply resources in bulk: %s", e)
+    pending_results = [None] * len(pending)
+
+  results = [False] * len(resources)
+  for i, result in zip(pending, pending_results):
+    resource = resources[i]
+    if result is None:
+      result = resource.apply()
+    else:
+      resource._record_applied(resource.digest)
+    results[i] = result
+  return results
@@ -0,0 +1,241 @@
+import atexit
+import os
+import random
+import selectors
+import subprocess
+import threading
+import time
+from typing import Callable
+
+from devexy.utils.logging import get_logger
+from devexy.utils.threading import cleanup
+
+logger = get_logger(__name__)
+
+FORWARD_BACKOFF_MIN = 0.5
+FORWARD_BACKOFF_MAX = 30.0
+# How often processes are polled where their exit cannot be waited on (no pidfd)
+POLL_INTERVAL = 0.5
+TERMINATE_TIMEOUT = 2.0
+
+
+class PortForward:
+  """One supervised forward, and the process currently serving it, if any."""
+
+  def __init__(
+    self,
+    key: str,
+    start: Callable[[], subprocess.Popen],
+    on_change: Callable[["PortForward"], None] | None = None,
+    backoff: float = FORWARD_BACKOFF_MIN,
+  ):
+    self.key = key
+    self.start = start
+    self.on_change = on_change
+    self.process: subprocess.Popen | None = None
+    self.started_at: float | None = None
+    self.restarts = 0
+    self.backoff = backoff
+    # When the process is due to be (re)started, if it is not running
+    self.start_at: float | None = time.monotonic()
+
+  @property
+  def is_running(self) -> bool:
+    return self.process is not None and self.process.poll() is None
+
+  @property
+  def uptime(self) -> float | None:
+    """Seconds since the current process started, or None if it is not running."""
+    if self.started_at is None or not self.is_running:
+      return None
+    return time.monotonic() - self.started_at
+
+
+class PortForwardSupervisor:
+  """
+  Owns every port forward process. One reaper thread waits for any of them to exit,
+  and restarts it with jittered exponential backoff, since kubectl exits whenever
+  the pod it forwards to goes away.
+  """
+
+  def __init__(
+    self,
+    backoff_min: float = FORWARD_BACKOFF_MIN,
+    backoff_max: float = FORWARD_BACKOFF_MAX,
+  ):
+    self.backoff_min = backoff_min
+    self.backoff_max = backoff_max
+    self._lock = threading.Lock()
+    self._forwards: dict[str, PortForward] = {}
+    self._reaper: threading.Thread | None = None
+    self._wakeup: tuple[int, int] | None = None
+
+  def get(self, key: str) -> PortForward | None:
+    return self._forwards.get(key)
+
+  def forward(
+    self,
+    key: str,
+    start: Callable[[], subprocess.Popen],
+    on_change: Callable[[PortForward], None] | None = None,
+  ) -> PortForward:
+    """
+    Keeps a forward running until it is stopped.
+
+    Args:
+        key: Identifies the forward. Forwarding an existing key returns it as is.
+        start: Starts the process serving the forward, called again to restart it.
+        on_change: Called with the forward whenever its process starts or exits.
+
+    Returns:
+        The forward, whose process is started by the reaper thread.
+    """
+    with self._lock:
+      forward = self._forwards.get(key)
+      if forward is None:
+        forward = PortForward(key, start, on_change, backoff=self.backoff_min)
+        self._forwards[key] = forward
+      self._ensure_reaper()
+    self._wake()
+    return forward
+
+  def stop(self, key: str) -> bool:
+    """Stops a forward and its process. Returns whether there was one."""
+    with self._lock:
+      forward = self._forwards.pop(key, None)
+    if forward is None:
+      return False
+    self._terminate(forward)
+    self._wake()
+    return True
+
+  def stop_all(self):
+    with self._lock:
+      forwards = list(self._forwards.values())
+      self._forwards.clear()
+    for forward in forwards:
+      self._terminate(forward)
+
+  def _terminate(self, forward: PortForward):
+    process = forward.process
+    if process is None or process.poll() is not None:
+      return
+    logger.info("Terminating port forward process for %s", forward.key)
+    try:
+      process.terminate()
+      process.wait(TERMINATE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+      process.kill()
+    except Exception as e:
+      logger.warning("Error while terminating port forward process: %s", e)
+
+  def _ensure_reaper(self):
+    """Starts the reaper, and the hooks stopping every forward on exit, once."""
+    if self._reaper is not None:
+      return
+    self._wakeup = os.pipe()
+    os.set_blocking(self._wakeup[1], False)
+    self._reaper = threading.Thread(
+      target=self._reap, name="port-forwards", daemon=True
+    )
+    self._reaper.start()
+    atexit.register(self.stop_all)
+    cleanup.register(self.stop_all)
+
+  def _wake(self):
+    if self._wakeup is not None:
+      try:
+        os.write(self._wakeup[1], b"\0")
+      except BlockingIOError:
+        pass  # A wakeup is already pending
+
+  def _start(self, forward: PortForward):
+    forward.start_at = None
+    try:
+      forward.process = forward.start()
+      forward.started_at = time.monotonic()
+    except Exception as e:
+      logger.error("Failed to start port forwarding for %s: %s", forward.key, e)
+      self._schedule_restart(forward)
+    if self.get(forward.key) is not forward:
+      # Stopped while starting
+      self._terminate(forward)
+      return
+    self._changed(forward)
+
+  def _schedule_restart(self, forward: PortForward):
+    uptime = time.monotonic() - forward.started_at if forward.started_at else 0.0
+    if uptime > self.backoff_max:
+      forward.backoff = self.backoff_min
+    delay = random.uniform(forward.backoff / 2, forward.backoff)
+    forward.backoff = min(forward.backoff * 2, self.backoff_max)
+    forward.start_at = time.monotonic() + delay
+    forward.restarts += 1
+    logger.info("Restarting port forwarding for %s in %.1fs", forward.key, delay)
+
+  def _changed(self, forward: PortForward):
+    if forward.on_change:
+      try:
+        forward.on_change(forward)
+      except Exception as e:
+        logger.warning("Port forward listener failed for %s: %s", forward.key, e)
+
+  def _exited(self, forward: PortForward):
+    """Restarts a forward whose process exited, unless it was stopped meanwhile."""
+    with self._lock:
+      # The reaper works from a snapshot, which can still hold a stopped forward
+      if self.get(forward.key) is not forward:
+        return
+      returncode = forward.process.returncode
+      forward.process = None
+      self._schedule_restart(forward)
+    logger.warning("Port forwarding for %s exited with %s", forward.key, returncode)
+    self._changed(forward)
+
+  def _reap(self):
+    selector = selectors.DefaultSelector()
+    selector.register(self._wakeup[0], selectors.EVENT_READ)
+    # Exit notifications by pid, where the platform supports pidfds
+    pidfds: dict[int, int] = {}
+
+    while True:
+      with self._lock:
+        forwards = list(self._forwards.values())
+
+      now = time.monotonic()
+      for forward in forwards:
+        process = forward.process
+        if forward.start_at is not None:
+          if forward.start_at <= now:
+            self._start(forward)
+        elif process is not None and process.poll() is not None:
+          self._exited(forward)
+
+      # Watch the exit of every live process, and forget those that exited
+      live = {
+        forward.process.pid
+        for forward in forwards
+        if forward.process is not None and forward.process.returncode is None
+      }
+      for pid in set(pidfds) - live:
+        selector.unregister(pidfds[pid])
+        os.close(pidfds.pop(pid))
+      polling = False
+      for pid in live - set(pidfds):
+        try:
+          pidfds[pid] = os.pidfd_open(pid)
+          selector.register(pidfds[pid], selectors.EVENT_READ)
+        except (AttributeError, OSError):
+          polling = True
+
+      due = [forward.start_at for forward in forwards if forward.start_at is not None]
+      timeout = max(min(due) - time.monotonic(), 0) if due else None
+      if polling:
+        timeout = min(timeout, POLL_INTERVAL) if timeout is not None else POLL_INTERVAL
+
+      for key, _ in selector.select(timeout):
+        if key.fd == self._wakeup[0]:
+          os.read(self._wakeup[0], 4096)
+
+
+port_forwards = PortForwardSupervisor()
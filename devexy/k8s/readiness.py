@@ -0,0 +1,148 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from typing import Callable
+
+from devexy.utils.logging import get_logger
+from devexy.utils.threading import start_event_loop
+
+logger = get_logger(__name__)
+
+# Probes start almost immediately, then back off, so a forward that binds quickly is
+# seen within milliseconds and one that takes a while is not hammered
+PROBE_DELAY_MIN = 0.005
+PROBE_DELAY_MAX = 1.0
+PROBE_TIMEOUT = 0.5
+
+
+class Probe:
+  """Whether a local port accepts connections yet, and when it started to."""
+
+  def __init__(
+    self,
+    key: str,
+    port: int,
+    on_ready: Callable[["Probe"], None] | None = None,
+    started_at: float | None = None,
+  ):
+    self.key = key
+    self.port = port
+    self.on_ready = on_ready
+    # When the forward started, on the monotonic clock
+    self.started_at = time.monotonic() if started_at is None else started_at
+    self.attempts = 0
+    # When the port first accepted a connection, on the wall clock
+    self.ready_at: float | None = None
+    self.time_to_ready: float | None = None
+    self._future: concurrent.futures.Future | None = None
+
+  @property
+  def is_ready(self) -> bool:
+    return self.ready_at is not None
+
+  def _ready(self):
+    self.ready_at = time.time()
+    self.time_to_ready = time.monotonic() - self.started_at
+    logger.info(
+      "Port %s for %s is ready after %.3fs (%d probes)",
+      self.port,
+      self.key,
+      self.time_to_ready,
+      self.attempts,
+    )
+    if self.on_ready:
+      try:
+        self.on_ready(self)
+      except Exception as e:
+        logger.warning("Readiness listener failed for %s: %s", self.key, e)
+
+
+async def can_connect(port: int, host: str = "127.0.0.1") -> bool:
+  """Returns whether a TCP connection to the port is accepted, closing it at once."""
+  try:
+    _, writer = await asyncio.wait_for(
+      asyncio.open_connection(host, port), PROBE_TIMEOUT
+    )
+  except (OSError, asyncio.TimeoutError):
+    return False
+  writer.close()
+  try:
+    await writer.wait_closed()
+  except OSError:
+    pass
+  return True
+
+
+class ReadinessProber:
+  """
+  Probes forwarded ports until they accept connections, since a forward process can
+  be running long before it listens, or without ever managing to. Every probe runs
+  on one event loop, in its own thread.
+  """
+
+  def __init__(
+    self,
+    delay_min: float = PROBE_DELAY_MIN,
+    delay_max: float = PROBE_DELAY_MAX,
+  ):
+    self.delay_min = delay_min
+    self.delay_max = delay_max
+    self._lock = threading.Lock()
+    self._probes: dict[str, Probe] = {}
+    self._loop: asyncio.AbstractEventLoop | None = None
+
+  def get(self, key: str) -> Probe | None:
+    return self._probes.get(key)
+
+  def probe(
+    self,
+    key: str,
+    port: int,
+    on_ready: Callable[[Probe], None] | None = None,
+    started_at: float | None = None,
+  ) -> Probe:
+    """
+    Starts probing a port, replacing any probe of the same key, since a restarted
+    forward has to become ready again.
+
+    Args:
+        key: Identifies the forward being probed.
+        port: The local port to connect to.
+        on_ready: Called with the probe once the port accepts a connection.
+        started_at: When the forward started, on the monotonic clock. Defaults to now.
+    """
+    probe = Probe(key, port, on_ready, started_at)
+    with self._lock:
+      previous = self._probes.get(key)
+      self._probes[key] = probe
+      if self._loop is None:
+        self._loop = start_event_loop("readiness")
+      probe._future = asyncio.run_coroutine_threadsafe(self._run(probe), self._loop)
+    if previous is not None and previous._future is not None:
+      previous._future.cancel()
+    return probe
+
+  def cancel(self, key: str) -> bool:
+    """Stops probing a port and forgets its readiness. Returns whether it was probed."""
+    with self._lock:
+      probe = self._probes.pop(key, None)
+    if probe is None:
+      return False
+    if probe._future is not None:
+      probe._future.cancel()
+    return True
+
+  async def _run(self, probe: Probe):
+    delay = self.delay_min
+    while True:
+      probe.attempts += 1
+      if await can_connect(probe.port):
+        break
+      await asyncio.sleep(delay)
+      delay = min(delay * 2, self.delay_max)
+    if self.get(probe.key) is probe:
+      probe._ready()
+
+
+readiness = ReadinessProber()
@@ -0,0 +1,437 @@
+import asyncio
+import atexit
+import functools
+import random
+import ssl
+import threading
+import time
+from typing import Awaitable, Callable
+from urllib.parse import urlparse
+
+from devexy import settings
+from devexy.utils.logging import get_logger
+from devexy.utils.threading import cleanup, start_event_loop
+from devexy.utils.websocket import WebSocket
+
+logger = get_logger(__name__)
+
+# Each requested port gets a data and an error channel. Every message starts with its
+# channel number, and the first message on each channel is the port, little-endian.
+PORT_FORWARD_PROTOCOL = "v4.channel.k8s.io"
+DATA_CHANNEL = 0
+ERROR_CHANNEL = 1
+READ_SIZE = 64 * 1024
+TUNNEL_BACKOFF_MIN = 0.5
+TUNNEL_BACKOFF_MAX = 30.0
+STOP_TIMEOUT = 5.0
+# How long a response may go quiet once the client has stopped sending. A client that
+# closed outright looks the same as one that only shut down its sending half.
+HALF_CLOSE_TIMEOUT = 10.0
+
+OpenStream = Callable[[], Awaitable[WebSocket]]
+
+
+class Tunnel:
+  """One port forward stream to a pod port, carrying one TCP connection."""
+
+  def __init__(self, websocket: WebSocket, port: int):
+    self.websocket = websocket
+    self.port = port
+
+  @classmethod
+  async def open(cls, open_stream: OpenStream) -> "Tunnel":
+    """
+    Opens a stream, and waits until the API server has set up both its channels.
+
+    Raises:
+        ConnectionError: If the stream closes before it is set up.
+    """
+    websocket = await open_stream()
+    port = None
+    for channel in (DATA_CHANNEL, ERROR_CHANNEL):
+      message = await websocket.recv()
+      if message is None or len(message) < 3 or message[0] != channel:
+        await websocket.close()
+        raise ConnectionError("Port forward stream closed while opening")
+      port = int.from_bytes(message[1:3], "little")
+    return cls(websocket, port)
+
+  async def pipe(
+    self,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    forward: "TunnelForward",
+  ):
+    """
+    Copies data both ways, counting it on the forward. When the client stops
+    sending, the response is still copied until the pod's side closes or goes quiet,
+    since the protocol cannot pass a half-close on to the pod.
+    """
+    received = 0
+
+    async def upstream():
+      while data := await reader.read(READ_SIZE):
+        await self.websocket.send(bytes([DATA_CHANNEL]) + data)
+        forward.bytes_out += len(data)
+
+    async def downstream():
+      nonlocal received
+      while (message := await self.websocket.recv()) is not None:
+        if message[:1] == bytes([DATA_CHANNEL]):
+          writer.write(message[1:])
+          await writer.drain()
+          received += len(message) - 1
+          forward.bytes_in += len(message) - 1
+        elif message[:1] == bytes([ERROR_CHANNEL]) and len(message) > 1:
+          logger.warning(
+            "Port forward error for %s: %s",
+            forward.key,
+            message[1:].decode("utf-8", errors="replace"),
+          )
+          break
+      if writer.can_write_eof():
+        writer.write_eof()
+
+    sending = asyncio.ensure_future(upstream())
+    receiving = asyncio.ensure_future(downstream())
+    try:
+      done, _ = await asyncio.wait(
+        [sending, receiving], return_when=asyncio.FIRST_COMPLETED
+      )
+      if sending in done and sending.exception() is None:
+        while not receiving.done():
+          before = received
+          await asyncio.wait([receiving], timeout=HALF_CLOSE_TIMEOUT)
+          if received == before:
+            break
+    finally:
+      for task in (sending, receiving):
+        task.cancel()
+      results = await asyncio.gather(sending, receiving, return_exceptions=True)
+      await self.websocket.close()
+    for result in results:
+      if isinstance(result, Exception):
+        raise result
+
+
+class TunnelPool:
+  """
+  Keeps tunnels opened ahead of time, so accepting a connection does not wait for
+  the API server. A websocket stream carries a single connection, so the pool holds
+  streams ready to be claimed rather than multiplexing one.
+  """
+
+  def __init__(self, key: str, open_stream: OpenStream, size: int):
+    self.key = key
+    self.open_stream = open_stream
+    self.size = size
+    self._ready: list[Tunnel] = []
+    self._filling = 0
+    self._backoff = TUNNEL_BACKOFF_MIN
+    self.closed = False
+
+  def fill(self):
+    while not self.closed and len(self._ready) + self._filling < self.size:
+      self._filling += 1
+      asyncio.ensure_future(self._fill_one())
+
+  async def _fill_one(self):
+    try:
+      tunnel = await Tunnel.open(self.open_stream)
+      if self.closed:
+        await tunnel.websocket.close()
+        return
+      self._ready.append(tunnel)
+      self._backoff = TUNNEL_BACKOFF_MIN
+    except Exception as e:
+      logger.warning("Failed to open a port forward stream for %s: %s", self.key, e)
+      await asyncio.sleep(self._backoff)
+      self._backoff = min(self._backoff * 2, TUNNEL_BACKOFF_MAX)
+    finally:
+      self._filling -= 1
+    self.fill()
+
+  async def acquire(self) -> Tunnel:
+    """Returns a ready tunnel, or opens one if none is ready."""
+    while self._ready:
+      tunnel = self._ready.pop(0)
+      if not tunnel.websocket.closed:
+        self.fill()
+        return tunnel
+    self.fill()
+    return await Tunnel.open(self.open_stream)
+
+  async def close(self):
+    self.closed = True
+    ready, self._ready = self._ready, []
+    for tunnel in ready:
+      await tunnel.websocket.close()
+
+
+class TunnelForward:
+  """One local port, forwarded through tunnels, and its counters."""
+
+  restarts = 0
+
+  def __init__(
+    self,
+    key: str,
+    local_port: int,
+    pool: TunnelPool,
+    on_change: Callable[["TunnelForward"], None] | None = None,
+  ):
+    self.key = key
+    self.local_port = local_port
+    self.pool = pool
+    self.on_change = on_change
+    self.server: asyncio.Server | None = None
+    self.created_at = time.monotonic()
+    self.started_at: float | None = None
+    # Listening is ready, so readiness needs no probing, unlike a kubectl process
+    self.ready_at: float | None = None
+    self.time_to_ready: float | None = None
+    self.connections = 0
+    self.active = 0
+    self.failures = 0
+    self.bytes_in = 0
+    self.bytes_out = 0
+    self._writers: set[asyncio.StreamWriter] = set()
+    self._serving: asyncio.Task | None = None
+
+  @property
+  def is_running(self) -> bool:
+    return self.server is not None and self.server.is_serving()
+
+  @property
+  def uptime(self) -> float | None:
+    if self.started_at is None or not self.is_running:
+      return None
+    return time.monotonic() - self.started_at
+
+  def _changed(self):
+    if self.on_change:
+      try:
+        self.on_change(self)
+      except Exception as e:
+        logger.warning("Port forward listener failed for %s: %s", self.key, e)
+
+  async def serve(self):
+    """Listens on the local port, retrying with jittered backoff while it is taken."""
+    self._serving = asyncio.current_task()
+    backoff = TUNNEL_BACKOFF_MIN
+    while self.server is None:
+      if self.pool.closed:
+        return
+      try:
+        self.server = await asyncio.start_server(
+          self._handle, "127.0.0.1", self.local_port
+        )
+      except OSError as e:
+        delay = random.uniform(backoff / 2, backoff)
+        backoff = min(backoff * 2, TUNNEL_BACKOFF_MAX)
+        self.restarts += 1
+        logger.error(
+          "Failed to listen on %s for %s, retrying in %.1fs: %s",
+          self.local_port,
+          self.key,
+          delay,
+          e,
+        )
+        self._changed()
+        await asyncio.sleep(delay)
+    self.started_at = time.monotonic()
+    self.ready_at = time.time()
+    self.time_to_ready = self.started_at - self.created_at
+    self.pool.fill()
+    logger.info("Forwarding port %s to %s in process", self.local_port, self.key)
+    self._changed()
+
+  async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    self.connections += 1
+    self.active += 1
+    self._writers.add(writer)
+    try:
+      tunnel = await self.pool.acquire()
+      await tunnel.pipe(reader, writer, self)
+    except Exception as e:
+      self.failures += 1
+      logger.warning("Forwarded connection to %s failed: %s", self.key, e)
+    finally:
+      self.active -= 1
+      self._writers.discard(writer)
+      writer.close()
+
+  async def close(self):
+    if self._serving is not None and not self._serving.done():
+      # Still waiting to retry listening
+      self._serving.cancel()
+      await asyncio.gather(self._serving, return_exceptions=True)
+    if self.server is not None:
+      self.server.close()
+      for writer in list(self._writers):
+        writer.close()
+      await self.server.wait_closed()
+    await self.pool.close()
+    logger.info(
+      "Stopped forwarding port %s to %s: %d connections, %d failed, %d bytes in,"
+      " %d bytes out",
+      self.local_port,
+      self.key,
+      self.connections,
+      self.failures,
+      self.bytes_in,
+      self.bytes_out,
+    )
+
+
+class TunnelForwarder:
+  """
+  Forwards local ports to pods from inside devexy, instead of running a kubectl
+  process per port. Every port is served by one event loop, in its own thread.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._forwards: dict[str, TunnelForward] = {}
+    self._loop: asyncio.AbstractEventLoop | None = None
+
+  def get(self, key: str) -> TunnelForward | None:
+    return self._forwards.get(key)
+
+  def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+    """Starts the event loop, and the hooks stopping every forward on exit, once."""
+    if self._loop is None:
+      self._loop = start_event_loop("tunnels")
+      atexit.register(self.stop_all)
+      cleanup.register(self.stop_all)
+    return self._loop
+
+  def forward(
+    self,
+    key: str,
+    local_port: int,
+    open_stream: OpenStream,
+    on_change: Callable[[TunnelForward], None] | None = None,
+    pool_size: int | None = None,
+  ) -> TunnelForward:
+    """
+    Listens on a local port, forwarding each connection through its own stream.
+
+    Args:
+        key: Identifies the forward. Forwarding an existing key returns it as is.
+        local_port: The port to listen on, on localhost.
+        open_stream: Opens a port forward stream to the target.
+        on_change: Called with the forward when it starts listening, or fails to.
+        pool_size: How many streams to keep open ahead of connections.
+    """
+    with self._lock:
+      forward = self._forwards.get(key)
+      if forward is None:
+        if pool_size is None:
+          pool_size = settings.FORWARD_POOL_SIZE
+        pool = TunnelPool(key, open_stream, pool_size)
+        forward = TunnelForward(key, local_port, pool, on_change)
+        self._forwards[key] = forward
+        asyncio.run_coroutine_threadsafe(forward.serve(), self._ensure_loop())
+    return forward
+
+  def stop(self, key: str) -> bool:
+    """Stops listening, and closes the pooled streams. Returns whether there was one."""
+    with self._lock:
+      forward = self._forwards.pop(key, None)
+    if forward is None:
+      return False
+    future = asyncio.run_coroutine_threadsafe(forward.close(), self._loop)
+    try:
+      future.result(STOP_TIMEOUT)
+    except Exception as e:
+      logger.warning("Error while stopping port forward for %s: %s", key, e)
+    return True
+
+  def stop_all(self):
+    for key in list(self._forwards):
+      self.stop(key)
+
+
+@functools.cache
+def _get_api_configuration():
+  from kubernetes import client, config
+
+  configuration = client.Configuration()
+  config.load_kube_config(client_configuration=configuration)
+  return configuration
+
+
+@functools.cache
+def _get_api_client():
+  """One client for every pod lookup, so they share its connection pool."""
+  from kubernetes import client
+
+  return client.ApiClient(_get_api_configuration())
+
+
+def _get_ssl_context(configuration) -> ssl.SSLContext:
+  context = ssl.create_default_context(cafile=configuration.ssl_ca_cert)
+  if configuration.cert_file:
+    context.load_cert_chain(configuration.cert_file, configuration.key_file)
+  if not configuration.verify_ssl:
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+  return context
+
+
+def find_pod(namespace: str, kind: str, name: str) -> str:
+  """
+  Finds a running pod of a resource, like `kubectl port-forward` does.
+
+  Raises:
+      LookupError: If the resource has no running pod.
+  """
+  from kubernetes import client
+
+  api_client = _get_api_client()
+  core = client.CoreV1Api(api_client)
+  kind = kind.lower()
+  if kind == "pod":
+    return name
+  if kind == "service":
+    selector = core.read_namespaced_service(name, namespace).spec.selector or {}
+  else:
+    read = getattr(client.AppsV1Api(api_client), f"read_namespaced_{kind}")
+    selector = read(name, namespace).spec.selector.match_labels or {}
+
+  label_selector = ",".join(f"{key}={value}" for key, value in selector.items())
+  pods = core.list_namespaced_pod(namespace, label_selector=label_selector).items
+  for pod in pods:
+    if pod.status.phase == "Running" and not pod.metadata.deletion_timestamp:
+      return pod.metadata.name
+  raise LookupError(f"No running pod found for {namespace}/{kind}/{name}")
+
+
+def pod_stream_opener(namespace: str, kind: str, name: str, port: int) -> OpenStream:
+  """
+  Returns a function opening port forward streams to a running pod of a resource
+  through the API server, found again for every stream, since pods come and go.
+  """
+
+  async def open_stream() -> WebSocket:
+    configuration = await asyncio.to_thread(_get_api_configuration)
+    pod = await asyncio.to_thread(find_pod, namespace, kind, name)
+    url = urlparse(configuration.host)
+    headers = {}
+    if authorization := configuration.get_api_key_with_prefix("authorization"):
+      headers["Authorization"] = authorization
+    return await WebSocket.connect(
+      url.hostname,
+      url.port or (443 if url.scheme == "https" else 80),
+      f"{url.path.rstrip('/')}/api/v1/namespaces/{namespace}/pods/{pod}/portforward"
+      f"?ports={port}",
+      headers=headers,
+      ssl_context=_get_ssl_context(configuration) if url.scheme == "https" else None,
+      subprotocols=[PORT_FORWARD_PROTOCOL],
+    )
+
+  return open_stream
+
+
+tunnels = TunnelForwarder()
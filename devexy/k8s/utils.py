@@ -1,28 +1,54 @@
-from typing import Iterator
-
-import yaml
+import functools
+from pathlib import Path
+from types import MappingProxyType
+from typing import Iterator, Mapping, Sequence
 
+from devexy import settings
 from devexy.constants import (
+  APP_NAME,
   K8S_DEFAULT_NAMESPACE,
   K8S_DEFAULT_RESOURCE_KIND,
   K8S_DEFAULT_RESOURCE_NAME,
+  K8S_REVERSE_PROXY_CONFIG_SUFFIX,
   K8S_REVERSE_PROXY_CONTAINER_NAME,
 )
-from devexy.settings import APP_DIR, KUSTOMIZE_ROOT, LOCAL_PORT_ANNOTATION
 from devexy.utils.logging import get_logger
-from devexy.utils.text import secure_hash
+from devexy.utils.serialization import (
+  JSONDecodeError,
+  canonicalize,
+  dump_yaml,
+  load_json,
+  load_yaml_all,
+)
+from devexy.utils.state_store import StateStore
+from devexy.utils.text import quick_hash
 
 logger = get_logger(__name__)
 
-CLUSTER_HASH = secure_hash(str(KUSTOMIZE_ROOT.resolve()))
-STATE_CACHE_ROOT = APP_DIR / "k8s_cache" / CLUSTER_HASH
-STATE_CACHE_ROOT.mkdir(parents=True, exist_ok=True)
+STATE_STORE_FILE_NAME = "state.db"
 SCALABLE_KINDS = ["deployment", "replicaset", "statefulset"]
+PROXY_CONFIG_DIR = "/etc/nginx/devexy"
+PROXY_CONFIG_FILE_NAME = "nginx.conf"
+# Changes with the proxy configuration, so pods restart to read a new one
+PROXY_CONFIG_DIGEST_ANNOTATION = "devexy/proxy-config-digest"
+
+# Getters return parts of the doc itself rather than copies, so treat them as read-only
+EMPTY_MAPPING: Mapping = MappingProxyType({})
+
+
+@functools.cache
+def _open_state_store(path: Path) -> StateStore:
+  return StateStore(path)
+
+
+def get_state_store() -> StateStore:
+  """Returns the store for the state of the current cluster, opened on first use."""
+  return _open_state_store(settings.STATE_CACHE_ROOT / STATE_STORE_FILE_NAME)
 
 
 def yaml_to_dicts(yaml_content: str) -> Iterator[dict]:
   """Parses YAML content and yields only valid dictionary documents as Resource instances."""
-  all_docs = yaml.safe_load_all(yaml_content)
+  all_docs = load_yaml_all(yaml_content)
   for doc in all_docs:
     if isinstance(doc, dict):
       yield doc
@@ -32,25 +58,39 @@ def yaml_to_dicts(yaml_content: str) -> Iterator[dict]:
 
 def dict_to_yaml(doc: dict):
   """
-  Serialize the doc consistently for hashing.
+  Serialize the doc consistently.
   """
-  return yaml.dump(doc, sort_keys=True, default_flow_style=False)
+  return dump_yaml(doc)
+
+
+def get_digest(doc: dict) -> str:
+  """
+  Hash the canonical form of the doc, so equal docs always have the same digest.
+  """
+  return quick_hash(canonicalize(doc))
 
 
 def get_kind(doc: dict, default=K8S_DEFAULT_RESOURCE_KIND):
   return str(doc.get("kind", default))
 
 
-def get_spec(doc: dict):
-  return dict(doc.get("spec", {}))
+def get_resource_type(doc: dict) -> str:
+  """Returns the type kubectl knows the doc by, qualified by its API group if any."""
+  kind = get_kind(doc).lower()
+  group, _, version = str(doc.get("apiVersion", "")).rpartition("/")
+  return f"{kind}.{group}" if group and version else kind
+
 
+def get_spec(doc: dict) -> Mapping:
+  return doc.get("spec") or EMPTY_MAPPING
 
-def get_metadata(doc: dict):
-  return dict(doc.get("metadata", {}))
 
+def get_metadata(doc: dict) -> Mapping:
+  return doc.get("metadata") or EMPTY_MAPPING
 
-def get_annotations(doc: dict):
-  return dict(get_metadata(doc).get("annotations", {}))
+
+def get_annotations(doc: dict) -> Mapping:
+  return get_metadata(doc).get("annotations") or EMPTY_MAPPING
 
 
 def get_namespace(doc: dict, default=K8S_DEFAULT_NAMESPACE):
@@ -62,15 +102,18 @@ def get_name(doc: dict, default=K8S_DEFAULT_RESOURCE_NAME):
 
 
 def get_key(doc: dict):
-  return f"{get_namespace(doc)}/{get_kind(doc)}/{get_name(doc)}".lower()
+  metadata = get_metadata(doc)
+  namespace = metadata.get("namespace", K8S_DEFAULT_NAMESPACE)
+  name = metadata.get("name", K8S_DEFAULT_RESOURCE_NAME)
+  return f"{namespace}/{get_kind(doc)}/{name}".lower()
 
 
-def get_spec_template(doc: dict):
-  return dict(get_spec(doc).get("template", {}))
+def get_spec_template(doc: dict) -> Mapping:
+  return get_spec(doc).get("template") or EMPTY_MAPPING
 
 
-def get_spec_containers(doc: dict):
-  return list(get_spec(doc).get("containers", []))
+def get_spec_containers(doc: dict) -> Sequence:
+  return get_spec(doc).get("containers") or ()
 
 
 def get_first_container(doc: dict):
@@ -86,7 +129,7 @@ def get_replicas(doc: dict, default=None):
 
 def get_local_port(doc: dict):
   annotations = get_annotations(doc)
-  annotation = annotations.get(LOCAL_PORT_ANNOTATION)
+  annotation = annotations.get(settings.LOCAL_PORT_ANNOTATION)
   if annotation is not None:
     return int(annotation)
   return None
@@ -98,43 +141,112 @@ def is_proxy_installed(doc: dict):
   return installed
 
 
-def get_reverse_proxy_container(
+def get_reverse_proxy_config(
   local_port: int,
   local_protocol: str = "http",
   local_host: str = "host.minikube.internal",
   container_port: int = 80,
-) -> dict:
-  """Returns an nginx reverse proxy deployment document with embedded nginx configuration."""
-  nginx_config = (
-    "events {}\n"
+) -> str:
+  """
+  Returns an nginx configuration proxying every request to the local app, over a
+  pool of kept alive HTTP/1.1 connections, and passing websocket upgrades through.
+  """
+  buffering = "on" if settings.PROXY_BUFFERING else "off"
+  buffer_size = settings.PROXY_BUFFER_SIZE
+  connect_timeout = settings.PROXY_CONNECT_TIMEOUT
+  read_timeout = settings.PROXY_READ_TIMEOUT
+  return (
+    f"worker_processes {settings.PROXY_WORKER_PROCESSES};\n"
+    "events {\n"
+    f"  worker_connections {settings.PROXY_WORKER_CONNECTIONS};\n"
+    "}\n"
     "http {\n"
+    "  map $http_upgrade $connection_upgrade {\n"
+    "    default upgrade;\n"
+    "    '' '';\n"
+    "  }\n"
+    "  upstream local_app {\n"
+    f"    server {local_host}:{local_port};\n"
+    f"    keepalive {settings.PROXY_KEEPALIVE};\n"
+    "  }\n"
     "  server {\n"
     f"    listen {container_port};\n"
     "    location / {\n"
-    f"      proxy_pass {local_protocol}://{local_host}:{local_port};\n"
+    f"      proxy_pass {local_protocol}://local_app;\n"
+    "      proxy_http_version 1.1;\n"
+    "      proxy_set_header Upgrade $http_upgrade;\n"
+    "      proxy_set_header Connection $connection_upgrade;\n"
     "      proxy_set_header Host $host;\n"
     "      proxy_set_header X-Real-IP $remote_addr;\n"
     "      proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;\n"
     "      proxy_set_header X-Forwarded-Proto $scheme;\n"
+    f"      proxy_buffering {buffering};\n"
+    f"      proxy_buffer_size {buffer_size};\n"
+    f"      proxy_buffers 8 {buffer_size};\n"
+    f"      proxy_connect_timeout {connect_timeout}s;\n"
+    f"      proxy_read_timeout {read_timeout}s;\n"
+    f"      proxy_send_timeout {read_timeout}s;\n"
     "    }\n"
     "  }\n"
     "}\n"
   )
 
+
+def get_reverse_proxy_config_map_name(name: str) -> str:
+  return f"{name}-{K8S_REVERSE_PROXY_CONFIG_SUFFIX}"
+
+
+def get_reverse_proxy_config_map(name: str, namespace: str, config: str) -> dict:
+  """Returns the ConfigMap document holding the reverse proxy configuration."""
+  return {
+    "apiVersion": "v1",
+    "kind": "ConfigMap",
+    "metadata": {
+      "name": get_reverse_proxy_config_map_name(name),
+      "namespace": namespace,
+      "labels": {"app.kubernetes.io/managed-by": APP_NAME},
+    },
+    "data": {PROXY_CONFIG_FILE_NAME: config},
+  }
+
+
+def get_reverse_proxy_volume(name: str) -> dict:
+  """Returns the pod volume holding the reverse proxy configuration of a resource."""
+  return {
+    "name": K8S_REVERSE_PROXY_CONFIG_SUFFIX,
+    "configMap": {"name": get_reverse_proxy_config_map_name(name)},
+  }
+
+
+def get_reverse_proxy_container(container_port: int = 80) -> dict:
+  """Returns an nginx reverse proxy container, which reads its config from a volume."""
   return {
     "name": K8S_REVERSE_PROXY_CONTAINER_NAME,
-    "image": "nginx:latest",
+    "image": settings.PROXY_IMAGE,
     "ports": [{"containerPort": container_port}],
-    "command": ["sh", "-c"],
-    "args": [
-      f"echo '{nginx_config}' > /etc/nginx/nginx.conf && nginx -g 'daemon off;'"
+    "command": [
+      "nginx",
+      "-c",
+      f"{PROXY_CONFIG_DIR}/{PROXY_CONFIG_FILE_NAME}",
+      "-g",
+      "daemon off;",
+    ],
+    "volumeMounts": [
+      {
+        "name": K8S_REVERSE_PROXY_CONFIG_SUFFIX,
+        "mountPath": PROXY_CONFIG_DIR,
+        "readOnly": True,
+      }
     ],
   }
 
 
 def clear_cache():
   try:
-    for item in STATE_CACHE_ROOT.iterdir():
+    get_state_store().clear()
+    for item in settings.STATE_CACHE_ROOT.iterdir():
+      if item.name.startswith(STATE_STORE_FILE_NAME):
+        continue
       if item.is_dir():
         item.rmdir()
       else:
@@ -148,7 +260,7 @@ def get_last_applied_configuration(doc: dict) -> dict | None:
   last_applied = annotations.get("kubectl.kubernetes.io/last-applied-configuration")
   if last_applied:
     try:
-      return yaml.safe_load(last_applied)
-    except yaml.YAMLError as e:
+      return load_json(last_applied)
+    except JSONDecodeError as e:
       logger.error("Failed to parse last applied configuration: %s", e)
   return None
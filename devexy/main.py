@@ -1,16 +1,38 @@
 #!/usr/bin/env python
 import importlib
 import logging
-import pkgutil
-from pathlib import Path
 from typing import Optional
 
 import typer
+from typer.core import TyperCommand, TyperGroup
 
 from devexy import settings
 from devexy.utils.logging import configure_logger
+from devexy.utils.profiling import SAMPLE_INTERVAL, Profiler, get_default_profile_path
 
-app = typer.Typer(no_args_is_help=True)
+PROFILE_OPTION = "--profile"
+# Stands in for the path when --profile is given without one
+DEFAULT_PROFILE = "-"
+
+
+# Commands by name, with the module that defines them and their help text. Modules
+# are only imported when their command runs, so keep the help in sync with theirs.
+COMMANDS = {
+  "logs": (
+    "devexy.commands.logs",
+    "Display the last N lines of the log file, or follow the log file.",
+  ),
+  "mk": ("devexy.commands.minikube", "Manage the minikube cluster."),
+  "stats": (
+    "devexy.commands.stats",
+    "Show the latency of external tool calls, per subcommand.",
+  ),
+  "version": ("devexy.commands.version", "Show the application version number."),
+  "workon": (
+    "devexy.commands.workon",
+    "Forward ports between localhost and the cluster, or vice-versa.",
+  ),
+}
 
 
 def get_typer_instance(module) -> Optional[typer.Typer]:
@@ -20,32 +42,96 @@ def get_typer_instance(module) -> Optional[typer.Typer]:
   return None
 
 
-# Import commands dynamically
-commands_path = Path(__file__).parent / "commands"
-for module_info in pkgutil.iter_modules([str(commands_path)]):
-  module_name = f"devexy.commands.{module_info.name}"
-  try:
-    module = importlib.import_module(module_name)
-    typer_instance = get_typer_instance(module)
-    if typer_instance:
-      app.add_typer(typer_instance)
-  except Exception as e:
-    logging.exception(f"Failed to load command module {module_name}: {e}")
+class DevexyGroup(TyperGroup):
+  """Lists commands from COMMANDS, and only imports the one that is run."""
+
+  def parse_args(self, ctx, args):
+    # Click would take the subcommand name as the value of a bare --profile
+    global_args = []
+    for i, arg in enumerate(args):
+      if not arg.startswith("-"):
+        global_args.extend(args[i:])
+        break
+      if arg == PROFILE_OPTION:
+        arg = f"{PROFILE_OPTION}={DEFAULT_PROFILE}"
+      global_args.append(arg)
+    return super().parse_args(ctx, global_args)
+
+  def list_commands(self, ctx):
+    return sorted({*self.commands, *COMMANDS})
+
+  def get_command(self, ctx, cmd_name):
+    if cmd_name in self.commands:
+      return self.commands[cmd_name]
+    if cmd_name in COMMANDS:
+      # A stand-in, enough to list the command in the help
+      return TyperCommand(name=cmd_name, help=COMMANDS[cmd_name][1])
+    return None
+
+  def resolve_command(self, ctx, args):
+    cmd_name, command, args = super().resolve_command(ctx, args)
+    if cmd_name in COMMANDS and cmd_name not in self.commands:
+      command = self.load_command(cmd_name)
+    return cmd_name, command, args
+
+  def load_command(self, cmd_name: str):
+    module_name = COMMANDS[cmd_name][0]
+    typer_instance = get_typer_instance(importlib.import_module(module_name))
+    if not typer_instance:
+      raise RuntimeError(f"Command module {module_name} has no Typer app")
+    command = typer.main.get_command(typer_instance)
+    # Completion is handled by the top level command
+    command.params = [
+      param
+      for param in command.params
+      if param.name not in ("install_completion", "show_completion")
+    ]
+    self.add_command(command, cmd_name)
+    return command
+
+
+app = typer.Typer(no_args_is_help=True, cls=DevexyGroup)
 
 
 @app.callback()
 def main(
+  ctx: typer.Context,
   verbose: bool = typer.Option(
     False,
     "--verbose",
     "-v",
     help="Enable verbose output.",
   ),
+  profile: str = typer.Option(
+    None,
+    PROFILE_OPTION,
+    metavar="[=PATH]",
+    help="Profile the command, writing PATH.pstats and PATH.collapsed. By default,"
+    " they are written to the profiles folder in the app directory.",
+  ),
+  sample_interval: float = typer.Option(
+    SAMPLE_INTERVAL,
+    help="Seconds between samples of every thread while profiling, 0 to disable.",
+  ),
 ):
-  settings.DEBUG = verbose
+  settings.configure(DEBUG=verbose)
   log_level = logging.DEBUG if verbose else logging.INFO
   configure_logger(log_level)
 
+  if profile:
+    if profile == DEFAULT_PROFILE:
+      profile = get_default_profile_path(
+        settings.APP_DIR / "profiles", ctx.invoked_subcommand
+      )
+    profiler = Profiler(profile, sample_interval=sample_interval)
+
+    def write_profile():
+      for path in profiler.stop():
+        typer.echo(f"Wrote {path}", err=True)
+
+    profiler.start()
+    ctx.call_on_close(write_profile)
+
 
 if __name__ == "__main__":
   app()
@@ -1,18 +1,162 @@
+from functools import cache, cached_property
 from pathlib import Path
 
 import typer
-from castaway import config
+from castaway import Config
 
 from devexy.constants import APP_NAME
+from devexy.utils.text import secure_hash
 
-APP_DIR = Path(typer.get_app_dir(APP_NAME))
-APP_DIR.mkdir(parents=True, exist_ok=True)
+ENV_FILE = ".env"
 
-DEBUG: bool = config("DEVEXY_DEBUG", default=False, cast=bool)
 
-KUSTOMIZE_ROOT: Path = config("DEVEXY_KUSTOMIZE_ROOT", default="./k8s/", cast=Path)
-KUSTOMIZE_OVERLAY: str = config("DEVEXY_KUSTOMIZE_OVERLAY", default="local")
-KUSTOMIZE_OVERLAY_DIR = KUSTOMIZE_ROOT / "overlays" / KUSTOMIZE_OVERLAY
-LOCAL_PORT_ANNOTATION: str = config(
-  "DEVEXY_LOCAL_PORT_ANNOTATION", default="devexy/local-port"
-)
+class Settings:
+  """
+  Settings read from the environment, or from `.env`, prefixed with DEVEXY_.
+
+  Nothing is parsed, resolved or created on disk until a setting is first used, and
+  `configure` can override settings without reimporting the modules that use them.
+  """
+
+  def __init__(self, env_file: str | Path = ENV_FILE):
+    self._env_file = env_file
+    self._overrides: dict = {}
+
+  @cached_property
+  def _config(self) -> Config:
+    return Config(self._env_file)
+
+  def _get(self, name: str, default=None, cast=str):
+    if name in self._overrides:
+      return self._overrides[name]
+    return self._config(f"DEVEXY_{name}", default=default, cast=cast)
+
+  @classmethod
+  @cache
+  def names(cls) -> frozenset[str]:
+    return frozenset(
+      name
+      for name, value in vars(cls).items()
+      if name.isupper() and isinstance(value, cached_property)
+    )
+
+  def configure(self, **values):
+    """
+    Overrides settings, and forgets the settings derived from them.
+
+    Args:
+        **values: New values by setting name. None restores a setting to its
+          configured value.
+
+    Raises:
+        AttributeError: If a name is not a setting.
+    """
+    names = self.names()
+    for name, value in values.items():
+      if name not in names:
+        raise AttributeError(f"Unknown setting: {name}")
+      if value is None:
+        self._overrides.pop(name, None)
+      else:
+        self._overrides[name] = value
+    for name in names:
+      self.__dict__.pop(name, None)
+
+  @cached_property
+  def APP_DIR(self) -> Path:
+    app_dir = Path(self._get("APP_DIR") or typer.get_app_dir(APP_NAME))
+    app_dir.mkdir(parents=True, exist_ok=True)
+    return app_dir
+
+  @cached_property
+  def DEBUG(self) -> bool:
+    return self._get("DEBUG", default=False, cast=bool)
+
+  @cached_property
+  def KUSTOMIZE_ROOT(self) -> Path:
+    return self._get("KUSTOMIZE_ROOT", default="./k8s/", cast=Path)
+
+  @cached_property
+  def KUSTOMIZE_OVERLAY(self) -> str:
+    return self._get("KUSTOMIZE_OVERLAY", default="local")
+
+  @cached_property
+  def KUSTOMIZE_OVERLAY_DIR(self) -> Path:
+    return self.KUSTOMIZE_ROOT / "overlays" / self.KUSTOMIZE_OVERLAY
+
+  @cached_property
+  def LOCAL_PORT_ANNOTATION(self) -> str:
+    return self._get("LOCAL_PORT_ANNOTATION", default="devexy/local-port")
+
+  @cached_property
+  def KUBE_BACKEND(self) -> str:
+    return self._get("KUBE_BACKEND", default="kubectl")
+
+  @cached_property
+  def KUBE_API_POOL_SIZE(self) -> int:
+    return self._get("KUBE_API_POOL_SIZE", default=4, cast=int)
+
+  @cached_property
+  def FORWARD_BACKEND(self) -> str:
+    return self._get("FORWARD_BACKEND", default="kubectl")
+
+  @cached_property
+  def FORWARD_POOL_SIZE(self) -> int:
+    return self._get("FORWARD_POOL_SIZE", default=1, cast=int)
+
+  @cached_property
+  def PROXY_IMAGE(self) -> str:
+    return self._get("PROXY_IMAGE", default="nginx:1.27.5-alpine")
+
+  @cached_property
+  def PROXY_WORKER_PROCESSES(self) -> str:
+    return self._get("PROXY_WORKER_PROCESSES", default="auto")
+
+  @cached_property
+  def PROXY_WORKER_CONNECTIONS(self) -> int:
+    return self._get("PROXY_WORKER_CONNECTIONS", default=4096, cast=int)
+
+  @cached_property
+  def PROXY_KEEPALIVE(self) -> int:
+    """Idle connections to the local app each proxy worker keeps open for reuse."""
+    return self._get("PROXY_KEEPALIVE", default=64, cast=int)
+
+  @cached_property
+  def PROXY_BUFFERING(self) -> bool:
+    return self._get("PROXY_BUFFERING", default=True, cast=bool)
+
+  @cached_property
+  def PROXY_BUFFER_SIZE(self) -> str:
+    return self._get("PROXY_BUFFER_SIZE", default="16k")
+
+  @cached_property
+  def PROXY_CONNECT_TIMEOUT(self) -> int:
+    return self._get("PROXY_CONNECT_TIMEOUT", default=5, cast=int)
+
+  @cached_property
+  def PROXY_READ_TIMEOUT(self) -> int:
+    """Seconds to wait on the local app, long enough to sit at a breakpoint."""
+    return self._get("PROXY_READ_TIMEOUT", default=300, cast=int)
+
+  @cached_property
+  def STATE_CACHE_ROOT(self) -> Path:
+    """Where state about the cluster built from KUSTOMIZE_ROOT is kept."""
+    cluster_hash = secure_hash(str(self.KUSTOMIZE_ROOT.resolve()))
+    state_cache_root = self.APP_DIR / "k8s_cache" / cluster_hash
+    state_cache_root.mkdir(parents=True, exist_ok=True)
+    return state_cache_root
+
+
+_settings = Settings()
+configure = _settings.configure
+
+
+def __getattr__(name: str):
+  # Settings are read on access, so `settings.NAME` always reflects `configure`
+  if name in Settings.names():
+    return getattr(_settings, name)
+  raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+  return [*globals(), *Settings.names()]
@@ -0,0 +1,280 @@
+import asyncio
+import copy
+import threading
+import time
+
+from kubernetes import client, config
+from kubernetes.dynamic import DynamicClient
+from kubernetes.dynamic.exceptions import ConflictError, DynamicApiError, NotFoundError
+
+from devexy import settings
+from devexy.k8s.utils import (
+  dict_to_yaml,
+  get_annotations,
+  get_key,
+  get_kind,
+  get_last_applied_configuration,
+  get_name,
+  get_namespace,
+  yaml_to_dicts,
+)
+from devexy.tools.kubectl import Kubectl
+from devexy.utils import logging
+from devexy.utils.serialization import dump_json, load_json
+from devexy.utils.tool_stats import record_call
+
+logger = logging.get_logger(__name__)
+
+FIELD_MANAGER = "devexy"
+# How API requests are named in the tool stats
+API_TOOL_NAME = "kube-api"
+LAST_APPLIED_ANNOTATION = "kubectl.kubernetes.io/last-applied-configuration"
+
+# Lowercase kind -> (apiVersion, Kind), so common lookups skip API discovery
+KNOWN_KINDS = {
+  "deployment": ("apps/v1", "Deployment"),
+  "replicaset": ("apps/v1", "ReplicaSet"),
+  "statefulset": ("apps/v1", "StatefulSet"),
+  "namespace": ("v1", "Namespace"),
+  "pod": ("v1", "Pod"),
+  "service": ("v1", "Service"),
+  "configmap": ("v1", "ConfigMap"),
+}
+
+
+def get_merge_patch(original: dict, modified: dict, current: dict) -> dict:
+  """
+  Computes a three-way JSON merge patch, like `kubectl apply` does.
+
+  Args:
+      original: The configuration applied last time.
+      modified: The configuration to apply now.
+      current: The object in the cluster.
+
+  Returns:
+      A patch setting every field of `modified` that differs in `current`, and
+      deleting the fields of `original` that `modified` no longer has. Fields set by
+      others are kept, and lists are replaced whole.
+  """
+  patch = {}
+  for key, value in modified.items():
+    current_value = current.get(key)
+    if isinstance(value, dict) and isinstance(current_value, dict):
+      original_value = original.get(key)
+      if not isinstance(original_value, dict):
+        original_value = {}
+      nested = get_merge_patch(original_value, value, current_value)
+      if nested:
+        patch[key] = nested
+    elif key not in current or value != current_value:
+      patch[key] = value
+  for key in original:
+    if key not in modified and key in current:
+      patch[key] = None
+  return patch
+
+
+class KubeApi(Kubectl):
+  """
+  Talks to the Kubernetes API directly through the Python client, reusing pooled
+  HTTP connections instead of spawning a `kubectl` process per operation.
+
+  Operations that have no API equivalent here (e.g. port forwarding) still go
+  through the `kubectl` executable.
+  """
+
+  def __init__(self):
+    super().__init__()
+    self._dynamic: DynamicClient = None
+    self._client_lock = threading.Lock()
+
+  @property
+  def concurrency(self) -> int:
+    # More concurrent requests than pooled connections would only wait for one
+    return settings.KUBE_API_POOL_SIZE
+
+  @property
+  def dynamic(self) -> DynamicClient:
+    """The API client, created on first use and shared by every thread."""
+    if self._dynamic is None:
+      with self._client_lock:
+        if self._dynamic is None:
+          configuration = client.Configuration()
+          config.load_kube_config(client_configuration=configuration)
+          configuration.connection_pool_maxsize = settings.KUBE_API_POOL_SIZE
+          self._dynamic = DynamicClient(client.ApiClient(configuration))
+    return self._dynamic
+
+  def _get_api(self, kind: str, api_version: str = None):
+    known = KNOWN_KINDS.get(kind.lower())
+    if known and api_version in (None, known[0]):
+      api_version, kind = known
+    if api_version:
+      return self.dynamic.resources.get(api_version=api_version, kind=kind)
+    return self.dynamic.resources.get(kind=kind)
+
+  def _request(self, method: str, api, **kwargs) -> dict:
+    started = time.perf_counter()
+    try:
+      response = getattr(self.dynamic, method)(api, serialize=False, **kwargs)
+    except Exception as e:
+      # Failed requests count as failures in `devexy stats`, like failed commands
+      duration = time.perf_counter() - started
+      record_call(
+        API_TOOL_NAME, method, [api.kind], duration, exit_code=getattr(e, "status", 1)
+      )
+      raise
+    duration = time.perf_counter() - started
+    record_call(
+      API_TOOL_NAME, method, [api.kind], duration, stdout=response.data, exit_code=0
+    )
+    return load_json(response.data)
+
+  def _list_items(self, kind: str, namespace: str = None) -> list[dict]:
+    api = self._get_api(kind)
+    items = self._request("get", api, namespace=namespace).get("items", [])
+    # Items in API list responses omit their type, unlike `kubectl get` output
+    for item in items:
+      item.setdefault("apiVersion", api.group_version)
+      item.setdefault("kind", api.kind)
+    return items
+
+  def apply(self, yaml_content: str) -> bool:
+    """
+    Applies documents with the client-side semantics of `kubectl apply`, so both
+    backends leave the cluster in the same state. Server-side apply would merge
+    lists like `containers` with those applied by kubectl, instead of replacing them.
+    """
+    changed = False
+    for doc in yaml_to_dicts(yaml_content):
+      api = self._get_api(get_kind(doc), doc.get("apiVersion"))
+      name = get_name(doc)
+      namespace = get_namespace(doc) if api.namespaced else None
+
+      # Record the applied configuration the same way `kubectl apply` does
+      body = copy.deepcopy(doc)
+      annotations = body.setdefault("metadata", {}).setdefault("annotations", {})
+      annotations[LAST_APPLIED_ANNOTATION] = dump_json(doc)
+
+      try:
+        current = self._request("get", api, name=name, namespace=namespace)
+      except NotFoundError:
+        self._request(
+          "create", api, body=body, namespace=namespace, field_manager=FIELD_MANAGER
+        )
+        logger.debug("API apply created %s", get_key(doc))
+        changed = True
+        continue
+
+      original = get_last_applied_configuration(current) or {}
+      if original == doc:
+        # Keep the recorded configuration as written, whichever tool serialized it
+        annotations[LAST_APPLIED_ANNOTATION] = get_annotations(current)[
+          LAST_APPLIED_ANNOTATION
+        ]
+      patch = get_merge_patch(original, body, current)
+      if not patch:
+        logger.debug("API apply for %s changed: False", get_key(doc))
+        continue
+      applied = self._request(
+        "patch",
+        api,
+        body=patch,
+        name=name,
+        namespace=namespace,
+        content_type="application/merge-patch+json",
+        field_manager=FIELD_MANAGER,
+      )
+      resource_version = current["metadata"].get("resourceVersion")
+      result = applied["metadata"].get("resourceVersion") != resource_version
+      logger.debug("API apply for %s changed: %s", get_key(doc), result)
+      changed = changed or result
+    return changed
+
+  def apply_many(self, docs: list[dict], chunk_size: int = None) -> list[bool | None]:
+    # Requests already share pooled connections, so there is nothing to batch
+    results = []
+    for doc in docs:
+      try:
+        results.append(self.apply(dict_to_yaml(doc)))
+      except DynamicApiError as e:
+        logger.error("Failed to apply %s: %s", get_key(doc), e.summary())
+        results.append(None)
+    return results
+
+  def create_namespace_if_not_exists(self, namespace: str) -> bool:
+    body = {"apiVersion": "v1", "kind": "Namespace", "metadata": {"name": namespace}}
+    try:
+      self._request("create", self._get_api("namespace"), body=body)
+      return True
+    except ConflictError:
+      return False
+    except DynamicApiError as e:
+      raise RuntimeError(f"Error creating {namespace}: {e.summary()}") from e
+
+  async def acreate_namespace_if_not_exists(self, namespace: str) -> bool:
+    # The client blocks, so requests run in threads, sharing the connection pool
+    async with self.limit():
+      return await asyncio.to_thread(self.create_namespace_if_not_exists, namespace)
+
+  def get_current_state(
+    self,
+    kind: str,
+    name: str,
+    namespace: str = "default",
+  ) -> dict | None:
+    try:
+      api = self._get_api(kind)
+      return self._request(
+        "get", api, name=name, namespace=namespace if api.namespaced else None
+      )
+    except NotFoundError:
+      return None
+    except DynamicApiError as e:
+      raise RuntimeError(
+        f"Error getting current state for {kind}/{name} in namespace {namespace}: "
+        f"{e.summary()}"
+      ) from e
+
+  def get_resource_docs(
+    self,
+    kind: str,
+    namespace: str = "default",
+  ) -> list[dict]:
+    try:
+      return self._list_items(kind, namespace)
+    except DynamicApiError as e:
+      raise RuntimeError(
+        f"Error fetching resources of kind {kind}: {e.summary()}"
+      ) from e
+
+  def discover_resource_docs(
+    self,
+    kinds: list[str],
+    namespaces: list[str] | None = None,
+  ) -> dict[str, dict]:
+    try:
+      return {
+        get_key(item): item
+        for kind in kinds
+        for item in self._list_items(kind)
+        if namespaces is None or get_namespace(item) in namespaces
+      }
+    except DynamicApiError as e:
+      raise RuntimeError(
+        f"Error discovering resources of kinds {', '.join(kinds)}: {e.summary()}"
+      ) from e
+
+  async def adiscover_resource_docs(
+    self,
+    kinds: list[str],
+    namespaces: list[str] | None = None,
+  ) -> dict[str, dict]:
+    async with self.limit():
+      return await asyncio.to_thread(self.discover_resource_docs, kinds, namespaces)
+
+  def get_namespaces(self) -> list[str]:
+    try:
+      return [get_name(item) for item in self._list_items("namespace")]
+    except DynamicApiError as e:
+      raise RuntimeError(f"Error fetching namespaces: {e.summary()}") from e
@@ -1,15 +1,31 @@
-import json
+import re
 import subprocess
+import threading
+from collections import defaultdict, deque
 
+from devexy import settings
 from devexy.constants import K8S_DEFAULT_NAMESPACE
 from devexy.exceptions import ToolError
-from devexy.k8s.utils import get_last_applied_configuration, get_name
+from devexy.k8s.utils import (
+  dict_to_yaml,
+  get_key,
+  get_kind,
+  get_last_applied_configuration,
+  get_name,
+  get_namespace,
+)
 from devexy.tools.tool import Tool
 from devexy.utils import logging
+from devexy.utils.serialization import load_json
 from devexy.utils.text import quick_hash
 
 logger = logging.get_logger(__name__)
 
+APPLY_CHUNK_SIZE = 50
+APPLY_RESULT_PATTERN = re.compile(
+  r"^(?P<resource>[\w.-]+)/(?P<name>\S+) (?P<action>[\w-]+)"
+)
+
 
 class Kubectl(Tool):
   def __init__(self):
@@ -24,7 +40,51 @@ class Kubectl(Tool):
         return False
       return True
 
-  def create_namespace_if_not_exists(self, namespace: str) -> str:
+  def apply_many(
+    self,
+    docs: list[dict],
+    chunk_size: int = APPLY_CHUNK_SIZE,
+  ) -> list[bool | None]:
+    """Applies documents in order, sending up to `chunk_size` per kubectl invocation.
+
+    Args:
+        docs (list[dict]): The documents to apply.
+        chunk_size (int): The maximum number of documents per invocation.
+
+    Returns:
+        list[bool | None]: For each document, True if it was created or configured,
+        False if it was unchanged, or None if kubectl did not report applying it.
+    """
+    results = []
+    for start in range(0, len(docs), chunk_size):
+      results.extend(self._apply_chunk(docs[start : start + chunk_size]))
+    return results
+
+  def _apply_chunk(self, docs: list[dict]) -> list[bool | None]:
+    yaml_content = "---\n".join(dict_to_yaml(doc) for doc in docs)
+    try:
+      output = self.exec("apply", "-f", "-", input=yaml_content)
+    except ToolError as e:
+      logger.error("kubectl apply failed for some resources: %s", e.stderr)
+      output = e.stdout or ""
+
+    # kubectl reports one `<resource>[.<group>]/<name> <action>` line per object
+    pending = defaultdict(deque)
+    for i, doc in enumerate(docs):
+      pending[(get_kind(doc).lower(), get_name(doc))].append(i)
+
+    results = [None] * len(docs)
+    for line in output.splitlines():
+      match = APPLY_RESULT_PATTERN.match(line.strip())
+      if not match:
+        continue
+      kind = match["resource"].split(".", 1)[0]
+      indexes = pending.get((kind, match["name"]))
+      if indexes:
+        results[indexes.popleft()] = match["action"] != "unchanged"
+    return results
+
+  def create_namespace_if_not_exists(self, namespace: str) -> bool:
     """Safely creates a namespace.
 
     Args:
@@ -37,10 +97,20 @@ class Kubectl(Tool):
       self.exec("create", "namespace", namespace)
       return True
     except ToolError as e:
-      if "AlreadyExists" in e.stderr:
-        return False
-      else:
-        raise RuntimeError(f"Error creating {namespace}: {e.stderr}") from e
+      return self._namespace_exists(namespace, e)
+
+  async def acreate_namespace_if_not_exists(self, namespace: str) -> bool:
+    """Like `create_namespace_if_not_exists`, without blocking the event loop."""
+    try:
+      await self.aexec("create", "namespace", namespace)
+      return True
+    except ToolError as e:
+      return self._namespace_exists(namespace, e)
+
+  def _namespace_exists(self, namespace: str, e: ToolError) -> bool:
+    if "AlreadyExists" in e.stderr:
+      return False
+    raise RuntimeError(f"Error creating {namespace}: {e.stderr}") from e
 
   def resource_exists(
     self,
@@ -90,7 +160,7 @@ class Kubectl(Tool):
     namespace: str = "default",
   ) -> dict | None:
     try:
-      return json.loads(self.exec("get", kind, name, "-n", namespace, "-o", "json"))
+      return load_json(self.exec("get", kind, name, "-n", namespace, "-o", "json"))
     except ToolError as e:
       if "NotFound" in e.stderr:
         return None
@@ -136,6 +206,26 @@ class Kubectl(Tool):
     )
     return process
 
+  def watch(self, kind: str) -> subprocess.Popen:
+    """Starts 'kubectl get --watch' for a kind in all namespaces, in the background.
+
+    Args:
+        kind: The resource kind (e.g., 'deployment').
+
+    Returns:
+        A subprocess.Popen object whose stdout streams JSON watch events.
+    """
+    return self.start(
+      "get",
+      kind,
+      "-A",
+      "--watch",
+      "--output-watch-events",
+      "-o",
+      "json",
+      capture_output=True,
+    )
+
   def get_resource_docs(
     self,
     kind: str,
@@ -155,11 +245,71 @@ class Kubectl(Tool):
     """
     try:
       output = self.exec("get", kind, "-n", namespace, "-o", "json")
-      resources = json.loads(output).get("items", [])
+      resources = load_json(output).get("items", [])
       return resources
     except ToolError as e:
       raise RuntimeError(f"Error fetching resources of kind {kind}: {e.stderr}") from e
 
+  def discover_resource_docs(
+    self,
+    kinds: list[str],
+    namespaces: list[str] | None = None,
+  ) -> dict[str, dict]:
+    """
+    Fetches all resources of the given kinds in a single call.
+
+    Args:
+        kinds (list[str]): The kinds of resource to fetch (e.g., 'deployment').
+        namespaces (list[str] | None): Only return resources in these namespaces.
+          Defaults to all namespaces.
+
+    Returns:
+        dict[str, dict]: The resources represented as dictionaries, keyed by
+          resource key.
+
+    Raises:
+        RuntimeError: If fetching resources fails.
+    """
+    try:
+      output = self.exec(*self._get_discovery_args(kinds, namespaces))
+    except ToolError as e:
+      raise RuntimeError(
+        f"Error discovering resources of kinds {', '.join(kinds)}: {e.stderr}"
+      ) from e
+    return self._get_discovered_docs(output, namespaces)
+
+  async def adiscover_resource_docs(
+    self,
+    kinds: list[str],
+    namespaces: list[str] | None = None,
+  ) -> dict[str, dict]:
+    """Like `discover_resource_docs`, without blocking the event loop."""
+    try:
+      output = await self.aexec(*self._get_discovery_args(kinds, namespaces))
+    except ToolError as e:
+      raise RuntimeError(
+        f"Error discovering resources of kinds {', '.join(kinds)}: {e.stderr}"
+      ) from e
+    return self._get_discovered_docs(output, namespaces)
+
+  def _get_discovery_args(
+    self, kinds: list[str], namespaces: list[str] | None
+  ) -> list[str]:
+    if namespaces is not None and len(namespaces) == 1:
+      scope = ["-n", namespaces[0]]
+    else:
+      scope = ["-A"]
+    return ["get", ",".join(kinds), *scope, "-o", "json"]
+
+  def _get_discovered_docs(
+    self, output: str, namespaces: list[str] | None
+  ) -> dict[str, dict]:
+    docs = {}
+    for item in load_json(output).get("items", []):
+      if namespaces is None or get_namespace(item) in namespaces:
+        docs[get_key(item)] = item
+    return docs
+
   def get_namespaces(self) -> list[str]:
     """
     Fetches all namespaces from the Kubernetes cluster.
@@ -172,10 +322,41 @@ class Kubectl(Tool):
     """
     try:
       output = self.exec("get", "namespaces", "-o", "json")
-      namespaces = [get_name(item) for item in json.loads(output).get("items", [])]
+      namespaces = [get_name(item) for item in load_json(output).get("items", [])]
       return namespaces
     except ToolError as e:
       raise RuntimeError(f"Error fetching namespaces: {e.stderr}") from e
 
 
-kubectl = Kubectl()
+_backends: dict[str, Kubectl] = {}
+_backends_lock = threading.Lock()
+
+
+def get_kubectl() -> Kubectl:
+  """Returns the backend selected by `settings.KUBE_BACKEND`, created on first use."""
+  backend = settings.KUBE_BACKEND
+  with _backends_lock:
+    if backend not in _backends:
+      if backend == "api":
+        from devexy.tools.kube_api import KubeApi
+
+        _backends[backend] = KubeApi()
+      else:
+        _backends[backend] = Kubectl()
+    return _backends[backend]
+
+
+class _SelectedKubectl:
+  """
+  Stands in for the selected backend. The backend is picked when it is first used,
+  not at import, so `settings.configure(KUBE_BACKEND=...)` still takes effect.
+  """
+
+  def __getattr__(self, name: str):
+    return getattr(get_kubectl(), name)
+
+  def __repr__(self) -> str:
+    return f"<kubectl backend {settings.KUBE_BACKEND!r}>"
+
+
+kubectl = _SelectedKubectl()
@@ -1,27 +1,170 @@
+import functools
+import hashlib
+import os
 import subprocess
+from pathlib import Path
+from typing import Iterator
 
-from devexy.tools.tool import Tool
+from devexy import settings
 from devexy.exceptions import ExecutableError
+from devexy.tools.tool import Tool
+from devexy.utils.logging import get_logger
+from devexy.utils.serialization import load_yaml
+
+logger = get_logger(__name__)
+
+KUSTOMIZATION_FILE_NAMES = ("kustomization.yaml", "kustomization.yml", "Kustomization")
+CACHE_SIZE = 5
+
+
+def _is_remote(reference: str) -> bool:
+  return "://" in reference or reference.startswith(("github.com/", "git@"))
+
+
+def _get_kustomization_file(directory: Path) -> Path | None:
+  for name in KUSTOMIZATION_FILE_NAMES:
+    path = directory / name
+    if path.is_file():
+      return path
+  return None
+
+
+def _iter_references(kustomization: dict) -> Iterator[str]:
+  """Yields every file, directory or URL referenced by a kustomization."""
+  for field in (
+    "resources",
+    "bases",
+    "components",
+    "crds",
+    "generators",
+    "transformers",
+    "validators",
+  ):
+    yield from kustomization.get(field) or []
+
+  for patch in kustomization.get("patchesStrategicMerge") or []:
+    if "\n" not in patch:  # Otherwise it is an inline patch
+      yield patch
+
+  for field in ("patches", "patchesJson6902", "replacements"):
+    for entry in kustomization.get(field) or []:
+      if isinstance(entry, dict) and entry.get("path"):
+        yield entry["path"]
+
+  for field in ("configMapGenerator", "secretGenerator"):
+    for generator in kustomization.get(field) or []:
+      for file in generator.get("files") or []:
+        yield file.split("=", 1)[-1]
+      yield from generator.get("envs") or []
+      if generator.get("env"):
+        yield generator["env"]
+
+  openapi = kustomization.get("openapi") or {}
+  if openapi.get("path"):
+    yield openapi["path"]
+
+
+def get_input_files(path: Path) -> tuple[list[Path], list[str]]:
+  """
+  Finds every input reachable from the kustomization in `path`.
+
+  Returns:
+      The local files, and the remote references that cannot be inspected locally.
+  """
+  files: set[Path] = set()
+  remotes: set[str] = set()
+  pending = [Path(path).resolve()]
+  visited: set[Path] = set()
+
+  while pending:
+    directory = pending.pop()
+    if directory in visited:
+      continue
+    visited.add(directory)
+
+    kustomization_file = _get_kustomization_file(directory)
+    if not kustomization_file:
+      continue
+    files.add(kustomization_file)
+    kustomization = load_yaml(kustomization_file.read_text()) or {}
+
+    for reference in _iter_references(kustomization):
+      if not isinstance(reference, str):
+        continue
+      if _is_remote(reference):
+        remotes.add(reference)
+        continue
+      target = (directory / reference).resolve()
+      if target.is_dir():
+        pending.append(target)
+      else:
+        files.add(target)
+
+  return sorted(files), sorted(remotes)
 
 
 class Kustomize(Tool):
-  def __init__(self):
+  def __init__(self, cache_dir: Path | None = None):
     super().__init__("kustomize")
+    self._cache_dir = cache_dir
+
+  @property
+  def cache_dir(self) -> Path:
+    return self._cache_dir or settings.APP_DIR / "kustomize_cache"
+
+  @functools.cached_property
+  def version(self) -> str:
+    return self.exec("version").strip()
 
   @property
   def is_installed(self) -> bool:
     try:
-      self.exec("version")
-      return True
+      return bool(self.version)
     except (subprocess.CalledProcessError, ExecutableError):
       return False
 
-  def build(self, path: str) -> str:
+  def fingerprint(self, path: str, hash_contents: bool = False) -> str:
+    """
+    Fingerprints the inputs of 'kustomize build' on the given path.
+
+    Args:
+        path: The directory containing kustomization.yaml.
+        hash_contents: Whether to hash file contents, instead of trusting that
+          unchanged modification times and sizes mean unchanged files.
+
+    Returns:
+        A hash that changes whenever any input, or the kustomize version, changes.
+    """
+    files, remotes = get_input_files(Path(path))
+    fingerprint = hashlib.sha256()
+    fingerprint.update(f"{self.version}\n{Path(path).resolve()}\n".encode())
+    for file in files:
+      try:
+        stat = file.stat()
+        entry = f"{file}|{stat.st_mtime_ns}|{stat.st_size}"
+        if hash_contents:
+          entry += f"|{hashlib.sha256(file.read_bytes()).hexdigest()}"
+      except FileNotFoundError:
+        entry = f"{file}|missing"
+      fingerprint.update(f"{entry}\n".encode())
+    for remote in remotes:
+      fingerprint.update(f"{remote}\n".encode())
+    return fingerprint.hexdigest()
+
+  def build(
+    self, path: str, use_cache: bool = True, hash_contents: bool = False
+  ) -> str:
     """
     Runs 'kustomize build' on the given path and returns the YAML output.
 
+    The output is cached on disk, and reused for as long as the fingerprint of the
+    build inputs stays the same. Remote bases are fingerprinted by reference only.
+
     Args:
         path: The directory containing kustomization.yaml.
+        use_cache: Whether to use cached output, if any. The cache is refreshed
+          either way.
+        hash_contents: Whether to fingerprint file contents, not just metadata.
 
     Returns:
         The YAML output as a string.
@@ -30,7 +173,31 @@ class Kustomize(Tool):
         subprocess.CalledProcessError: If kustomize build fails.
         ExecutableError: If the kustomize executable is not found.
     """
-    return self.exec("build", path)
+    cache_file = self.cache_dir / f"{self.fingerprint(path, hash_contents)}.yaml"
+    if use_cache and cache_file.is_file():
+      logger.debug("Using cached kustomize build output %s", cache_file)
+      return cache_file.read_text(encoding="utf-8")
+
+    output = self.exec("build", path)
+    try:
+      self._store(cache_file, output)
+    except OSError as e:
+      logger.warning("Failed to cache kustomize build output: %s", e)
+    return output
+
+  def _store(self, cache_file: Path, output: str):
+    self.cache_dir.mkdir(parents=True, exist_ok=True)
+    temp_file = cache_file.with_suffix(".tmp")
+    temp_file.write_text(output, encoding="utf-8")
+    os.replace(temp_file, cache_file)
+
+    cached = sorted(
+      self.cache_dir.glob("*.yaml"),
+      key=lambda file: file.stat().st_mtime,
+      reverse=True,
+    )
+    for stale in cached[CACHE_SIZE:]:
+      stale.unlink(missing_ok=True)
 
 
 kustomize = Kustomize()
@@ -1,15 +1,69 @@
+import asyncio
 import subprocess
+import time
+import weakref
 from typing import List
 
 from devexy.exceptions import ExecutableError, ToolError
 from devexy.utils import proc
+from devexy.utils.tool_stats import record_call
+
+# How many calls to one tool may run at once from async code
+DEFAULT_CONCURRENCY = 8
 
 
 class Tool:
   exe = None
+  concurrency = DEFAULT_CONCURRENCY
 
   def __init__(self, exe: str):
     self.exe = exe
+    # Semaphores belong to the event loop they are used in, so keep one per loop
+    self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+  def _get_args(self, command: str, command_args) -> list[str]:
+    args = [self.exe, command]
+    args.extend([str(x) for x in command_args])
+    return args
+
+  def _get_output(
+    self,
+    args: list[str],
+    result: subprocess.CompletedProcess,
+    raise_on_error: bool,
+  ) -> str | None:
+    if result.returncode == 0:
+      return result.stdout
+    if raise_on_error:
+      raise ToolError(result.returncode, args, result.stdout, result.stderr)
+    return None
+
+  def _record(
+    self,
+    args: list[str],
+    started: float,
+    result: subprocess.CompletedProcess | None = None,
+  ):
+    if result is None:
+      record_call(self.exe, args[1], args[2:], time.perf_counter() - started)
+    else:
+      record_call(
+        self.exe,
+        args[1],
+        args[2:],
+        time.perf_counter() - started,
+        result.stdout,
+        result.stderr,
+        result.returncode,
+      )
+
+  def limit(self) -> asyncio.Semaphore:
+    """Returns the semaphore bounding concurrent calls to the tool in this loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = self._semaphores.get(loop)
+    if semaphore is None:
+      semaphore = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+    return semaphore
 
   def exec(
     self,
@@ -34,20 +88,42 @@ class Tool:
       ToolError: If the command returns a non-zero exit code and `raise_on_error` is `True`.
       ExecutableError: If the executable (`self.exe`) is not found.
     """
-    args = [self.exe, command]
-    args.extend([str(x) for x in command_args])
-
+    args = self._get_args(command, command_args)
+    started = time.perf_counter()
     try:
       result = proc.run(args, input)
-      if result.returncode == 0:
-        return result.stdout
-      else:
-        if raise_on_error:
-          raise ToolError(result.returncode, args, result.stdout, result.stderr)
-        else:
-          return None
     except FileNotFoundError:
+      self._record(args, started)
       raise ExecutableError(f"Executable '{self.exe}' not found.")
+    self._record(args, started, result)
+    return self._get_output(args, result, raise_on_error)
+
+  async def aexec(
+    self,
+    command: str,
+    *command_args: List[str],
+    input=None,
+    raise_on_error=True,
+  ) -> str | None:
+    """
+    Like `exec`, without blocking the event loop. At most `concurrency` calls to
+    the tool run at once, and cancelling the call kills the process.
+
+    Raises:
+      ToolError: If the command returns a non-zero exit code and `raise_on_error`
+        is `True`.
+      ExecutableError: If the executable (`self.exe`) is not found.
+    """
+    args = self._get_args(command, command_args)
+    async with self.limit():
+      started = time.perf_counter()
+      try:
+        result = await proc.arun(args, input)
+      except FileNotFoundError:
+        self._record(args, started)
+        raise ExecutableError(f"Executable '{self.exe}' not found.")
+    self._record(args, started, result)
+    return self._get_output(args, result, raise_on_error)
 
   def start(
     self,
@@ -55,12 +131,43 @@ class Tool:
     *command_args,
     capture_output=False,
   ):
-    """Run a non-blocking command."""
+    """Run a non-blocking command. Only the time taken to start it is recorded."""
     args = [self.exe, command]
     args.extend(command_args)
-    return subprocess.Popen(
-      args,
-      stdout=subprocess.PIPE if capture_output else subprocess.DEVNULL,
-      stderr=subprocess.PIPE if capture_output else subprocess.DEVNULL,
-      text=True,
-    )
+    started = time.perf_counter()
+    try:
+      return subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE if capture_output else subprocess.DEVNULL,
+        stderr=subprocess.PIPE if capture_output else subprocess.DEVNULL,
+        text=True,
+      )
+    finally:
+      self._record(args, started)
+
+  async def astart(
+    self,
+    command: str,
+    *command_args,
+    capture_output=False,
+  ) -> asyncio.subprocess.Process:
+    """
+    Like `start`, returning a process whose output can be read without blocking the
+    event loop. Long running processes do not count towards `concurrency`.
+
+    Raises:
+      ExecutableError: If the executable (`self.exe`) is not found.
+    """
+    args = self._get_args(command, command_args)
+    started = time.perf_counter()
+    try:
+      return await asyncio.create_subprocess_exec(
+        *args,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE if capture_output else subprocess.DEVNULL,
+        stderr=subprocess.PIPE if capture_output else subprocess.DEVNULL,
+      )
+    except FileNotFoundError:
+      raise ExecutableError(f"Executable '{self.exe}' not found.")
+    finally:
+      self._record(args, started)
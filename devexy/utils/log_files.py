@@ -0,0 +1,110 @@
+import os
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+
+BLOCK_SIZE = 64 * 1024
+READ_SIZE = 1024 * 1024
+
+
+def _decode(line: bytes) -> str:
+  return line.rstrip(b"\r").decode("utf-8", errors="replace")
+
+
+def tail_lines(path: Path, count: int, block_size: int = BLOCK_SIZE) -> list[str]:
+  """
+  Reads the last lines of a file, reading backwards from the end in blocks.
+
+  Args:
+      path: The file to read.
+      count: How many lines to return.
+      block_size: How many bytes to read at a time.
+
+  Returns:
+      Up to `count` lines, oldest first, without line endings.
+  """
+  if count <= 0:
+    return []
+
+  blocks = []
+  newlines = 0
+  with open(path, "rb") as f:
+    position = f.seek(0, os.SEEK_END)
+    # One extra line break guarantees that the first of the lines is complete
+    while position > 0 and newlines <= count:
+      size = min(block_size, position)
+      position -= size
+      f.seek(position)
+      block = f.read(size)
+      newlines += block.count(b"\n")
+      blocks.append(block)
+
+  lines = b"".join(reversed(blocks)).splitlines()
+  return [_decode(line) for line in lines[-count:]]
+
+
+def _is_replaced(path: Path, f: BinaryIO) -> bool:
+  """Whether the file at `path` was rotated or truncated since `f` was opened."""
+  try:
+    stat = os.stat(path)
+  except FileNotFoundError:
+    # Between the rotation and the creation of the new file
+    return False
+  return stat.st_ino != os.fstat(f.fileno()).st_ino or stat.st_size < f.tell()
+
+
+def _follow(
+  path: Path,
+  f: BinaryIO,
+  stop: Callable[[], bool],
+  max_interval: float,
+  min_interval: float,
+) -> Iterator[list[str]]:
+  try:
+    partial = b""
+    interval = min_interval
+    while not stop():
+      data = f.read(READ_SIZE)
+      if data:
+        interval = min_interval
+        *lines, partial = (partial + data).split(b"\n")
+        if lines:
+          yield [_decode(line) for line in lines]
+        continue
+
+      if _is_replaced(path, f):
+        f.close()
+        f = open(path, "rb")
+        if partial:
+          yield [_decode(partial)]
+          partial = b""
+        continue
+
+      time.sleep(interval)
+      interval = min(interval * 2, max_interval)
+  finally:
+    f.close()
+
+
+def follow_lines(
+  path: Path,
+  stop: Callable[[], bool] = lambda: False,
+  max_interval: float = 0.5,
+  min_interval: float = 0.01,
+) -> Iterator[list[str]]:
+  """
+  Follows a file from its current end, through rotations and truncations.
+
+  Everything available is read at once. While the file is idle, the wait between
+  checks doubles from `min_interval` up to `max_interval`.
+
+  Returns:
+      An iterator of batches of new lines, without line endings.
+
+  Raises:
+      FileNotFoundError: If the file does not exist.
+  """
+  # Open now rather than on the first iteration, so no line written in between is lost
+  f = open(path, "rb")
+  f.seek(0, os.SEEK_END)
+  return _follow(path, f, stop, max_interval, min_interval)
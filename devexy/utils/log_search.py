@@ -0,0 +1,216 @@
+import bisect
+import datetime
+import logging
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Iterator
+
+from devexy.utils.logging import BACKUP_COUNT
+from devexy.utils.serialization import JSONDecodeError, dump_json, load_json
+
+# Index the first record at or after every INDEX_INTERVAL bytes of each log file
+INDEX_INTERVAL = 64 * 1024
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Matches the start of a record written with LOG_FORMAT
+RECORD_START = re.compile(
+  rb"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3}) - (\S+) - ([A-Z]+) - ", re.MULTILINE
+)
+DURATION_PATTERN = re.compile(r"(\d+)([smhd])")
+DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_time(value: str, now: datetime.datetime | None = None) -> str:
+  """
+  Parses a point in time into the timestamp format of the log.
+
+  Args:
+      value: An ISO date and time, or a duration such as 15m, 2h or 1d, meaning
+        that long ago.
+      now: The time durations are relative to, defaults to the current time.
+
+  Returns:
+      The timestamp as it would appear in the log, which sorts chronologically.
+
+  Raises:
+      ValueError: If the value is neither a date nor a duration.
+  """
+  if match := DURATION_PATTERN.fullmatch(value.strip()):
+    amount, unit = match.groups()
+    delta = datetime.timedelta(**{DURATION_UNITS[unit]: int(amount)})
+    moment = (now or datetime.datetime.now()) - delta
+  else:
+    moment = datetime.datetime.fromisoformat(value.strip())
+  return f"{moment.strftime(TIMESTAMP_FORMAT)},{moment.microsecond // 1000:03d}"
+
+
+def get_log_files(log_file: Path) -> list[Path]:
+  """Returns the log file and its backups that exist, oldest first."""
+  backups = [
+    log_file.with_name(f"{log_file.name}.{i}") for i in range(BACKUP_COUNT, 0, -1)
+  ]
+  return [path for path in [*backups, log_file] if path.is_file()]
+
+
+def _open_map(path: Path) -> mmap.mmap | None:
+  with open(path, "rb") as f:
+    try:
+      return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:  # Empty files cannot be mapped
+      return None
+
+
+class LogIndex:
+  """
+  A sidecar index from timestamps to offsets in each log file.
+
+  Entries are keyed by inode, so they survive the renames of log rotation, and are
+  extended as the current log file grows.
+  """
+
+  def __init__(self, path: Path):
+    self.path = path
+    self._changed = False
+    try:
+      self._files = load_json(path.read_bytes())
+    except (OSError, JSONDecodeError):
+      self._files = {}
+
+  def entries(self, log_file: Path, data: mmap.mmap) -> list[tuple[str, int]]:
+    """Returns (timestamp, offset) pairs for the log file, indexing it if needed."""
+    stat = os.stat(log_file)
+    inode = str(stat.st_ino)
+    index = self._files.get(inode)
+    if not index or index["size"] > stat.st_size:
+      index = {"size": 0, "scanned": 0, "entries": []}
+
+    if index["size"] < stat.st_size:
+      entries = index["entries"]
+      for boundary in range(index["scanned"], len(data), INDEX_INTERVAL):
+        match = RECORD_START.search(data, boundary)
+        if not match:
+          break
+        if not entries or entries[-1][1] != match.start():
+          entries.append([match.group(1).decode(), match.start()])
+        index["scanned"] = boundary + INDEX_INTERVAL
+      index["size"] = stat.st_size
+      self._files[inode] = index
+      self._changed = True
+
+    return [tuple(entry) for entry in index["entries"]]
+
+  def save(self, log_files: list[Path]):
+    """Saves the index, dropping files that no longer exist."""
+    inodes = {str(os.stat(path).st_ino) for path in log_files if path.exists()}
+    stale = set(self._files) - inodes
+    if not self._changed and not stale:
+      return
+    for inode in stale:
+      del self._files[inode]
+    temp_file = self.path.with_suffix(".tmp")
+    temp_file.write_text(dump_json(self._files), encoding="utf-8")
+    os.replace(temp_file, self.path)
+
+
+def _get_range(
+  entries: list[tuple[str, int]], size: int, since: str | None, until: str | None
+) -> tuple[int, int]:
+  """Narrows a file down to the offsets between which records can be in range."""
+  timestamps = [timestamp for timestamp, _ in entries]
+  start, end = 0, size
+  if since:
+    # The record before the first indexed one in range may also be in range
+    position = bisect.bisect_left(timestamps, since) - 1
+    if position >= 0:
+      start = entries[position][1]
+  if until:
+    position = bisect.bisect_right(timestamps, until)
+    if position < len(entries):
+      end = entries[position][1]
+  return start, end
+
+
+def _iter_records(
+  data: mmap.mmap, start: int, end: int, needle: re.Pattern | None
+) -> Iterator[tuple[re.Match, bytes]]:
+  """Yields the header and text of each record, or of those matching the needle."""
+  position = start
+  while position < end:
+    if needle:
+      found = needle.search(data, position, end)
+      if not found:
+        return
+      # Back up to the start of the record the match is in
+      record_start = data.rfind(b"\n", start, found.start()) + 1 or start
+      while record_start > start and not RECORD_START.match(data, record_start):
+        record_start = data.rfind(b"\n", start, record_start - 1) + 1 or start
+    else:
+      record_start = position
+
+    header = RECORD_START.match(data, record_start)
+    following = RECORD_START.search(data, record_start + 1, end)
+    record_end = following.start() if following else end
+    if header:
+      yield header, data[record_start:record_end]
+    position = record_end
+
+
+def search_logs(
+  log_file: Path,
+  since: str | None = None,
+  until: str | None = None,
+  level: int | None = None,
+  logger_name: str | None = None,
+  pattern: str | None = None,
+  regex: bool = False,
+  index_file: Path | None = None,
+) -> Iterator[str]:
+  """
+  Finds log records across the log file and its backups, oldest first.
+
+  Args:
+      log_file: The current log file. Its numbered backups are searched too.
+      since: The earliest timestamp to include, as returned by `parse_time`.
+      until: The latest timestamp to include, as returned by `parse_time`.
+      level: The minimum level to include.
+      logger_name: Only include records of this logger and its children.
+      pattern: Only include records containing this text.
+      regex: Whether `pattern` is a regular expression rather than plain text.
+      index_file: Where to keep the timestamp index, next to the log by default.
+
+  Yields:
+      The matching records, including any continuation lines like tracebacks.
+  """
+  log_files = get_log_files(log_file)
+  index = LogIndex(index_file or log_file.with_name(f"{log_file.name}.index"))
+
+  needle = None
+  if pattern:
+    needle = re.compile((pattern if regex else re.escape(pattern)).encode())
+  elif logger_name:
+    needle = re.compile(re.escape(f" - {logger_name}").encode())
+  logger_prefix = f"{logger_name}." if logger_name else None
+
+  try:
+    for path in log_files:
+      data = _open_map(path)
+      if data is None:
+        continue
+      try:
+        start, end = _get_range(index.entries(path, data), len(data), since, until)
+        for header, record in _iter_records(data, start, end, needle):
+          timestamp, name, level_name = (group.decode() for group in header.groups())
+          if (since and timestamp < since) or (until and timestamp > until):
+            continue
+          record_level = logging.getLevelName(level_name)
+          if level and isinstance(record_level, int) and record_level < level:
+            continue
+          if logger_name and name != logger_name and not name.startswith(logger_prefix):
+            continue
+          yield record.decode("utf-8", errors="replace").rstrip("\r\n")
+      finally:
+        data.close()
+  finally:
+    index.save(log_files)
@@ -1,32 +1,102 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Callable
 
-from devexy.settings import APP_DIR
+from devexy import settings
+from devexy.constants import APP_NAME
 
-LOG_FILE = APP_DIR / "app.log"
+LOG_FILE_NAME = "app.log"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 MAX_BYTES = 1024 * 1024 * 5  # 5MB
 BACKUP_COUNT = 5
+QUEUE_SIZE = 10000
+# How long a logging call may wait for room in a full queue before dropping its record
+QUEUE_TIMEOUT = 0.1
+
+
+class BoundedQueueHandler(QueueHandler):
+  """Hands records to the writer thread, dropping them if it falls too far behind."""
+
+  def __init__(
+    self,
+    log_queue: queue.Queue,
+    timeout: float = QUEUE_TIMEOUT,
+    on_first_record: Callable[[], None] | None = None,
+  ):
+    super().__init__(log_queue)
+    self.timeout = timeout
+    self.dropped = 0
+    self._on_first_record = on_first_record
+
+  def enqueue(self, record: logging.LogRecord):
+    if self._on_first_record:
+      on_first_record, self._on_first_record = self._on_first_record, None
+      on_first_record()
+    try:
+      self.queue.put(record, timeout=self.timeout)
+    except queue.Full:
+      self.dropped += 1
+
+
+_lock = threading.Lock()
+_queue_handler: BoundedQueueHandler | None = None
+_listener: QueueListener | None = None
+
+
+def get_log_file() -> Path:
+  return settings.APP_DIR / LOG_FILE_NAME
+
+
+def _start_listener():
+  """Starts the writer thread, which owns the only handler on the log file."""
+  global _listener
+  with _lock:
+    if _listener is None:
+      file_handler = RotatingFileHandler(
+        get_log_file(),
+        maxBytes=MAX_BYTES,
+        backupCount=BACKUP_COUNT,
+        delay=True,
+      )
+      file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+      _listener = QueueListener(_queue_handler.queue, file_handler)
+      _listener.start()
+      atexit.register(_listener.stop)
+
+
+def _install_pipeline() -> BoundedQueueHandler:
+  """
+  Sends every devexy record through one queue to a single writer thread. The
+  thread and the log file are only set up once something is logged.
+
+  The handler sits on the devexy logger rather than the root one, so records of
+  other libraries, like the Kubernetes client dumping responses, stay out of the log.
+  """
+  global _queue_handler
+  with _lock:
+    if _queue_handler is None:
+      _queue_handler = BoundedQueueHandler(
+        queue.Queue(QUEUE_SIZE), on_first_record=_start_listener
+      )
+      app_logger = logging.getLogger(APP_NAME)
+      app_logger.addHandler(_queue_handler)
+      app_logger.propagate = False
+    return _queue_handler
 
 
 def configure_logger(level):
-  root_logger = logging.getLogger()
-  root_logger.setLevel(level)
-  for handler in root_logger.handlers:
+  _install_pipeline()
+  app_logger = logging.getLogger(APP_NAME)
+  app_logger.setLevel(level)
+  for handler in app_logger.handlers:
     handler.setLevel(level)
 
 
 def get_logger(name):
-  logger = logging.getLogger(name)
-  logger.propagate = False
-
-  if not logger.handlers:
-    rotating_handler = RotatingFileHandler(
-      LOG_FILE,
-      maxBytes=MAX_BYTES,
-      backupCount=BACKUP_COUNT,
-    )
-    rotating_handler.setFormatter(logging.Formatter(LOG_FORMAT))
-    logger.addHandler(rotating_handler)
-
-  return logger
+  _install_pipeline()
+  return logging.getLogger(name)
@@ -1,3 +1,4 @@
+import asyncio
 import subprocess
 from typing import List
 
@@ -30,3 +31,52 @@ def run(
   )
   logger.debug("%s returncode: %s", " ".join(args), result.returncode)
   return result
+
+
+async def arun(
+  args: List[str],
+  input: str = None,
+) -> subprocess.CompletedProcess:
+  """
+  Like `run`, without blocking the event loop. Standard input is closed unless
+  `input` is given.
+
+  If the calling task is cancelled, the process is killed before the cancellation
+  propagates, so cancelled calls do not leave processes behind.
+
+  Args:
+      args: The command to run and all its arguments, as a list of strings.
+
+  Returns:
+      A subprocess.CompletedProcess instance, with a nonzero `returncode` on failure.
+
+  Raises:
+      FileNotFoundError: If the executable is not found.
+  """
+  args = [str(x) for x in args]
+  process = await asyncio.create_subprocess_exec(
+    *args,
+    stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+    stdout=subprocess.PIPE,
+    stderr=subprocess.PIPE,
+  )
+  try:
+    stdout, stderr = await process.communicate(
+      None if input is None else input.encode("utf-8")
+    )
+  except asyncio.CancelledError:
+    if process.returncode is None:
+      try:
+        process.kill()
+      except ProcessLookupError:
+        pass
+      await process.wait()
+    logger.debug("%s cancelled", " ".join(args))
+    raise
+  logger.debug("%s returncode: %s", " ".join(args), process.returncode)
+  return subprocess.CompletedProcess(
+    args,
+    process.returncode,
+    stdout.decode("utf-8"),
+    stderr.decode("utf-8"),
+  )
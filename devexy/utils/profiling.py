@@ -0,0 +1,87 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from devexy.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+SAMPLE_INTERVAL = 0.005
+
+
+def _label(frame) -> str:
+  code = frame.f_code
+  name = getattr(code, "co_qualname", code.co_name)
+  return f"{os.path.basename(code.co_filename)}:{name}".replace(";", ":")
+
+
+class Profiler:
+  """
+  Profiles the calling thread with cProfile, and samples the stacks of every
+  thread, since cProfile does not see the monitoring and forwarding threads.
+
+  Writes `<path>.pstats`, readable with pstats or snakeviz, and `<path>.collapsed`,
+  in the collapsed stack format read by flamegraph.pl, speedscope and inferno.
+  """
+
+  def __init__(self, path: Path, sample_interval: float = SAMPLE_INTERVAL):
+    path = Path(path)
+    if path.suffix in (".pstats", ".collapsed"):
+      path = path.with_suffix("")
+    self.pstats_path = path.with_name(f"{path.name}.pstats")
+    self.collapsed_path = path.with_name(f"{path.name}.collapsed")
+    self.sample_interval = sample_interval
+    self.samples: Counter[str] = Counter()
+    self._profile = cProfile.Profile()
+    self._stopped = threading.Event()
+    self._sampler: threading.Thread | None = None
+
+  def start(self):
+    if self.sample_interval > 0:
+      self._sampler = threading.Thread(
+        target=self._sample, name="profiler", daemon=True
+      )
+      self._sampler.start()
+    self._profile.enable()
+
+  def _sample(self):
+    own_ident = threading.get_ident()
+    while not self._stopped.wait(self.sample_interval):
+      names = {thread.ident: thread.name for thread in threading.enumerate()}
+      for ident, frame in sys._current_frames().items():
+        if ident == own_ident:
+          continue
+        stack = []
+        while frame is not None:
+          stack.append(_label(frame))
+          frame = frame.f_back
+        stack.append(names.get(ident, f"thread-{ident}"))
+        self.samples[";".join(reversed(stack))] += 1
+
+  def stop(self) -> list[Path]:
+    """Stops profiling, and writes the results. Returns the files written."""
+    self._profile.disable()
+    self._stopped.set()
+    if self._sampler:
+      self._sampler.join()
+
+    self.pstats_path.parent.mkdir(parents=True, exist_ok=True)
+    self._profile.dump_stats(self.pstats_path)
+    written = [self.pstats_path]
+    if self._sampler:
+      self.collapsed_path.write_text(
+        "".join(f"{stack} {count}\n" for stack, count in self.samples.items()),
+        encoding="utf-8",
+      )
+      written.append(self.collapsed_path)
+    logger.info("Wrote profile to %s", ", ".join(str(path) for path in written))
+    return written
+
+
+def get_default_profile_path(directory: Path, command: str | None) -> Path:
+  timestamp = time.strftime("%Y%m%d-%H%M%S")
+  return directory / f"{command or 'devexy'}-{timestamp}"
@@ -0,0 +1,61 @@
+import json
+from typing import Any, Iterator
+
+import yaml
+
+# Prefer the libyaml bindings and orjson when available, they are much faster
+try:
+  from yaml import CSafeDumper as SafeDumper
+  from yaml import CSafeLoader as SafeLoader
+except ImportError:
+  from yaml import SafeDumper, SafeLoader
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+YAMLError = yaml.YAMLError
+JSONDecodeError = json.JSONDecodeError
+
+
+def load_yaml(content: str) -> Any:
+  return yaml.load(content, Loader=SafeLoader)
+
+
+def load_yaml_all(content: str) -> Iterator[Any]:
+  return yaml.load_all(content, Loader=SafeLoader)
+
+
+def dump_yaml(doc: Any) -> str:
+  """Serializes the doc to YAML, with keys sorted so the output is stable."""
+  return yaml.dump(doc, Dumper=SafeDumper, sort_keys=True, default_flow_style=False)
+
+
+def load_json(content: str | bytes) -> Any:
+  if orjson:
+    return orjson.loads(content)
+  return json.loads(content)
+
+
+def dump_json(doc: Any) -> str:
+  """Serializes the doc to compact JSON. Non-str keys are written as strings."""
+  if orjson:
+    return orjson.dumps(doc, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+  return json.dumps(doc, separators=(",", ":"), ensure_ascii=False)
+
+
+def canonicalize(doc: Any) -> bytes:
+  """
+  Serializes the doc to its canonical form: compact JSON with sorted keys, encoded
+  as UTF-8. Equal documents always produce the same bytes, so it is suitable for
+  hashing. It always goes through the json module, since orjson formats some values
+  differently, and digests must not depend on whether it is installed.
+  """
+  return json.dumps(
+    doc,
+    sort_keys=True,
+    separators=(",", ":"),
+    ensure_ascii=False,
+    default=str,
+  ).encode("utf-8")
@@ -0,0 +1,136 @@
+import atexit
+import sqlite3
+import threading
+from pathlib import Path
+
+from devexy.utils.logging import get_logger
+from devexy.utils.serialization import JSONDecodeError, dump_json, load_json
+
+logger = get_logger(__name__)
+
+
+class StateStore:
+  """
+  Persists a JSON state document per key in a single SQLite database.
+
+  The database runs in WAL mode. All states are loaded with one query on first
+  access, and writes are buffered in memory, then committed together in a single
+  transaction shortly after the first pending write, or at exit.
+  """
+
+  def __init__(self, path: Path, flush_delay: float = 1.0):
+    self.path = Path(path)
+    self.flush_delay = flush_delay
+    self._lock = threading.RLock()
+    self._connection: sqlite3.Connection | None = None
+    self._states: dict[str, dict] | None = None
+    self._pending: set[str] = set()
+    self._timer: threading.Timer | None = None
+
+  def _connect(self) -> sqlite3.Connection:
+    if self._connection is None:
+      self.path.parent.mkdir(parents=True, exist_ok=True)
+      connection = sqlite3.connect(
+        self.path, check_same_thread=False, isolation_level=None
+      )
+      connection.execute("PRAGMA journal_mode=WAL")
+      connection.execute("PRAGMA synchronous=NORMAL")
+      connection.execute(
+        "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+      )
+      self._connection = connection
+      atexit.register(self.close)
+    return self._connection
+
+  def load_all(self) -> dict[str, dict]:
+    """Returns every stored state by key, reading the database only once."""
+    with self._lock:
+      if self._states is None:
+        states = {}
+        for key, value in self._connect().execute("SELECT key, value FROM state"):
+          try:
+            states[key] = load_json(value)
+          except JSONDecodeError as e:
+            logger.warning("Ignoring invalid state for %s: %s", key, e)
+        logger.debug("Loaded %d states from %s", len(states), self.path)
+        self._states = states
+      return self._states
+
+  def get(self, key: str) -> dict | None:
+    state = self.load_all().get(key)
+    return dict(state) if state is not None else None
+
+  def put(self, key: str, state: dict):
+    with self._lock:
+      self.load_all()[key] = dict(state)
+      self._pending.add(key)
+      self._schedule_flush()
+
+  def delete(self, key: str):
+    with self._lock:
+      self.load_all().pop(key, None)
+      self._pending.add(key)
+      self._schedule_flush()
+
+  def _schedule_flush(self):
+    if self.flush_delay <= 0:
+      self.flush()
+    elif self._timer is None:
+      self._timer = threading.Timer(self.flush_delay, self.flush)
+      self._timer.daemon = True
+      self._timer.start()
+
+  def flush(self):
+    """Commits all pending writes in a single transaction."""
+    with self._lock:
+      if self._timer is not None:
+        self._timer.cancel()
+        self._timer = None
+      if not self._pending:
+        return
+
+      upserts, deletes = [], []
+      for key in self._pending:
+        state = self._states.get(key)
+        if state is None:
+          deletes.append((key,))
+        else:
+          upserts.append((key, dump_json(state)))
+
+      connection = self._connect()
+      try:
+        connection.execute("BEGIN")
+        connection.executemany(
+          "INSERT INTO state (key, value) VALUES (?, ?)"
+          " ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+          upserts,
+        )
+        connection.executemany("DELETE FROM state WHERE key = ?", deletes)
+        connection.execute("COMMIT")
+      except sqlite3.Error as e:
+        if connection.in_transaction:
+          connection.execute("ROLLBACK")
+        logger.error(
+          "Failed to save %d states to %s: %s", len(self._pending), self.path, e
+        )
+        return
+
+      logger.debug("Saved %d states to %s", len(self._pending), self.path)
+      self._pending.clear()
+
+  def clear(self):
+    """Deletes every stored state."""
+    with self._lock:
+      if self._timer is not None:
+        self._timer.cancel()
+        self._timer = None
+      self._pending.clear()
+      self._states = {}
+      self._connect().execute("DELETE FROM state")
+
+  def close(self):
+    with self._lock:
+      self.flush()
+      if self._connection is not None:
+        self._connection.close()
+        self._connection = None
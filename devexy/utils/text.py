@@ -6,6 +6,8 @@ def secure_hash(text: str) -> str:
   return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 
-def quick_hash(text: str) -> str:
+def quick_hash(text: str | bytes) -> str:
   """Calculates the SHA1 hash of the string."""
-  return hashlib.sha1(text.encode("utf-8")).hexdigest()
+  if isinstance(text, str):
+    text = text.encode("utf-8")
+  return hashlib.sha1(text).hexdigest()
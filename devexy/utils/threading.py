@@ -1,13 +1,31 @@
+import asyncio
 import signal
+import threading
 
 
 class Cleanup:
+  """Runs registered callbacks on SIGINT or SIGTERM, once anything is registered."""
+
   def __init__(self):
     self.registry = []
-    signal.signal(signal.SIGTERM, lambda *_: self.cleanup())
-    signal.signal(signal.SIGINT, lambda *_: self.cleanup())
+    self._lock = threading.Lock()
+    self._installed = False
+
+  def install(self):
+    """
+    Installs the signal handlers. Only the main thread can handle signals, so this
+    does nothing from other threads, and callers there must call it early instead.
+    """
+    if threading.current_thread() is not threading.main_thread():
+      return
+    with self._lock:
+      if not self._installed:
+        signal.signal(signal.SIGTERM, lambda *_: self.cleanup())
+        signal.signal(signal.SIGINT, lambda *_: self.cleanup())
+        self._installed = True
 
   def register(self, cleanup_function):
+    self.install()
     self.registry.append(cleanup_function)
 
   def cleanup(self):
@@ -15,4 +33,11 @@ class Cleanup:
       callback()
 
 
+def start_event_loop(name: str) -> asyncio.AbstractEventLoop:
+  """Runs a new event loop in a daemon thread, for code driven from other threads."""
+  loop = asyncio.new_event_loop()
+  threading.Thread(target=loop.run_forever, name=name, daemon=True).start()
+  return loop
+
+
 cleanup = Cleanup()
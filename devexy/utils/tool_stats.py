@@ -0,0 +1,187 @@
+import atexit
+import math
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable
+
+from devexy import settings
+from devexy.utils.logging import get_logger
+from devexy.utils.serialization import JSONDecodeError, dump_json, load_json
+
+logger = get_logger(__name__)
+
+STATS_FILE_NAME = "tool_stats.jsonl"
+# When the file grows past this size, it replaces the previous one as its backup
+MAX_BYTES = 1024 * 1024
+SESSION_ID = uuid.uuid4().hex[:12]
+
+FLUSH_DELAY = 1.0
+
+_lock = threading.Lock()
+_write_lock = threading.Lock()
+_pending: list[dict] = []
+_timer: threading.Timer | None = None
+_exit_hook = False
+
+
+def get_stats_file() -> Path:
+  return settings.APP_DIR / STATS_FILE_NAME
+
+
+def get_arg_shape(args: Iterable[str]) -> str:
+  """
+  Describes the arguments of a call without the values in them, so calls that
+  differ only by resource names or namespaces are grouped together.
+  """
+  shape = []
+  for arg in args:
+    arg = str(arg)
+    if arg.startswith("-"):
+      shape.append(arg.split("=", 1)[0] + ("=_" if "=" in arg else ""))
+    else:
+      shape.append("_")
+  return " ".join(shape)
+
+
+def _get_size(output: str | bytes | None) -> int:
+  if not output:
+    return 0
+  return len(output.encode("utf-8")) if isinstance(output, str) else len(output)
+
+
+def record_call(
+  tool: str,
+  subcommand: str,
+  args: Iterable[str],
+  duration: float,
+  stdout: str | bytes | None = None,
+  stderr: str | bytes | None = None,
+  exit_code: int | None = None,
+):
+  """
+  Records the timing of one tool invocation. Records are kept in memory and
+  appended to the stats file together, shortly after the first one or at exit, so
+  calls made from an event loop never wait on the disk.
+  """
+  call = {
+    "at": round(time.time(), 3),
+    "session": SESSION_ID,
+    "tool": tool,
+    "subcommand": subcommand,
+    "args": get_arg_shape(args),
+    "duration": round(duration, 6),
+    "stdout_bytes": _get_size(stdout),
+    "stderr_bytes": _get_size(stderr),
+    "exit_code": exit_code,
+  }
+  global _timer, _exit_hook
+  with _lock:
+    _pending.append(call)
+    if not _exit_hook:
+      atexit.register(flush)
+      _exit_hook = True
+    if _timer is None:
+      _timer = threading.Timer(FLUSH_DELAY, flush)
+      _timer.daemon = True
+      _timer.start()
+
+
+def flush():
+  """Appends the pending records to the stats file, rolling it over when too big."""
+  global _timer
+  with _lock:
+    if _timer is not None:
+      _timer.cancel()
+      _timer = None
+    calls, _pending[:] = list(_pending), []
+  if not calls:
+    return
+
+  stats_file = get_stats_file()
+  with _write_lock:
+    try:
+      size = stats_file.stat().st_size if stats_file.exists() else 0
+      lines = []
+      for call in calls:
+        if size > MAX_BYTES:
+          _append(stats_file, lines)
+          os.replace(stats_file, stats_file.with_name(f"{stats_file.name}.1"))
+          lines, size = [], 0
+        line = dump_json(call) + "\n"
+        lines.append(line)
+        size += len(line.encode("utf-8"))
+      _append(stats_file, lines)
+    except OSError as e:
+      logger.warning("Failed to record %d tool calls: %s", len(calls), e)
+
+
+def _append(stats_file: Path, lines: list[str]):
+  with open(stats_file, "a", encoding="utf-8") as f:
+    f.writelines(lines)
+
+
+def load_calls(stats_file: Path | None = None) -> list[dict]:
+  """Loads the recorded calls, oldest first, including those in the backup."""
+  flush()
+  stats_file = stats_file or get_stats_file()
+  calls = []
+  for path in (stats_file.with_name(f"{stats_file.name}.1"), stats_file):
+    try:
+      lines = path.read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+      continue
+    for line in lines:
+      try:
+        calls.append(load_json(line))
+      except JSONDecodeError:
+        logger.debug("Skipping invalid line in %s", path)
+  return calls
+
+
+def percentile(values: list[float], percent: float) -> float:
+  """Returns the nearest-rank percentile of already sorted values."""
+  if not values:
+    return 0.0
+  rank = max(math.ceil(percent / 100 * len(values)), 1)
+  return values[rank - 1]
+
+
+def summarize(calls: list[dict], sessions: int | None = None) -> list[dict]:
+  """
+  Summarizes call latency per tool and subcommand.
+
+  Args:
+      calls: Recorded calls, oldest first.
+      sessions: Only include calls from this many of the most recent sessions.
+
+  Returns:
+      One summary per tool and subcommand, slowest p95 first.
+  """
+  if sessions:
+    recent = list(dict.fromkeys(call.get("session") for call in reversed(calls)))
+    recent = set(recent[:sessions])
+    calls = [call for call in calls if call.get("session") in recent]
+
+  groups = defaultdict(list)
+  for call in calls:
+    groups[(call.get("tool"), call.get("subcommand"))].append(call)
+
+  summaries = []
+  for (tool, subcommand), group in groups.items():
+    durations = sorted(call.get("duration", 0.0) for call in group)
+    summaries.append(
+      {
+        "tool": tool,
+        "subcommand": subcommand,
+        "calls": len(group),
+        "failures": sum(1 for call in group if call.get("exit_code") not in (0, None)),
+        "p50": percentile(durations, 50),
+        "p95": percentile(durations, 95),
+        "p99": percentile(durations, 99),
+      }
+    )
+  return sorted(summaries, key=lambda summary: summary["p95"], reverse=True)
@@ -0,0 +1,191 @@
+import asyncio
+import base64
+import hashlib
+import os
+import ssl
+import struct
+
+# Appended to the client key to compute the accept header, per RFC 6455
+HANDSHAKE_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_HEADER_BYTES = 64 * 1024
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketError(Exception):
+  """Raised when the handshake fails, or the peer breaks the protocol."""
+
+
+def get_accept_key(key: str) -> str:
+  digest = hashlib.sha1((key + HANDSHAKE_GUID).encode("ascii")).digest()
+  return base64.b64encode(digest).decode("ascii")
+
+
+def _apply_mask(key: bytes, payload: bytes) -> bytes:
+  # XOR with the key repeated over the payload, as one big integer rather than per byte
+  length = len(payload)
+  repeated = (key * (length // 4 + 1))[:length]
+  return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(
+    length, "big"
+  )
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = True) -> bytes:
+  """Encodes one final frame. Clients must mask their frames, servers must not."""
+  length = len(payload)
+  if length < 126:
+    header = struct.pack("!BB", 0x80 | opcode, (0x80 if mask else 0) | length)
+  elif length < 1 << 16:
+    header = struct.pack("!BBH", 0x80 | opcode, (0x80 if mask else 0) | 126, length)
+  else:
+    header = struct.pack("!BBQ", 0x80 | opcode, (0x80 if mask else 0) | 127, length)
+  if not mask:
+    return header + payload
+  key = os.urandom(4)
+  return header + key + _apply_mask(key, payload)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[bool, int, bytes]:
+  """
+  Reads one frame, unmasking it if needed.
+
+  Returns:
+      Whether the frame is final, its opcode and its payload.
+
+  Raises:
+      asyncio.IncompleteReadError: If the connection closes mid frame.
+  """
+  first, second = await reader.readexactly(2)
+  length = second & 0x7F
+  if length == 126:
+    (length,) = struct.unpack("!H", await reader.readexactly(2))
+  elif length == 127:
+    (length,) = struct.unpack("!Q", await reader.readexactly(8))
+  key = await reader.readexactly(4) if second & 0x80 else None
+  payload = await reader.readexactly(length)
+  if key:
+    payload = _apply_mask(key, payload)
+  return bool(first & 0x80), first & 0x0F, payload
+
+
+class WebSocket:
+  """
+  A minimal websocket client, enough for the Kubernetes streaming protocols: binary
+  messages, pings and closing. Messages are read and written whole.
+  """
+
+  def __init__(
+    self,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    subprotocol: str | None = None,
+    mask: bool = True,
+  ):
+    self.reader = reader
+    self.writer = writer
+    self.subprotocol = subprotocol
+    self._mask = mask
+    self.closed = False
+
+  @classmethod
+  async def connect(
+    cls,
+    host: str,
+    port: int,
+    path: str,
+    headers: dict[str, str] | None = None,
+    ssl_context: ssl.SSLContext | None = None,
+    subprotocols: list[str] | None = None,
+  ) -> "WebSocket":
+    """
+    Opens a websocket connection.
+
+    Args:
+        host: The server to connect to.
+        port: The port of the server.
+        path: The request path, including any query string.
+        headers: Extra request headers, like Authorization.
+        ssl_context: Connects with TLS when given.
+        subprotocols: The subprotocols to offer, in order of preference.
+
+    Raises:
+        WebSocketError: If the server does not accept the connection.
+        OSError: If the server cannot be reached.
+    """
+    reader, writer = await asyncio.open_connection(
+      host, port, ssl=ssl_context, limit=MAX_HEADER_BYTES
+    )
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    request = [
+      f"GET {path} HTTP/1.1",
+      f"Host: {host}:{port}",
+      "Upgrade: websocket",
+      "Connection: Upgrade",
+      f"Sec-WebSocket-Key: {key}",
+      "Sec-WebSocket-Version: 13",
+    ]
+    if subprotocols:
+      request.append(f"Sec-WebSocket-Protocol: {', '.join(subprotocols)}")
+    request.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(request) + "\r\n\r\n").encode("latin-1"))
+
+    try:
+      response = await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+      writer.close()
+      raise WebSocketError("Invalid handshake response") from e
+    status, *lines = response.decode("latin-1").split("\r\n")
+    response_headers = {}
+    for line in lines:
+      if ":" in line:
+        name, value = line.split(":", 1)
+        response_headers[name.strip().lower()] = value.strip()
+
+    if status.split(" ", 2)[1:2] != ["101"]:
+      writer.close()
+      raise WebSocketError(f"Handshake failed: {status}")
+    if response_headers.get("sec-websocket-accept") != get_accept_key(key):
+      writer.close()
+      raise WebSocketError("Handshake failed: invalid accept key")
+    return cls(reader, writer, response_headers.get("sec-websocket-protocol"))
+
+  async def send(self, data: bytes, opcode: int = OP_BINARY):
+    self.writer.write(encode_frame(opcode, data, mask=self._mask))
+    await self.writer.drain()
+
+  async def recv(self) -> bytes | None:
+    """Returns the next message, or None once the connection is closed."""
+    message = []
+    while not self.closed:
+      try:
+        final, opcode, payload = await read_frame(self.reader)
+      except (asyncio.IncompleteReadError, ConnectionError):
+        self.closed = True
+        return None
+      if opcode == OP_PING:
+        await self.send(payload, OP_PONG)
+      elif opcode == OP_CLOSE:
+        await self.close()
+        return None
+      elif opcode in (OP_TEXT, OP_BINARY, OP_CONTINUATION):
+        message.append(payload)
+        if final:
+          return b"".join(message)
+    return None
+
+  async def close(self):
+    if self.closed:
+      return
+    self.closed = True
+    try:
+      self.writer.write(encode_frame(OP_CLOSE, b"", mask=self._mask))
+      await self.writer.drain()
+    except ConnectionError:
+      pass
+    finally:
+      self.writer.close()
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from devexy import settings
+from devexy.utils import tool_stats
+
+
+@pytest.fixture(scope="session", autouse=True)
+def default_app_dir(tmp_path_factory):
+  """
+  Points the configured app directory away from the real one, so a test that
+  restores it, or a record flushed late, never writes there.
+  """
+  previous = os.environ.get("DEVEXY_APP_DIR")
+  os.environ["DEVEXY_APP_DIR"] = str(tmp_path_factory.mktemp("app"))
+  settings.configure(APP_DIR=None)
+  yield
+  tool_stats.flush()
+  if previous is None:
+    del os.environ["DEVEXY_APP_DIR"]
+  else:
+    os.environ["DEVEXY_APP_DIR"] = previous
+  settings.configure(APP_DIR=None)
+
+
+@pytest.fixture(autouse=True)
+def app_dir(tmp_path):
+  """Gives each test its own app directory for stats and state."""
+  settings.configure(APP_DIR=tmp_path)
+  yield tmp_path
+  # Records still buffered belong to this test
+  tool_stats.flush()
+  settings.configure(APP_DIR=None)
@@ -0,0 +1,42 @@
+from devexy.k8s.models.doc_view import DocView
+from devexy.k8s.models.resource import Resource
+from devexy.k8s.utils import get_annotations, get_spec
+
+
+def _doc():
+  return {
+    "kind": "Deployment",
+    "metadata": {
+      "name": "api",
+      "namespace": "ns-a",
+      "annotations": {"devexy/local-port": "8080"},
+    },
+    "spec": {"template": {"spec": {"containers": [{"name": "api"}]}}},
+  }
+
+
+def test_accessors_do_not_copy():
+  doc = _doc()
+  assert get_spec(doc) is doc["spec"]
+  assert get_annotations(doc) is doc["metadata"]["annotations"]
+  assert get_annotations({}) == {}
+
+
+def test_doc_view_computes_fields_once():
+  view = DocView(_doc())
+  assert view.key == "ns-a/deployment/api"
+  view.doc["metadata"]["name"] = "web"
+  assert view.key == "ns-a/deployment/api"
+  assert DocView(view.doc).key == "ns-a/deployment/web"
+  assert view.first_container == {"name": "api"}
+  assert view.last_applied is None
+
+
+def test_resource_copies_doc_only_when_modified():
+  doc = _doc()
+  resource = Resource(doc)
+  assert resource.view.doc is doc
+  resource.set_replicas(1)
+  assert resource.view.doc is not doc
+  assert "replicas" not in doc["spec"]
+  assert resource.view.doc["spec"]["replicas"] == 1
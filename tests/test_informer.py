@@ -0,0 +1,125 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from devexy.k8s.informer import Informer, _log_errors, iter_json_documents
+
+
+def _deployment(name, namespace="test-ns", replicas=1):
+  return {
+    "apiVersion": "apps/v1",
+    "kind": "Deployment",
+    "metadata": {"name": name, "namespace": namespace},
+    "status": {"availableReplicas": replicas},
+  }
+
+
+def _event(event_type, doc):
+  return {"type": event_type, "object": doc}
+
+
+@pytest.fixture
+def informer(mocker):
+  mocker.patch("devexy.k8s.informer.threading.Thread")
+  mocker.patch("devexy.k8s.informer.atexit")
+  mocker.patch("devexy.k8s.informer.cleanup")
+  return Informer()
+
+
+def _subscriber(key, kind="Deployment"):
+  resource = MagicMock()
+  resource.key = key
+  resource.kind = kind
+  return resource
+
+
+def test_iter_json_documents_decodes_pretty_printed_stream():
+  events = [_event("ADDED", _deployment("a")), _event("MODIFIED", _deployment("b"))]
+  stream = "".join(json.dumps(e, indent=4) + "\n" for e in events)
+  assert list(iter_json_documents(stream.splitlines(keepends=True))) == events
+
+
+def test_iter_json_documents_decodes_compact_stream():
+  events = [_event("ADDED", _deployment("a")), _event("ADDED", _deployment("b"))]
+  stream = "".join(json.dumps(e) + "\n" for e in events)
+  assert list(iter_json_documents(stream.splitlines(keepends=True))) == events
+
+
+def test_iter_json_documents_waits_for_complete_document():
+  lines = json.dumps(_deployment("a"), indent=4).splitlines(keepends=True)
+  documents = iter_json_documents(iter(lines))
+  assert next(documents) == _deployment("a")
+
+
+def test_subscribe_starts_one_watch_per_kind(informer):
+  informer.subscribe(_subscriber("test-ns/deployment/a"))
+  informer.subscribe(_subscriber("test-ns/deployment/b"))
+  informer.subscribe(_subscriber("test-ns/statefulset/c", kind="StatefulSet"))
+  assert set(informer._watchers) == {"deployment", "statefulset"}
+
+
+def test_dispatch_routes_event_by_key(informer):
+  a = _subscriber("test-ns/deployment/a")
+  b = _subscriber("test-ns/deployment/b")
+  informer.subscribe(a)
+  informer.subscribe(b)
+
+  doc = _deployment("a")
+  informer.dispatch(_event("MODIFIED", doc))
+
+  a.observe.assert_called_once_with(doc)
+  b.observe.assert_not_called()
+
+
+def test_dispatch_deleted_event_clears_state(informer):
+  a = _subscriber("test-ns/deployment/a")
+  informer.subscribe(a)
+  informer.dispatch(_event("DELETED", _deployment("a")))
+  a.observe.assert_called_once_with(None)
+
+
+def test_late_subscriber_receives_last_observed_state(informer):
+  doc = _deployment("a")
+  informer.dispatch(_event("ADDED", doc))
+  a = _subscriber("test-ns/deployment/a")
+  informer.subscribe(a)
+  a.observe.assert_called_once_with(doc)
+
+
+def test_reconcile_dispatches_deletions_missed_while_down(informer, mocker):
+  kubectl = mocker.patch("devexy.k8s.informer.kubectl")
+  kubectl.discover_resource_docs.return_value = {
+    "test-ns/deployment/a": _deployment("a")
+  }
+  a = _subscriber("test-ns/deployment/a")
+  b = _subscriber("test-ns/deployment/b")
+  informer.subscribe(a)
+  informer.subscribe(b)
+  informer.dispatch(_event("ADDED", _deployment("a")))
+  informer.dispatch(_event("ADDED", _deployment("b")))
+  a.observe.reset_mock()
+
+  informer.reconcile("deployment", informer._get_observed_keys("deployment"))
+
+  kubectl.discover_resource_docs.assert_called_once_with(["deployment"])
+  a.observe.assert_not_called()
+  b.observe.assert_called_with(None)
+  assert informer._get_observed_keys("deployment") == {"test-ns/deployment/a"}
+
+
+def test_stop_all_terminates_watch_processes(informer):
+  process = MagicMock()
+  informer._processes["deployment"] = process
+  informer.stop_all()
+  process.terminate.assert_called_once_with()
+  assert informer._stopping
+  assert not informer._processes
+
+
+def test_watch_errors_are_drained_into_the_log(mocker):
+  warning = mocker.patch("devexy.k8s.informer.logger.warning")
+  _log_errors("deployment", iter(["Warning: deprecated\n", "\n"]))
+  warning.assert_called_once_with(
+    "Watch for %s resources: %s", "deployment", "Warning: deprecated"
+  )
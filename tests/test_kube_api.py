@@ -0,0 +1,141 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+import yaml
+from kubernetes.client.rest import ApiException
+from kubernetes.dynamic.exceptions import ConflictError, NotFoundError
+
+from devexy.tools.kube_api import LAST_APPLIED_ANNOTATION, KubeApi
+
+
+def _response(body):
+  return MagicMock(data=json.dumps(body).encode("utf-8"))
+
+
+def _api_error(error_class, status):
+  return error_class(ApiException(status=status))
+
+
+@pytest.fixture
+def api_resource():
+  resource = MagicMock()
+  resource.namespaced = True
+  resource.group_version = "apps/v1"
+  resource.kind = "Deployment"
+  return resource
+
+
+@pytest.fixture
+def kube_api(api_resource):
+  kube_api = KubeApi()
+  kube_api._dynamic = MagicMock()
+  kube_api._dynamic.resources.get.return_value = api_resource
+  return kube_api
+
+
+def test_get_current_state(kube_api):
+  doc = {"kind": "Deployment", "metadata": {"name": "test-deploy"}}
+  kube_api.dynamic.get.return_value = _response(doc)
+  assert kube_api.get_current_state("deployment", "test-deploy") == doc
+  kube_api.dynamic.resources.get.assert_called_once_with(
+    api_version="apps/v1", kind="Deployment"
+  )
+
+
+def test_get_current_state_not_found(kube_api):
+  kube_api.dynamic.get.side_effect = _api_error(NotFoundError, 404)
+  assert kube_api.get_current_state("deployment", "test-deploy") is None
+
+
+def test_get_resource_docs_fills_in_item_types(kube_api):
+  items = [{"metadata": {"name": "a", "namespace": "test-ns"}}]
+  kube_api.dynamic.get.return_value = _response({"items": items})
+  docs = kube_api.get_resource_docs("deployment", "test-ns")
+  assert docs[0]["kind"] == "Deployment"
+  assert docs[0]["apiVersion"] == "apps/v1"
+
+
+def test_discover_resource_docs_groups_by_key(kube_api):
+  items = [{"metadata": {"name": "a", "namespace": "test-ns"}}]
+  kube_api.dynamic.get.return_value = _response({"items": items})
+  assert list(kube_api.discover_resource_docs(["deployment"])) == [
+    "test-ns/deployment/a"
+  ]
+
+
+def test_create_namespace_if_not_exists_created(kube_api):
+  kube_api.dynamic.create.return_value = _response({})
+  assert kube_api.create_namespace_if_not_exists("test-ns") is True
+
+
+def test_create_namespace_if_not_exists_already_exists(kube_api):
+  kube_api.dynamic.create.side_effect = _api_error(ConflictError, 409)
+  assert kube_api.create_namespace_if_not_exists("test-ns") is False
+
+
+def test_apply_records_last_applied_configuration(kube_api):
+  doc = {
+    "apiVersion": "apps/v1",
+    "kind": "Deployment",
+    "metadata": {"name": "test-deploy", "namespace": "test-ns"},
+  }
+  kube_api.dynamic.get.side_effect = _api_error(NotFoundError, 404)
+  kube_api.dynamic.create.return_value = _response(
+    {"metadata": {"resourceVersion": "1"}}
+  )
+
+  assert kube_api.apply(yaml.dump(doc)) is True
+
+  body = kube_api.dynamic.create.call_args.kwargs["body"]
+  assert json.loads(body["metadata"]["annotations"][LAST_APPLIED_ANNOTATION]) == doc
+
+
+def test_apply_unchanged(kube_api):
+  doc = {"apiVersion": "v1", "kind": "ConfigMap", "metadata": {"name": "test-cm"}}
+  current = {
+    "apiVersion": "v1",
+    "kind": "ConfigMap",
+    "metadata": {
+      "name": "test-cm",
+      "resourceVersion": "7",
+      "annotations": {LAST_APPLIED_ANNOTATION: json.dumps(doc)},
+    },
+  }
+  kube_api.dynamic.get.return_value = _response(current)
+  assert kube_api.apply(yaml.dump(doc)) is False
+  kube_api.dynamic.patch.assert_not_called()
+
+
+def test_apply_replaces_lists_like_kubectl(kube_api):
+  app = {"name": "app", "image": "app:1", "ports": [{"containerPort": 80}]}
+  proxy = {"name": "proxy", "image": "nginx", "ports": [{"containerPort": 80}]}
+  original = {
+    "apiVersion": "apps/v1",
+    "kind": "Deployment",
+    "metadata": {"name": "api", "namespace": "test-ns", "labels": {"tier": "web"}},
+    "spec": {"template": {"spec": {"containers": [app]}}},
+  }
+  current = json.loads(json.dumps(original))
+  current["metadata"]["resourceVersion"] = "7"
+  current["metadata"]["annotations"] = {
+    LAST_APPLIED_ANNOTATION: json.dumps(original),
+    "deployment.kubernetes.io/revision": "3",
+  }
+  modified = json.loads(json.dumps(original))
+  del modified["metadata"]["labels"]
+  modified["spec"]["template"]["spec"]["containers"] = [proxy]
+  kube_api.dynamic.get.return_value = _response(current)
+  kube_api.dynamic.patch.return_value = _response(
+    {"metadata": {"resourceVersion": "8"}}
+  )
+
+  assert kube_api.apply(yaml.dump(modified)) is True
+
+  call = kube_api.dynamic.patch.call_args
+  assert call.kwargs["content_type"] == "application/merge-patch+json"
+  patch = call.kwargs["body"]
+  assert patch["spec"] == {"template": {"spec": {"containers": [proxy]}}}
+  assert patch["metadata"]["labels"] is None
+  assert set(patch["metadata"]["annotations"]) == {LAST_APPLIED_ANNOTATION}
+  assert "resourceVersion" not in patch["metadata"]
@@ -1,9 +1,15 @@
+import asyncio
+import json
+import time
 from subprocess import CompletedProcess
 
 import pytest
 import yaml
 
-from devexy.tools.kubectl import kubectl
+from devexy import settings
+from devexy.k8s.utils import SCALABLE_KINDS
+from devexy.tools.kube_api import KubeApi
+from devexy.tools.kubectl import Kubectl, get_kubectl, kubectl
 
 
 def test_apply_success(mocker):
@@ -72,6 +78,23 @@ def test_create_namespace_if_not_exists_already_exists(mocker):
   assert result is False
 
 
+def test_acreate_namespace_if_not_exists(mocker):
+  mocker.patch(
+    "devexy.utils.proc.arun",
+    side_effect=[
+      CompletedProcess(args=[], returncode=0, stdout="namespace/test-ns created"),
+      CompletedProcess(
+        args=[], returncode=1, stderr="Error from server (AlreadyExists)"
+      ),
+      CompletedProcess(args=[], returncode=1, stderr="Forbidden"),
+    ],
+  )
+  assert asyncio.run(kubectl.acreate_namespace_if_not_exists("test-ns")) is True
+  assert asyncio.run(kubectl.acreate_namespace_if_not_exists("test-ns")) is False
+  with pytest.raises(RuntimeError):
+    asyncio.run(kubectl.acreate_namespace_if_not_exists("test-ns"))
+
+
 def test_resource_exists_yes(mocker):
   mocker.patch(
     "devexy.utils.proc.run",
@@ -216,3 +239,166 @@ def test_get_replicas_failure(mocker):
       "deployment",
       "default",
     )
+
+
+def _list_output(*items):
+  return json.dumps({"apiVersion": "v1", "kind": "List", "items": list(items)})
+
+
+def _scalable_doc(kind, name, namespace):
+  return {
+    "apiVersion": "apps/v1",
+    "kind": kind,
+    "metadata": {"name": name, "namespace": namespace},
+  }
+
+
+def test_discover_resource_docs_groups_by_key(mocker):
+  mock_run = mocker.patch(
+    "devexy.utils.proc.run",
+    return_value=CompletedProcess(
+      args=[],
+      returncode=0,
+      stdout=_list_output(
+        _scalable_doc("Deployment", "api", "ns-a"),
+        _scalable_doc("StatefulSet", "db", "ns-b"),
+      ),
+    ),
+  )
+  docs = kubectl.discover_resource_docs(SCALABLE_KINDS)
+  assert set(docs) == {"ns-a/deployment/api", "ns-b/statefulset/db"}
+  mock_run.assert_called_once()
+  args = mock_run.call_args.args[0]
+  assert args[:3] == ["kubectl", "get", "deployment,replicaset,statefulset"]
+  assert "-A" in args
+
+
+def test_adiscover_resource_docs_filters_namespaces(mocker):
+  mock_arun = mocker.patch(
+    "devexy.utils.proc.arun",
+    return_value=CompletedProcess(
+      args=[],
+      returncode=0,
+      stdout=_list_output(
+        _scalable_doc("Deployment", "api", "ns-a"),
+        _scalable_doc("Deployment", "web", "ns-c"),
+      ),
+    ),
+  )
+  docs = asyncio.run(
+    kubectl.adiscover_resource_docs(SCALABLE_KINDS, namespaces=["ns-a", "ns-b"])
+  )
+  assert list(docs) == ["ns-a/deployment/api"]
+  assert "-A" in mock_arun.call_args.args[0]
+
+
+def test_discover_resource_docs_failure(mocker):
+  mocker.patch(
+    "devexy.utils.proc.run",
+    return_value=CompletedProcess(args=[], returncode=1, stderr="Unexpected error"),
+  )
+  with pytest.raises(RuntimeError):
+    kubectl.discover_resource_docs(SCALABLE_KINDS)
+
+
+def test_discover_resource_docs_is_faster_than_per_namespace_queries(mocker):
+  namespaces = [f"ns-{i}" for i in range(40)]
+  latency = 0.002
+
+  def fake_run(args, input=None):
+    time.sleep(latency)
+    if args[2] == "namespaces":
+      items = [{"metadata": {"name": ns}} for ns in namespaces]
+    elif "-A" in args:
+      items = [
+        _scalable_doc(kind, "app", ns)
+        for ns in namespaces
+        for kind in ("Deployment", "ReplicaSet", "StatefulSet")
+      ]
+    else:
+      kind, ns = args[2], args[4]
+      items = [_scalable_doc(kind.capitalize(), "app", ns)]
+    return CompletedProcess(args=args, returncode=0, stdout=_list_output(*items))
+
+  mock_run = mocker.patch("devexy.utils.proc.run", side_effect=fake_run)
+
+  start = time.perf_counter()
+  per_namespace_docs = [
+    doc
+    for ns in kubectl.get_namespaces()
+    for kind in SCALABLE_KINDS
+    for doc in kubectl.get_resource_docs(kind=kind, namespace=ns)
+  ]
+  per_namespace_duration = time.perf_counter() - start
+  per_namespace_calls = mock_run.call_count
+
+  mock_run.reset_mock()
+  start = time.perf_counter()
+  discovered_docs = kubectl.discover_resource_docs(SCALABLE_KINDS)
+  discovery_duration = time.perf_counter() - start
+
+  assert len(discovered_docs) == len(per_namespace_docs)
+  assert per_namespace_calls == 1 + len(namespaces) * len(SCALABLE_KINDS)
+  assert mock_run.call_count == 1
+  assert discovery_duration < per_namespace_duration
+
+
+def test_apply_many_maps_output_lines_to_docs(mocker):
+  mock_run = mocker.patch(
+    "devexy.utils.proc.run",
+    return_value=CompletedProcess(
+      args=["kubectl", "apply", "-f", "-"],
+      returncode=0,
+      stdout=(
+        "namespace/test-ns unchanged\n"
+        "service/api configured\n"
+        "deployment.apps/api created\n"
+      ),
+    ),
+  )
+  docs = [
+    {"apiVersion": "v1", "kind": "Namespace", "metadata": {"name": "test-ns"}},
+    _scalable_doc("Deployment", "api", "test-ns"),
+    {"apiVersion": "v1", "kind": "Service", "metadata": {"name": "api"}},
+  ]
+  assert kubectl.apply_many(docs) == [False, True, True]
+  mock_run.assert_called_once()
+  assert len(list(yaml.safe_load_all(mock_run.call_args.args[1]))) == 3
+
+
+def test_apply_many_reports_unapplied_docs_on_failure(mocker):
+  mocker.patch(
+    "devexy.utils.proc.run",
+    return_value=CompletedProcess(
+      args=["kubectl", "apply", "-f", "-"],
+      returncode=1,
+      stdout="deployment.apps/api unchanged\n",
+      stderr='Error from server (Invalid): deployments.apps "web" is invalid',
+    ),
+  )
+  docs = [
+    _scalable_doc("Deployment", "api", "test-ns"),
+    _scalable_doc("Deployment", "web", "test-ns"),
+  ]
+  assert kubectl.apply_many(docs) == [False, None]
+
+
+def test_apply_many_chunks_invocations(mocker):
+  mock_run = mocker.patch(
+    "devexy.utils.proc.run",
+    return_value=CompletedProcess(args=[], returncode=0, stdout=""),
+  )
+  docs = [_scalable_doc("Deployment", f"app-{i}", "test-ns") for i in range(5)]
+  assert kubectl.apply_many(docs, chunk_size=2) == [None] * 5
+  assert mock_run.call_count == 3
+
+
+def test_backend_follows_configured_setting():
+  settings.configure(KUBE_BACKEND="api")
+  try:
+    assert isinstance(get_kubectl(), KubeApi)
+    assert kubectl.get_namespaces.__self__ is get_kubectl()
+  finally:
+    settings.configure(KUBE_BACKEND=None)
+  assert type(get_kubectl()) is Kubectl
+  assert kubectl.get_namespaces.__self__ is get_kubectl()
@@ -0,0 +1,79 @@
+from subprocess import CompletedProcess
+
+import pytest
+
+from devexy.tools.kustomize import Kustomize, get_input_files
+
+
+@pytest.fixture
+def overlay(tmp_path):
+  base = tmp_path / "base"
+  base.mkdir()
+  (base / "kustomization.yaml").write_text("resources:\n  - deployment.yaml\n")
+  (base / "deployment.yaml").write_text("kind: Deployment\n")
+
+  overlay = tmp_path / "overlays" / "local"
+  overlay.mkdir(parents=True)
+  (overlay / "kustomization.yaml").write_text(
+    "resources:\n"
+    "  - ../../base\n"
+    "  - https://github.com/example/repo//base?ref=v1\n"
+    "patches:\n"
+    "  - path: patch.yaml\n"
+    "configMapGenerator:\n"
+    "  - name: config\n"
+    "    files:\n"
+    "      - app.conf=config/app.conf\n"
+  )
+  (overlay / "patch.yaml").write_text("kind: Deployment\n")
+  (overlay / "config").mkdir()
+  (overlay / "config" / "app.conf").write_text("debug = true\n")
+  return overlay
+
+
+@pytest.fixture
+def kustomize(tmp_path, mocker):
+  def fake_run(args, input=None):
+    stdout = "v5.0.0\n" if args[1] == "version" else "kind: Deployment\n"
+    return CompletedProcess(args=args, returncode=0, stdout=stdout)
+
+  mocker.patch("devexy.utils.proc.run", side_effect=fake_run)
+  return Kustomize(cache_dir=tmp_path / "cache")
+
+
+def test_get_input_files_follows_references(overlay):
+  files, remotes = get_input_files(overlay)
+  assert {file.name for file in files} == {
+    "kustomization.yaml",
+    "deployment.yaml",
+    "patch.yaml",
+    "app.conf",
+  }
+  assert len(files) == 5
+  assert remotes == ["https://github.com/example/repo//base?ref=v1"]
+
+
+def test_build_reuses_cached_output(kustomize, overlay, mocker):
+  spy = mocker.spy(kustomize, "exec")
+  assert kustomize.build(overlay) == "kind: Deployment\n"
+  assert kustomize.build(overlay) == "kind: Deployment\n"
+  assert spy.call_args_list.count(mocker.call("build", overlay)) == 1
+
+
+def test_fingerprint_changes_when_input_changes(kustomize, overlay):
+  fingerprint = kustomize.fingerprint(overlay)
+  (overlay.parent.parent / "base" / "deployment.yaml").write_text("kind: StatefulSet\n")
+  assert kustomize.fingerprint(overlay) != fingerprint
+
+
+def test_fingerprint_with_content_hashes(kustomize, overlay):
+  fingerprint = kustomize.fingerprint(overlay, hash_contents=True)
+  assert fingerprint != kustomize.fingerprint(overlay)
+  assert fingerprint == kustomize.fingerprint(overlay, hash_contents=True)
+
+
+def test_build_bypasses_cache(kustomize, overlay, mocker):
+  kustomize.build(overlay)
+  spy = mocker.spy(kustomize, "exec")
+  kustomize.build(overlay, use_cache=False)
+  spy.assert_called_once_with("build", overlay)
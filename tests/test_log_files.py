@@ -0,0 +1,42 @@
+import pytest
+
+from devexy.utils.log_files import follow_lines, tail_lines
+
+
+@pytest.fixture
+def log_file(tmp_path):
+  path = tmp_path / "app.log"
+  path.write_text("".join(f"line {i}\n" for i in range(1000)))
+  return path
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1024 * 1024])
+def test_tail_lines(log_file, block_size):
+  assert tail_lines(log_file, 3, block_size=block_size) == [
+    "line 997",
+    "line 998",
+    "line 999",
+  ]
+
+
+def test_tail_lines_with_short_file(tmp_path):
+  path = tmp_path / "app.log"
+  path.write_text("only\nlines")
+  assert tail_lines(path, 20) == ["only", "lines"]
+  assert tail_lines(path, 0) == []
+
+
+def test_follow_lines_drains_and_survives_rotation(log_file):
+  lines = follow_lines(log_file, min_interval=0, max_interval=0.01)
+  with open(log_file, "a") as f:
+    f.write("".join(f"burst {i}\n" for i in range(10000)))
+    f.write("partial")
+  batch = next(lines)
+  assert len(batch) == 10000
+  assert batch[-1] == "burst 9999"
+
+  log_file.rename(log_file.with_name("app.log.1"))
+  log_file.write_text("after rotation\n")
+  assert next(lines) == ["partial"]
+  assert next(lines) == ["after rotation"]
+  lines.close()
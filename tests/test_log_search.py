@@ -0,0 +1,101 @@
+import datetime
+
+import pytest
+
+from devexy.utils import log_search
+from devexy.utils.log_search import LogIndex, _open_map, parse_time, search_logs
+
+START = datetime.datetime(2025, 1, 1, 12, 0, 0)
+
+
+def _record(minute: int, logger: str, level: str, message: str) -> str:
+  timestamp = (START + datetime.timedelta(minutes=minute)).strftime(
+    "%Y-%m-%d %H:%M:%S,000"
+  )
+  return f"{timestamp} - {logger} - {level} - {message}\n"
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+  monkeypatch.setattr(log_search, "INDEX_INTERVAL", 256)
+  path = tmp_path / "app.log"
+  backup = tmp_path / "app.log.1"
+  backup.write_text(
+    "".join(_record(i, "devexy.k8s.informer", "DEBUG", f"tick {i}") for i in range(100))
+  )
+  path.write_text(
+    _record(100, "devexy.tools.kubectl", "ERROR", "apply failed")
+    + "Traceback (most recent call last):\n  boom\n"
+    + "".join(_record(101 + i, "devexy.tools", "INFO", f"ok {i}") for i in range(50))
+    + _record(151, "devexy.toolsmith", "ERROR", "apply failed elsewhere")
+  )
+  return path
+
+
+def test_parse_time():
+  assert parse_time("2025-01-01T12:30") == "2025-01-01 12:30:00,000"
+  assert parse_time("15m", now=START) == "2025-01-01 11:45:00,000"
+  with pytest.raises(ValueError):
+    parse_time("yesterday")
+
+
+def test_search_by_text_across_files(log_file):
+  records = list(search_logs(log_file, pattern="tick 99"))
+  assert records == [_record(99, "devexy.k8s.informer", "DEBUG", "tick 99").strip()]
+
+  records = list(search_logs(log_file, pattern=r"tick 9\d", regex=True))
+  assert len(records) == 10
+
+
+def test_search_returns_whole_records(log_file):
+  records = list(search_logs(log_file, pattern="boom"))
+  assert len(records) == 1
+  assert records[0].startswith("2025-01-01 13:40:00,000 - devexy.tools.kubectl")
+  assert records[0].endswith("  boom")
+
+
+def test_search_by_level_and_logger(log_file):
+  records = list(search_logs(log_file, level=40, logger_name="devexy.tools"))
+  assert len(records) == 1
+  assert "apply failed" in records[0]
+  assert len(list(search_logs(log_file, logger_name="devexy.tools"))) == 51
+
+
+def test_search_by_time_range(log_file):
+  since = parse_time("2025-01-01T12:10")
+  until = parse_time("2025-01-01T12:19")
+  records = list(search_logs(log_file, since=since, until=until))
+  assert [record.split(" - ")[-1] for record in records] == [
+    f"tick {i}" for i in range(10, 20)
+  ]
+
+
+def test_time_range_jumps_to_indexed_offset(log_file):
+  backup = log_file.with_name("app.log.1")
+  index = LogIndex(log_file.with_name("app.log.index"))
+  data = _open_map(backup)
+  entries = index.entries(backup, data)
+  assert len(entries) > 10
+  start, end = log_search._get_range(
+    entries, len(data), parse_time("2025-01-01T13:00"), None
+  )
+  assert start > len(data) // 2
+  assert end == len(data)
+  data.close()
+
+
+def test_index_survives_rotation(log_file):
+  list(search_logs(log_file, since=parse_time("2025-01-01T12:30")))
+  index_file = log_file.with_name("app.log.index")
+  assert index_file.exists()
+
+  log_file.rename(log_file.with_name("app.log.2"))
+  log_file.with_name("app.log.1").rename(log_file.with_name("app.log.3"))
+  index = LogIndex(index_file)
+  for name in ("app.log.2", "app.log.3"):
+    path = log_file.with_name(name)
+    data = _open_map(path)
+    assert index.entries(path, data)
+    data.close()
+  assert not index._changed
+  assert len(list(search_logs(log_file, pattern="tick 5"))) == 11
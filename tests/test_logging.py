@@ -0,0 +1,56 @@
+import logging
+import logging.handlers
+import queue
+import threading
+
+from devexy.utils import logging as devexy_logging
+from devexy.utils.logging import BoundedQueueHandler, get_logger
+
+
+def test_all_loggers_share_one_handler():
+  first = get_logger("devexy.test.first")
+  second = get_logger("devexy.test.second")
+  assert not first.handlers
+  assert not second.handlers
+  assert first.propagate
+  handlers = [
+    handler
+    for handler in logging.getLogger("devexy").handlers
+    if isinstance(handler, BoundedQueueHandler)
+  ]
+  assert handlers == [devexy_logging._queue_handler]
+
+
+def test_other_libraries_stay_out_of_the_log(mocker):
+  logger = get_logger("devexy.test")
+  enqueue = mocker.patch.object(devexy_logging._queue_handler, "enqueue")
+  logging.getLogger("kubernetes.client.rest").warning("response body")
+  enqueue.assert_not_called()
+  logger.warning("applied")
+  enqueue.assert_called_once()
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+  handler = BoundedQueueHandler(queue.Queue(1), timeout=0.01)
+  record = logging.LogRecord("test", logging.INFO, __file__, 1, "msg", None, None)
+  handler.handle(record)
+  handler.handle(record)
+  assert handler.queue.qsize() == 1
+  assert handler.dropped == 1
+
+
+def test_records_reach_the_writer_thread(mocker):
+  handler = BoundedQueueHandler(queue.Queue(10))
+  written = threading.Event()
+  target = logging.Handler()
+  target.emit = mocker.Mock(side_effect=lambda record: written.set())
+  listener = logging.handlers.QueueListener(handler.queue, target)
+  listener.start()
+  try:
+    handler.handle(
+      logging.LogRecord("test", logging.INFO, __file__, 1, "hi %s", ("there",), None)
+    )
+    assert written.wait(1)
+  finally:
+    listener.stop()
+  assert target.emit.call_args.args[0].getMessage() == "hi there"
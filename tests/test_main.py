@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+import pytest
+import typer
+
+from devexy.main import COMMANDS, DevexyGroup, app
+
+
+def test_startup_does_not_import_commands():
+  code = (
+    "import sys, devexy.main; "
+    "print(sorted(name for name in sys.modules if name.startswith('devexy.commands')"
+    " or name in ('blessed', 'kubernetes', 'yaml')))"
+  )
+  result = subprocess.run(
+    [sys.executable, "-c", code], capture_output=True, text=True, check=True
+  )
+  assert result.stdout.strip() == "[]"
+
+
+@pytest.mark.parametrize("cmd_name", sorted(COMMANDS))
+def test_command_help_matches_module(cmd_name):
+  group = typer.main.get_command(app)
+  assert isinstance(group, DevexyGroup)
+  command = group.load_command(cmd_name)
+  assert (command.help or "").strip().splitlines()[0] == COMMANDS[cmd_name][1]
+  assert not {"install_completion", "show_completion"} & {
+    param.name for param in command.params
+  }
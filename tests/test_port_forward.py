@@ -0,0 +1,86 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from devexy.k8s.port_forward import PortForwardSupervisor
+
+
+def _sleeper(seconds: float):
+  return lambda: subprocess.Popen(
+    [sys.executable, "-c", f"import time; time.sleep({seconds})"]
+  )
+
+
+def _wait_for(condition, timeout=5.0):
+  deadline = time.monotonic() + timeout
+  while not condition():
+    assert time.monotonic() < deadline, "timed out"
+    time.sleep(0.01)
+
+
+@pytest.fixture
+def supervisor():
+  supervisor = PortForwardSupervisor(backoff_min=0.05, backoff_max=0.2)
+  yield supervisor
+  supervisor.stop_all()
+
+
+def test_forward_starts_in_the_background(supervisor):
+  changed = threading.Event()
+  forward = supervisor.forward(
+    "ns/deployment/api", _sleeper(30), lambda _: changed.set()
+  )
+  assert changed.wait(5)
+  assert forward.is_running
+  assert forward.uptime >= 0
+  assert supervisor.forward("ns/deployment/api", _sleeper(30)) is forward
+
+
+def test_dead_forwards_are_restarted(supervisor):
+  forward = supervisor.forward("ns/deployment/api", _sleeper(0))
+  _wait_for(lambda: forward.restarts >= 2 and forward.is_running)
+  assert forward.backoff <= supervisor.backoff_max
+
+
+def test_failed_starts_are_retried(supervisor):
+  attempts = []
+
+  def start():
+    attempts.append(time.monotonic())
+    if len(attempts) < 3:
+      raise FileNotFoundError("kubectl")
+    return _sleeper(30)()
+
+  forward = supervisor.forward("ns/deployment/api", start)
+  _wait_for(lambda: forward.is_running)
+  assert forward.restarts == 2
+  assert forward.uptime is not None
+
+
+def test_stop_terminates_the_process(supervisor):
+  forward = supervisor.forward("ns/deployment/api", _sleeper(30))
+  _wait_for(lambda: forward.is_running)
+  process = forward.process
+  assert supervisor.stop("ns/deployment/api")
+  assert process.poll() is not None
+  assert supervisor.get("ns/deployment/api") is None
+  assert not supervisor.stop("ns/deployment/api")
+  time.sleep(0.3)
+  assert process.pid == forward.process.pid
+
+
+def test_stopped_forwards_are_not_restarted(supervisor, mocker):
+  changed = mocker.Mock()
+  forward = supervisor.forward("ns/deployment/api", _sleeper(30), changed)
+  _wait_for(lambda: forward.is_running)
+  changed.reset_mock()
+  supervisor.stop("ns/deployment/api")
+
+  # As the reaper would, from a snapshot taken before the stop
+  supervisor._exited(forward)
+  assert forward.restarts == 0
+  assert forward.start_at is None
+  changed.assert_not_called()
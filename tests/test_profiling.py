@@ -0,0 +1,52 @@
+import pstats
+import threading
+import time
+
+from typer.testing import CliRunner
+
+from devexy import settings
+from devexy.main import app
+from devexy.utils.profiling import Profiler
+
+
+def _spin_in_background(stop: threading.Event):
+  while not stop.is_set():
+    sum(range(1000))
+
+
+def test_profiler_samples_every_thread(tmp_path):
+  stop = threading.Event()
+  worker = threading.Thread(target=_spin_in_background, args=(stop,), name="worker")
+  profiler = Profiler(tmp_path / "run.pstats", sample_interval=0.001)
+  profiler.start()
+  worker.start()
+  time.sleep(0.1)
+  stop.set()
+  worker.join()
+
+  assert profiler.stop() == [tmp_path / "run.pstats", tmp_path / "run.collapsed"]
+  pstats.Stats(str(tmp_path / "run.pstats"))
+  stacks = (tmp_path / "run.collapsed").read_text().splitlines()
+  assert any(
+    stack.startswith("worker;") and "_spin_in_background" in stack for stack in stacks
+  )
+  assert all(stack.rsplit(" ", 1)[1].isdigit() for stack in stacks)
+
+
+def test_profile_option_without_path(tmp_path):
+  settings.configure(APP_DIR=tmp_path)
+  try:
+    result = CliRunner().invoke(app, ["--profile", "version"])
+  finally:
+    settings.configure(APP_DIR=None)
+  assert result.exit_code == 0, result.output
+  assert list((tmp_path / "profiles").glob("version-*.pstats"))
+
+
+def test_profile_option_with_path(tmp_path):
+  result = CliRunner().invoke(
+    app, [f"--profile={tmp_path / 'out'}", "--sample-interval", "0", "version"]
+  )
+  assert result.exit_code == 0, result.output
+  assert (tmp_path / "out.pstats").exists()
+  assert not (tmp_path / "out.collapsed").exists()
@@ -0,0 +1,73 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from devexy.k8s.readiness import ReadinessProber, can_connect
+
+
+def _free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+
+def _listen(port: int) -> socket.socket:
+  sock = socket.socket()
+  sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+  sock.bind(("127.0.0.1", port))
+  sock.listen()
+  return sock
+
+
+@pytest.fixture
+def prober():
+  prober = ReadinessProber(delay_min=0.005, delay_max=0.05)
+  yield prober
+  for key in list(prober._probes):
+    prober.cancel(key)
+
+
+def test_can_connect():
+  port = _free_port()
+  assert not asyncio.run(can_connect(port))
+  with _listen(port):
+    assert asyncio.run(can_connect(port))
+
+
+def test_probe_waits_until_the_port_listens(prober):
+  port = _free_port()
+  ready = threading.Event()
+  probe = prober.probe("ns/deployment/api", port, on_ready=lambda _: ready.set())
+  assert not ready.wait(0.2)
+  assert not probe.is_ready
+  assert probe.attempts > 1
+
+  with _listen(port):
+    assert ready.wait(5)
+  assert probe.is_ready
+  assert probe.ready_at <= time.time()
+  assert probe.time_to_ready >= 0.2
+
+
+def test_probing_again_replaces_the_probe(prober):
+  port = _free_port()
+  first = prober.probe("ns/deployment/api", port)
+  second = prober.probe("ns/deployment/api", port)
+  assert prober.get("ns/deployment/api") is second
+
+  with _listen(port):
+    deadline = time.monotonic() + 5
+    while not second.is_ready:
+      assert time.monotonic() < deadline, "timed out"
+      time.sleep(0.01)
+  assert not first.is_ready
+
+
+def test_cancel_forgets_the_probe(prober):
+  prober.probe("ns/deployment/api", _free_port())
+  assert prober.cancel("ns/deployment/api")
+  assert prober.get("ns/deployment/api") is None
+  assert not prober.cancel("ns/deployment/api")
@@ -4,8 +4,16 @@ from unittest.mock import patch
 
 import pytest
 
-from devexy.k8s.models.resource import Resource
-from devexy.k8s.utils import STATE_CACHE_ROOT
+from devexy import settings
+from devexy.k8s.models.resource import Resource, apply_resources
+from devexy.k8s.port_forward import PortForward
+from devexy.k8s.utils import (
+  PROXY_CONFIG_DIGEST_ANNOTATION,
+  get_resource_type,
+  get_reverse_proxy_config,
+  yaml_to_dicts,
+)
+from devexy.utils.state_store import StateStore
 from devexy.utils.text import quick_hash
 
 
@@ -79,23 +87,28 @@ def no_ports_doc():
 
 
 @pytest.fixture
-def resource_instance_factory(tmp_path):
-  original_cache_root = STATE_CACHE_ROOT
-  # Use monkeypatch from pytest to temporarily change the constant
-  mpatch = pytest.MonkeyPatch()
-  mpatch.setattr("devexy.k8s.utils.STATE_CACHE_ROOT", tmp_path)
-  mpatch.setattr("devexy.k8s.models.resource.STATE_CACHE_ROOT", tmp_path)
+def store(tmp_path, mocker):
+  store = StateStore(tmp_path / "state.db", flush_delay=0)
+  mocker.patch("devexy.k8s.models.resource.get_state_store", return_value=store)
+  yield store
+  store.close()
 
+
+@pytest.fixture
+def forwards(mocker):
+  forwards = mocker.patch("devexy.k8s.models.resource.port_forwards")
+  forwards.get.return_value = None
+  return forwards
+
+
+@pytest.fixture
+def resource_instance_factory(store, forwards):
   def _factory(doc):
     with patch("threading.Thread") as mock_thread:
       resource = Resource(doc)
       return resource
 
-  yield _factory
-
-  # Restore original cache root after test
-  mpatch.setattr("devexy.k8s.utils.STATE_CACHE_ROOT", original_cache_root)
-  mpatch.setattr("devexy.k8s.models.resource.STATE_CACHE_ROOT", original_cache_root)
+  return _factory
 
 
 @pytest.fixture
@@ -103,12 +116,6 @@ def resource(resource_instance_factory, test_doc):
   return resource_instance_factory(test_doc)
 
 
-@pytest.fixture
-def cache_file_path(resource, tmp_path):
-  filename = resource._k8s_state_file_name
-  return tmp_path / filename
-
-
 def test_resource_applied_when_hash_changes(test_doc):
   # TODO mock apply, make sure it is called
   doc1 = copy.deepcopy(test_doc)
@@ -124,60 +131,44 @@ def test_resource_applied_when_hash_changes(test_doc):
   assert quick_hash(resource1.yaml) != quick_hash(resource2.yaml)
 
 
-def test_cache_file_path_generation(resource, cache_file_path):
-  assert str(resource._k8s_state_file_path) == str(cache_file_path)
-  assert str(cache_file_path).endswith(".json")
-  assert quick_hash(resource.key) in str(cache_file_path)
-
-
-def test_load_k8s_state_when_file_does_not_exist(resource, cache_file_path):
-  assert not cache_file_path.exists()
-  assert resource._k8s_state == {}
+def test_load_k8s_state_when_not_stored(resource, store):
+  assert store.get(resource.key) is None
+  assert resource._k8s_state == {"key": resource.key}
   loaded_state = resource._load_k8s_state()
   assert loaded_state == {}
 
 
-def test_load_k8s_state_with_empty_file(resource, cache_file_path):
-  cache_file_path.touch()
-  assert cache_file_path.exists()
-  with patch("threading.Thread"):
-    resource = Resource(resource._doc)
-  assert resource._k8s_state == {}
-
-
-def test_load_k8s_state_invalid_json(resource, cache_file_path):
-  cache_file_path.write_text("this is not json")
-  assert cache_file_path.exists()
+def test_load_k8s_state_invalid_json(resource, store):
+  store._connect().execute(
+    "INSERT INTO state (key, value) VALUES (?, ?)", (resource.key, "not json")
+  )
+  store._states = None
   with patch("threading.Thread"):
     resource = Resource(resource._doc)
-  assert resource._k8s_state == {}
+  assert resource._k8s_state == {"key": resource.key}
 
 
-def test_load_k8s_state_valid_json(resource, cache_file_path):
+def test_load_k8s_state_from_store(resource, store):
   expected_state = {"last_applied_hash": "somehash123", "replicas": 5}
-  cache_file_path.write_text(json.dumps(expected_state))
-  assert cache_file_path.exists()
+  store.put(resource.key, expected_state)
   with patch("threading.Thread"):
     resource = Resource(resource._doc)
-  assert resource._k8s_state == expected_state
+  assert resource._k8s_state == {**expected_state, "key": resource.key}
 
 
-def test_dump_k8s_state(resource, cache_file_path):
+def test_dump_k8s_state(resource, store):
   test_state = {"foo": "bar", "count": 10}
   resource._k8s_state = test_state
   resource._dump_k8s_state()
-  assert cache_file_path.exists()
-  with open(cache_file_path, "r") as f:
-    saved_state = json.load(f)
-  assert saved_state == test_state
+  assert StateStore(store.path).get(resource.key) == test_state
 
 
 @patch("devexy.k8s.models.resource.kubectl")
-def test_apply_updates_cache_on_change_success(mock_kubectl, resource, cache_file_path):
+def test_apply_updates_cache_on_change_success(mock_kubectl, resource, store):
   mock_kubectl.apply.return_value = True
   resource._k8s_state = {}
 
-  current_hash = quick_hash(resource.yaml)
+  current_hash = resource.digest
   assert "last_applied_hash" not in resource._k8s_state
 
   result = resource.apply()
@@ -186,21 +177,19 @@ def test_apply_updates_cache_on_change_success(mock_kubectl, resource, cache_fil
   mock_kubectl.apply.assert_called_once_with(resource.yaml)
   assert resource._k8s_state.get("last_applied_hash") == current_hash
 
-  assert cache_file_path.exists()
-  with open(cache_file_path, "r") as f:
-    saved_state = json.load(f)
+  saved_state = StateStore(store.path).get(resource.key)
   assert saved_state.get("last_applied_hash") == current_hash
 
 
 @patch("devexy.k8s.models.resource.kubectl")
 def test_apply_does_not_update_cache_on_no_change(
-  mock_kubectl, resource, cache_file_path
+  mock_kubectl, resource, store, mocker
 ):
-  current_hash = quick_hash(resource.yaml)
+  current_hash = resource.digest
   resource._k8s_state = {"last_applied_hash": current_hash}
   resource._dump_k8s_state()
 
-  initial_mtime = cache_file_path.stat().st_mtime
+  spy = mocker.spy(store, "put")
 
   result = resource.apply()
   assert result is False
@@ -208,13 +197,11 @@ def test_apply_does_not_update_cache_on_no_change(
   mock_kubectl.apply.assert_not_called()
   assert resource._k8s_state.get("last_applied_hash") == current_hash
 
-  assert cache_file_path.stat().st_mtime == initial_mtime
+  spy.assert_not_called()
 
 
 @patch("devexy.k8s.models.resource.kubectl")
-def test_apply_does_not_update_cache_on_failure(
-  mock_kubectl, resource, cache_file_path
-):
+def test_apply_does_not_update_cache_on_failure(mock_kubectl, resource, store):
   """Test that apply does not update cache if kubectl apply fails."""
   mock_kubectl.apply.return_value = False
   initial_hash = "oldhash123"
@@ -227,8 +214,7 @@ def test_apply_does_not_update_cache_on_failure(
   mock_kubectl.apply.assert_called_once()
   assert resource._k8s_state.get("last_applied_hash") == initial_hash
 
-  with open(cache_file_path, "r") as f:
-    saved_state = json.load(f)
+  saved_state = StateStore(store.path).get(resource.key)
   assert saved_state.get("last_applied_hash") == initial_hash
 
 
@@ -252,6 +238,42 @@ def test_infer_target_port_no_ports(resource_instance_factory, no_ports_doc):
   assert resource._infer_target_port() is None
 
 
+def test_forwarding_is_supervised(resource: Resource, forwards):
+  assert resource.start_forwarding()
+  key, start = forwards.forward.call_args.args
+  assert key == resource.key
+  assert start.args == ("Deployment", "test-deploy", "test-ns", 8080, 80)
+  forwards.stop.return_value = True
+  assert resource.stop_forwarding()
+  forwards.stop.assert_called_once_with(resource.key)
+
+
+def test_forwarding_through_tunnels(resource: Resource, mocker):
+  tunnels = mocker.patch("devexy.k8s.models.resource.tunnels")
+  settings.configure(FORWARD_BACKEND="tunnel")
+  try:
+    assert resource.start_forwarding()
+  finally:
+    settings.configure(FORWARD_BACKEND=None)
+  key, local_port, _ = tunnels.forward.call_args.args
+  assert (key, local_port) == (resource.key, 8080)
+
+
+def test_restarted_forwards_are_probed_again(resource: Resource, mocker):
+  readiness = mocker.patch("devexy.k8s.models.resource.readiness")
+  forward = PortForward(resource.key, mocker.Mock())
+  forward.process = mocker.Mock(**{"poll.return_value": None})
+  forward.started_at = 12.0
+  resource._on_forward_changed(forward)
+  readiness.probe.assert_called_once_with(
+    resource.key, 8080, on_ready=resource._on_forward_ready, started_at=12.0
+  )
+
+  forward.process.poll.return_value = 1
+  resource._on_forward_changed(forward)
+  readiness.cancel.assert_called_once_with(resource.key)
+
+
 def test_get_local_port(resource: Resource):
   assert resource.get_local_port() == 8080
 
@@ -261,3 +283,127 @@ def test_reverse_proxy_yaml_generation(mock_kubectl_apply, resource: Resource):
   resource.toggle_forwarding_mode()
   assert mock_kubectl_apply.call_count == 3
   assert resource.is_proxying
+
+
+def test_reverse_proxy_reads_its_config_from_a_config_map(resource: Resource, mocker):
+  apply = mocker.patch("devexy.k8s.models.resource.kubectl.apply")
+  assert resource._inject_reverse_proxy()
+
+  config_map = next(yaml_to_dicts(apply.call_args.args[0]))
+  assert config_map["kind"] == "ConfigMap"
+  assert config_map["metadata"]["name"] == "test-deploy-devexy-proxy-config"
+  config = config_map["data"]["nginx.conf"]
+  assert "server host.minikube.internal:8080;" in config
+  assert "keepalive 64;" in config
+  assert "proxy_http_version 1.1;" in config
+
+  template = resource._doc["spec"]["template"]
+  annotations = template["metadata"]["annotations"]
+  assert annotations[PROXY_CONFIG_DIGEST_ANNOTATION] == quick_hash(config)
+  (container,) = template["spec"]["containers"]
+  assert container["image"] == settings.PROXY_IMAGE
+  assert "sh" not in container["command"]
+  (volume,) = template["spec"]["volumes"]
+  assert volume["configMap"]["name"] == config_map["metadata"]["name"]
+  assert container["volumeMounts"][0]["name"] == volume["name"]
+
+
+def test_reverse_proxy_config_follows_settings():
+  settings.configure(PROXY_BUFFERING=False, PROXY_KEEPALIVE=8, PROXY_READ_TIMEOUT=30)
+  try:
+    config = get_reverse_proxy_config(3000, container_port=8080)
+  finally:
+    settings.configure(
+      PROXY_BUFFERING=None, PROXY_KEEPALIVE=None, PROXY_READ_TIMEOUT=None
+    )
+  assert "listen 8080;" in config
+  assert "keepalive 8;" in config
+  assert "proxy_buffering off;" in config
+  assert "proxy_read_timeout 30s;" in config
+
+
+def _cluster_state(doc, resource_version="1"):
+  state = copy.deepcopy(doc)
+  state["metadata"]["resourceVersion"] = resource_version
+  state["metadata"]["annotations"] = {
+    "kubectl.kubernetes.io/last-applied-configuration": json.dumps(doc)
+  }
+  return state
+
+
+def test_observe_keeps_apply_cache_when_cluster_matches(resource, test_doc):
+  resource._record_applied(resource.digest)
+  resource.observe(_cluster_state(test_doc))
+  assert resource.is_applied
+  assert resource._k8s_state.get("resource_version") == "1"
+
+
+def test_observe_invalidates_apply_cache_on_drift(resource, test_doc):
+  resource._record_applied(resource.digest)
+  drifted = copy.deepcopy(test_doc)
+  drifted["spec"]["replicas"] = 5
+  resource.observe(_cluster_state(drifted))
+  assert not resource.is_applied
+
+
+def test_observe_invalidates_apply_cache_on_delete(resource):
+  resource._record_applied(resource.digest)
+  resource.observe(None)
+  assert not resource.is_applied
+
+
+@patch("devexy.k8s.models.resource.kubectl")
+def test_apply_resources_skips_applied_resources(
+  mock_kubectl, resource_instance_factory, test_doc, service_doc
+):
+  applied = resource_instance_factory(test_doc)
+  applied._record_applied(applied.digest)
+  pending = resource_instance_factory(service_doc)
+  mock_kubectl.apply_many.return_value = [True]
+
+  assert apply_resources([applied, pending]) == [False, True]
+
+  mock_kubectl.apply_many.assert_called_once_with([pending._doc])
+  assert pending.is_applied
+
+
+@patch("devexy.k8s.models.resource.kubectl")
+def test_apply_resources_resends_resources_changed_in_the_cluster(
+  mock_kubectl, resource_instance_factory, service_doc
+):
+  resource = resource_instance_factory(service_doc)
+  resource._record_applied(resource.digest)
+  mock_kubectl.apply_many.return_value = [True]
+
+  resource.observe(None)
+  assert apply_resources([resource]) == [True]
+  mock_kubectl.apply_many.assert_called_once_with([resource._doc])
+
+
+@patch("devexy.k8s.models.resource.kubectl")
+def test_apply_resources_without_cache_sends_everything(
+  mock_kubectl, resource_instance_factory, service_doc
+):
+  resource = resource_instance_factory(service_doc)
+  resource._record_applied(resource.digest)
+  mock_kubectl.apply_many.return_value = [True]
+
+  assert apply_resources([resource], use_cache=False) == [True]
+  mock_kubectl.apply_many.assert_called_once_with([resource._doc])
+
+
+def test_resource_type_is_qualified_by_group(test_doc, service_doc):
+  assert get_resource_type(test_doc) == "deployment.apps"
+  assert get_resource_type(service_doc) == "service"
+
+
+@patch("devexy.k8s.models.resource.kubectl")
+def test_apply_resources_retries_unreported_resources(
+  mock_kubectl, resource_instance_factory, service_doc
+):
+  resource = resource_instance_factory(service_doc)
+  mock_kubectl.apply_many.return_value = [None]
+  mock_kubectl.apply.return_value = True
+
+  assert apply_resources([resource]) == [True]
+  mock_kubectl.apply.assert_called_once_with(resource.yaml)
@@ -0,0 +1,54 @@
+import datetime
+
+from devexy.utils import serialization
+from devexy.utils.serialization import (
+  canonicalize,
+  dump_json,
+  dump_yaml,
+  load_json,
+  load_yaml,
+  load_yaml_all,
+)
+
+
+def test_canonicalize_ignores_key_order():
+  a = {"kind": "Deployment", "metadata": {"name": "api", "namespace": "test-ns"}}
+  b = {"metadata": {"namespace": "test-ns", "name": "api"}, "kind": "Deployment"}
+  assert canonicalize(a) == canonicalize(b)
+
+
+def test_canonicalize_detects_changes():
+  a = {"spec": {"replicas": 0}}
+  b = {"spec": {"replicas": 1}}
+  assert canonicalize(a) != canonicalize(b)
+
+
+def test_yaml_round_trip():
+  docs = [{"kind": "Service", "b": [1, 2]}, {"kind": "Pod", "a": {"c": "d"}}]
+  manifest = "---\n".join(dump_yaml(doc) for doc in docs)
+  assert list(load_yaml_all(manifest)) == docs
+  assert load_yaml(dump_yaml(docs[0])) == docs[0]
+
+
+def test_dump_yaml_sorts_keys():
+  assert dump_yaml({"b": 1, "a": 2}) == "a: 2\nb: 1\n"
+
+
+def test_json_round_trip():
+  doc = {"kind": "ConfigMap", "data": {"greeting": "héllo"}}
+  assert load_json(dump_json(doc)) == doc
+  assert load_json(dump_json(doc).encode("utf-8")) == doc
+
+
+def test_dump_json_accepts_non_str_keys():
+  assert (
+    dump_json({1: "a", None: "b", False: "c"}) == '{"1":"a","null":"b","false":"c"}'
+  )
+
+
+def test_canonicalize_does_not_depend_on_orjson(monkeypatch):
+  doc = {"spec": {"cpu": 0.5, "large": 1e16}, "at": datetime.date(2024, 1, 2)}
+  canonical = canonicalize(doc)
+  monkeypatch.setattr(serialization, "orjson", None)
+  assert canonicalize(doc) == canonical
+  assert canonical == b'{"at":"2024-01-02","spec":{"cpu":0.5,"large":1e+16}}'
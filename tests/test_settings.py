@@ -0,0 +1,63 @@
+import subprocess
+import sys
+
+import pytest
+
+from devexy import settings
+from devexy.settings import Settings
+
+
+def test_import_has_no_side_effects(tmp_path):
+  code = (
+    "import signal, devexy.settings, devexy.k8s.utils, devexy.utils.threading, "
+    "devexy.utils.logging; "
+    "print(signal.getsignal(signal.SIGTERM) is signal.SIG_DFL)"
+  )
+  app_dir = tmp_path / "app"
+  result = subprocess.run(
+    [sys.executable, "-c", code],
+    capture_output=True,
+    text=True,
+    check=True,
+    env={"DEVEXY_APP_DIR": str(app_dir), "PATH": ""},
+  )
+  assert result.stdout.strip() == "True"
+  assert not app_dir.exists()
+
+
+def test_reads_env_file_on_first_access(tmp_path, monkeypatch):
+  env_file = tmp_path / ".env"
+  env_file.write_text("DEVEXY_KUSTOMIZE_OVERLAY=staging\nDEVEXY_KUBE_API_POOL_SIZE=8\n")
+  instance = Settings(env_file)
+  env_file.write_text("DEVEXY_KUSTOMIZE_OVERLAY=dev\n")
+  monkeypatch.delenv("DEVEXY_KUSTOMIZE_OVERLAY", raising=False)
+  assert instance.KUSTOMIZE_OVERLAY == "dev"
+  assert instance.KUBE_API_POOL_SIZE == 4
+
+
+def test_directories_are_created_on_access(tmp_path):
+  instance = Settings(tmp_path / ".env")
+  instance.configure(APP_DIR=tmp_path / "app", KUSTOMIZE_ROOT=tmp_path / "k8s")
+  assert not (tmp_path / "app").exists()
+  state_cache_root = instance.STATE_CACHE_ROOT
+  assert state_cache_root.is_dir()
+  assert state_cache_root.parent == tmp_path / "app" / "k8s_cache"
+
+
+def test_configure_recomputes_derived_settings(tmp_path):
+  instance = Settings(tmp_path / ".env")
+  instance.configure(KUSTOMIZE_ROOT=tmp_path / "k8s", KUSTOMIZE_OVERLAY="dev")
+  assert instance.KUSTOMIZE_OVERLAY_DIR == tmp_path / "k8s" / "overlays" / "dev"
+  instance.configure(KUSTOMIZE_OVERLAY=None)
+  assert instance.KUSTOMIZE_OVERLAY_DIR == tmp_path / "k8s" / "overlays" / "local"
+  with pytest.raises(AttributeError):
+    instance.configure(NOT_A_SETTING=1)
+
+
+def test_module_reflects_configure(tmp_path):
+  settings.configure(APP_DIR=tmp_path)
+  try:
+    assert settings.APP_DIR == tmp_path
+  finally:
+    settings.configure(APP_DIR=None)
+  assert settings.APP_DIR != tmp_path
@@ -0,0 +1,59 @@
+import pytest
+
+from devexy.utils.state_store import StateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+  store = StateStore(tmp_path / "state.db", flush_delay=60)
+  yield store
+  store.close()
+
+
+def test_writes_are_buffered_until_flush(store):
+  store.put("a", {"status": "up"})
+  store.put("b", {"status": "down"})
+  assert store.get("a") == {"status": "up"}
+  assert StateStore(store.path).get("a") is None
+
+  store.flush()
+  assert StateStore(store.path).load_all() == {
+    "a": {"status": "up"},
+    "b": {"status": "down"},
+  }
+
+
+def test_flush_commits_in_one_transaction(store, mocker):
+  store.load_all()
+  connection = mocker.patch.object(store, "_connection")
+  for i in range(100):
+    store.put(f"key-{i}", {"i": i})
+  store.put("key-0", {"i": -1})
+  store.flush()
+
+  statements = [call.args[0] for call in connection.execute.call_args_list]
+  assert statements == ["BEGIN", "COMMIT"]
+  upserts = connection.executemany.call_args_list[0].args[1]
+  assert len(upserts) == 100
+  assert ("key-0", '{"i":-1}') in upserts
+
+
+def test_delete_and_clear(store):
+  store.put("a", {"i": 1})
+  store.put("b", {"i": 2})
+  store.flush()
+  store.delete("a")
+  store.flush()
+  assert StateStore(store.path).load_all() == {"b": {"i": 2}}
+
+  store.clear()
+  assert store.load_all() == {}
+  assert StateStore(store.path).load_all() == {}
+
+
+def test_flushes_after_delay(tmp_path):
+  store = StateStore(tmp_path / "state.db", flush_delay=0.01)
+  store.put("a", {"i": 1})
+  store._timer.join()
+  assert StateStore(store.path).get("a") == {"i": 1}
+  store.close()
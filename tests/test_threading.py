@@ -0,0 +1,31 @@
+import signal
+import threading
+
+from devexy.utils.threading import Cleanup
+
+
+def test_register_off_the_main_thread_skips_signal_handlers(mocker):
+  install_signal = mocker.patch("devexy.utils.threading.signal.signal")
+  cleanup = Cleanup()
+  callback = mocker.Mock()
+  errors = []
+
+  def register():
+    try:
+      cleanup.register(callback)
+    except Exception as e:
+      errors.append(e)
+
+  thread = threading.Thread(target=register)
+  thread.start()
+  thread.join()
+  assert not errors
+  install_signal.assert_not_called()
+
+  cleanup.install()
+  assert {call.args[0] for call in install_signal.call_args_list} == {
+    signal.SIGINT,
+    signal.SIGTERM,
+  }
+  cleanup.cleanup()
+  callback.assert_called_once_with()
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+from devexy.exceptions import ExecutableError, ToolError
+from devexy.tools.tool import Tool
+
+
+@pytest.fixture
+def python():
+  return Tool(sys.executable)
+
+
+def test_aexec_returns_output(python):
+  output = asyncio.run(
+    python.aexec("-c", "import sys; print(sys.stdin.read())", input="hi")
+  )
+  assert output == "hi\n"
+
+
+def test_aexec_raises_tool_error(python):
+  with pytest.raises(ToolError) as e:
+    asyncio.run(python.aexec("-c", "import sys; sys.exit('boom')"))
+  assert e.value.returncode == 1
+  assert "boom" in e.value.stderr
+  assert asyncio.run(python.aexec("-c", "exit(2)", raise_on_error=False)) is None
+
+
+def test_aexec_raises_executable_error():
+  with pytest.raises(ExecutableError):
+    asyncio.run(Tool("devexy-missing-executable").aexec("version"))
+
+
+def test_aexec_bounds_concurrency(python, mocker):
+  running = 0
+  peak = 0
+
+  async def fake_arun(args, input=None):
+    nonlocal running, peak
+    running += 1
+    peak = max(peak, running)
+    await asyncio.sleep(0.01)
+    running -= 1
+    return mocker.Mock(returncode=0, stdout="", stderr="")
+
+  mocker.patch("devexy.utils.proc.arun", side_effect=fake_arun)
+  python.concurrency = 2
+
+  async def run_all():
+    await asyncio.gather(*(python.aexec("-c", "pass") for _ in range(6)))
+
+  asyncio.run(run_all())
+  # A new event loop gets its own semaphore
+  asyncio.run(run_all())
+  assert peak == 2
+
+
+def test_cancelled_aexec_kills_process(python, tmp_path):
+  pid_file = tmp_path / "pid"
+  script = (
+    f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); "
+    "time.sleep(30)"
+  )
+
+  async def cancel_soon():
+    task = asyncio.create_task(python.aexec("-c", script))
+    while not pid_file.exists() or not pid_file.read_text():
+      await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+      await task
+
+  started = time.perf_counter()
+  asyncio.run(cancel_soon())
+  assert time.perf_counter() - started < 10
+  with pytest.raises(ProcessLookupError):
+    os.kill(int(pid_file.read_text()), 0)
+
+
+def test_astart_returns_process(python):
+  async def start():
+    process = await python.astart("-c", "print('started')", capture_output=True)
+    stdout, _ = await process.communicate()
+    return stdout
+
+  assert asyncio.run(start()) == b"started\n"
@@ -0,0 +1,117 @@
+import time
+from subprocess import CompletedProcess
+
+import pytest
+
+from devexy import settings
+from devexy.exceptions import ToolError
+from devexy.tools.kube_api import KubeApi
+from devexy.tools.tool import Tool
+from devexy.utils import tool_stats
+from devexy.utils.tool_stats import get_arg_shape, load_calls, percentile, summarize
+
+
+@pytest.fixture
+def stats_file(tmp_path):
+  # Forget records of other tests, which belong in another directory
+  tool_stats._pending.clear()
+  settings.configure(APP_DIR=tmp_path)
+  yield tmp_path / tool_stats.STATS_FILE_NAME
+  settings.configure(APP_DIR=None)
+
+
+def test_exec_records_calls(stats_file, mocker):
+  mocker.patch(
+    "devexy.utils.proc.run",
+    side_effect=[
+      CompletedProcess(args=[], returncode=0, stdout="ok\n", stderr=""),
+      CompletedProcess(args=[], returncode=1, stdout="", stderr="boom"),
+    ],
+  )
+  tool = Tool("kubectl")
+  tool.exec("get", "deployment", "-n", "ns-a", "-o=json")
+  with pytest.raises(ToolError):
+    tool.exec("apply", "-f", "-")
+
+  first, second = load_calls(stats_file)
+  assert first["tool"] == "kubectl"
+  assert first["subcommand"] == "get"
+  assert first["args"] == "_ -n _ -o=_"
+  assert first["stdout_bytes"] == 3
+  assert first["exit_code"] == 0
+  assert first["session"] == second["session"]
+  assert second["stderr_bytes"] == 4
+  assert second["exit_code"] == 1
+
+
+def test_stats_file_rolls_over(stats_file, monkeypatch):
+  monkeypatch.setattr(tool_stats, "MAX_BYTES", 500)
+  for i in range(20):
+    tool_stats.record_call("kubectl", "get", [], i)
+  tool_stats.flush()
+  assert stats_file.with_name("tool_stats.jsonl.1").exists()
+  calls = load_calls(stats_file)
+  assert 2 < len(calls) < 20
+  assert [call["duration"] for call in calls] == list(range(20 - len(calls), 20))
+
+
+def test_get_arg_shape():
+  assert get_arg_shape(["deployment,replicaset", "-A", "--output=json"]) == (
+    "_ -A --output=_"
+  )
+
+
+def test_percentile():
+  values = [float(i) for i in range(1, 101)]
+  assert percentile(values, 50) == 50
+  assert percentile(values, 95) == 95
+  assert percentile(values, 99) == 99
+  assert percentile([], 50) == 0
+
+
+def test_summarize_recent_sessions():
+  calls = [
+    {"session": "old", "tool": "kubectl", "subcommand": "get", "duration": 9.0},
+    *(
+      {
+        "session": "new",
+        "tool": "kubectl",
+        "subcommand": "get",
+        "duration": i / 100,
+        "exit_code": 0,
+      }
+      for i in range(1, 101)
+    ),
+    {"session": "new", "tool": "kubectl", "subcommand": "apply", "duration": 2.0},
+  ]
+  apply, get = summarize(calls, sessions=1)
+  assert apply["subcommand"] == "apply"
+  assert get["calls"] == 100
+  assert get["p50"] == 0.5
+  assert get["p99"] == 0.99
+  assert summarize(calls)[0]["p99"] == 2.0
+
+
+def test_records_are_written_in_the_background(stats_file, monkeypatch):
+  monkeypatch.setattr(tool_stats, "FLUSH_DELAY", 0.01)
+  tool_stats.record_call("kubectl", "get", [], 0.5)
+  assert not stats_file.exists()
+  deadline = time.monotonic() + 5
+  while not stats_file.exists():
+    assert time.monotonic() < deadline, "timed out"
+    time.sleep(0.01)
+  (call,) = load_calls(stats_file)
+  assert call["duration"] == 0.5
+
+
+def test_api_requests_are_recorded(stats_file, mocker):
+  kube_api = KubeApi()
+  kube_api._dynamic = mocker.MagicMock()
+  kube_api._dynamic.resources.get.return_value = mocker.Mock(kind="Deployment")
+  kube_api._dynamic.get.return_value = mocker.Mock(data=b'{"items": []}')
+  kube_api.get_resource_docs("deployment", "ns-a")
+
+  (call,) = load_calls(stats_file)
+  assert (call["tool"], call["subcommand"]) == ("kube-api", "get")
+  assert call["stdout_bytes"] == 13
+  assert call["exit_code"] == 0
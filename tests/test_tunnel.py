@@ -0,0 +1,198 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from devexy.k8s.tunnel import PORT_FORWARD_PROTOCOL, TunnelForwarder
+from devexy.utils.websocket import (
+  OP_BINARY,
+  WebSocket,
+  encode_frame,
+  get_accept_key,
+  read_frame,
+)
+
+
+class StandInApiServer:
+  """Speaks the port forward protocol, echoing data back upper-cased."""
+
+  def __init__(self):
+    self.streams = 0
+    self.paths = []
+    self.loop = asyncio.new_event_loop()
+    self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+    self.thread.start()
+    self.server = asyncio.run_coroutine_threadsafe(
+      asyncio.start_server(self._handle, "127.0.0.1", 0), self.loop
+    ).result(5)
+    self.port = self.server.sockets[0].getsockname()[1]
+
+  async def _handle(self, reader, writer):
+    request = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    lines = request.split("\r\n")
+    self.paths.append(lines[0].split(" ")[1])
+    headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+    writer.write(
+      (
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {get_accept_key(headers['Sec-WebSocket-Key'])}\r\n"
+        f"Sec-WebSocket-Protocol: {PORT_FORWARD_PROTOCOL}\r\n\r\n"
+      ).encode("latin-1")
+    )
+    websocket = WebSocket(reader, writer, mask=False)
+    self.streams += 1
+    port = (80).to_bytes(2, "little")
+    await websocket.send(b"\x00" + port)
+    await websocket.send(b"\x01" + port)
+    while (message := await websocket.recv()) is not None:
+      if message.startswith(b"\x00"):
+        await websocket.send(b"\x00" + message[1:].upper())
+
+  def open_stream(self):
+    return WebSocket.connect(
+      "127.0.0.1",
+      self.port,
+      "/api/v1/namespaces/ns/pods/api-0/portforward?ports=80",
+      subprotocols=[PORT_FORWARD_PROTOCOL],
+    )
+
+  def close(self):
+    self.loop.call_soon_threadsafe(self.server.close)
+    self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def _free_port() -> int:
+  with socket.socket() as s:
+    s.bind(("127.0.0.1", 0))
+    return s.getsockname()[1]
+
+
+def _wait_for(condition, timeout=5.0):
+  event = threading.Event()
+  for _ in range(int(timeout / 0.01)):
+    if condition():
+      return
+    event.wait(0.01)
+  raise AssertionError("timed out")
+
+
+@pytest.fixture
+def api_server():
+  server = StandInApiServer()
+  yield server
+  server.close()
+
+
+@pytest.fixture
+def forwarder(monkeypatch):
+  # The clients here close outright, which the tunnel only tells from a half-close
+  # once the response goes quiet
+  monkeypatch.setattr("devexy.k8s.tunnel.HALF_CLOSE_TIMEOUT", 0.2)
+  forwarder = TunnelForwarder()
+  yield forwarder
+  forwarder.stop_all()
+
+
+@pytest.mark.parametrize("length", [0, 125, 126, 70000])
+def test_frames_round_trip(length):
+  payload = bytes(range(256)) * (length // 256) + bytes(length % 256)
+
+  async def round_trip(mask):
+    reader = asyncio.StreamReader()
+    reader.feed_data(encode_frame(OP_BINARY, payload, mask=mask))
+    return await read_frame(reader)
+
+  assert asyncio.run(round_trip(True)) == (True, OP_BINARY, payload)
+  assert asyncio.run(round_trip(False)) == (True, OP_BINARY, payload)
+
+
+def test_connections_are_tunnelled_and_counted(api_server, forwarder):
+  local_port = _free_port()
+  forward = forwarder.forward(
+    "ns/deployment/api", local_port, api_server.open_stream, pool_size=1
+  )
+  _wait_for(lambda: forward.is_running and api_server.streams == 1)
+
+  for _ in range(2):
+    with socket.create_connection(("127.0.0.1", local_port), timeout=5) as client:
+      client.sendall(b"hello")
+      assert client.recv(1024) == b"HELLO"
+
+  _wait_for(lambda: forward.active == 0)
+  assert forward.connections == 2
+  assert forward.failures == 0
+  assert forward.bytes_out == forward.bytes_in == 10
+  assert forward.uptime is not None
+  assert api_server.paths[0].endswith("/pods/api-0/portforward?ports=80")
+  # The pool keeps a stream ready for the next connection
+  _wait_for(lambda: api_server.streams == 3)
+
+
+def test_responses_survive_a_half_close(api_server, forwarder):
+  local_port = _free_port()
+  forward = forwarder.forward(
+    "ns/deployment/api", local_port, api_server.open_stream, pool_size=1
+  )
+  _wait_for(lambda: forward.is_running and api_server.streams == 1)
+
+  with socket.create_connection(("127.0.0.1", local_port), timeout=5) as client:
+    client.sendall(b"hello")
+    client.shutdown(socket.SHUT_WR)
+    assert client.recv(1024) == b"HELLO"
+  assert forward.failures == 0
+
+
+def test_stop_closes_the_port(api_server, forwarder):
+  local_port = _free_port()
+  forward = forwarder.forward("ns/deployment/api", local_port, api_server.open_stream)
+  _wait_for(lambda: forward.is_running)
+  assert forwarder.stop("ns/deployment/api")
+  assert not forward.is_running
+  assert forwarder.get("ns/deployment/api") is None
+  with pytest.raises(ConnectionRefusedError):
+    socket.create_connection(("127.0.0.1", local_port), timeout=5)
+
+
+def test_failed_streams_are_counted(forwarder):
+  async def refuse():
+    raise ConnectionRefusedError("API server is down")
+
+  local_port = _free_port()
+  forward = forwarder.forward("ns/deployment/api", local_port, refuse, pool_size=0)
+  _wait_for(lambda: forward.is_running)
+  with socket.create_connection(("127.0.0.1", local_port), timeout=5) as client:
+    assert client.recv(1024) == b""
+  _wait_for(lambda: forward.failures == 1)
+
+
+def test_taken_ports_are_retried(api_server, forwarder, monkeypatch):
+  monkeypatch.setattr("devexy.k8s.tunnel.TUNNEL_BACKOFF_MIN", 0.01)
+  monkeypatch.setattr("devexy.k8s.tunnel.TUNNEL_BACKOFF_MAX", 0.05)
+  local_port = _free_port()
+  taken = socket.socket()
+  taken.bind(("127.0.0.1", local_port))
+  taken.listen()
+
+  with taken:
+    forward = forwarder.forward(
+      "ns/deployment/api", local_port, api_server.open_stream, pool_size=1
+    )
+    _wait_for(lambda: forward.restarts >= 2)
+    assert not forward.is_running
+  _wait_for(lambda: forward.is_running)
+
+
+def test_stop_ends_retries(api_server, forwarder):
+  local_port = _free_port()
+  with socket.socket() as taken:
+    taken.bind(("127.0.0.1", local_port))
+    taken.listen()
+    forward = forwarder.forward(
+      "ns/deployment/api", local_port, api_server.open_stream, pool_size=1
+    )
+    _wait_for(lambda: forward.restarts == 1)
+    assert forwarder.stop("ns/deployment/api")
+  assert forward._serving.cancelled()
+  assert not forward.is_running
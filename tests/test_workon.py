@@ -0,0 +1,437 @@
+import asyncio
+import json
+import time
+from subprocess import CompletedProcess
+from unittest.mock import MagicMock
+
+import pytest
+from blessed import Terminal
+
+from devexy import settings
+from devexy.commands.workon import (
+  ClusterTable,
+  TableIndex,
+  Viewport,
+  _aget_cluster_docs,
+  _get_last_applied_replicas,
+  _prepare_cluster,
+  _set_initial_replicas,
+  apply_cluster_config,
+  diff_frames,
+  format_duration,
+  format_latency,
+)
+from devexy.k8s.models.resource import Resource
+
+
+def _resource(kind, name, namespace, scalable=True):
+  resource = MagicMock()
+  resource.kind = kind
+  resource.namespace = namespace
+  resource.key = f"{namespace}/{kind}/{name}".lower()
+  resource.is_scalable = scalable
+  resource.resource_type = f"{kind.lower()}.apps" if scalable else kind.lower()
+  resource.forward = None
+  resource.forward_readiness = None
+  return resource
+
+
+def _cluster_doc(name, namespace, replicas):
+  last_applied = {
+    "apiVersion": "apps/v1",
+    "kind": "Deployment",
+    "metadata": {"name": name, "namespace": namespace},
+    "spec": {"replicas": replicas},
+  }
+  doc = json.loads(json.dumps(last_applied))
+  doc["metadata"]["annotations"] = {
+    "kubectl.kubernetes.io/last-applied-configuration": json.dumps(last_applied)
+  }
+  return doc
+
+
+def test_get_cluster_docs_uses_one_call_for_all_namespaces(mocker):
+  mock_run = mocker.patch(
+    "devexy.utils.proc.arun",
+    new_callable=mocker.AsyncMock,
+    return_value=CompletedProcess(
+      args=[],
+      returncode=0,
+      stdout=json.dumps(
+        {
+          "items": [
+            _cluster_doc("api", "ns-a", 1),
+            _cluster_doc("web", "ns-b", 0),
+            _cluster_doc("other", "ns-c", 1),
+          ]
+        }
+      ),
+    ),
+  )
+  resources = [
+    _resource("Deployment", "api", "ns-a"),
+    _resource("Deployment", "web", "ns-b"),
+    _resource("Service", "api", "ns-a", scalable=False),
+  ]
+
+  cluster_docs, unlisted = asyncio.run(_aget_cluster_docs(resources))
+
+  mock_run.assert_called_once()
+  assert unlisted == set()
+  assert mock_run.call_args.args[0][:3] == ["kubectl", "get", "deployment.apps,service"]
+  assert set(cluster_docs) == {"ns-a/deployment/api", "ns-b/deployment/web"}
+  assert _get_last_applied_replicas(cluster_docs) == {
+    "ns-a/deployment/api": 1,
+    "ns-b/deployment/web": 0,
+  }
+
+
+def test_get_cluster_docs_skips_query_without_resources(mocker):
+  mock_run = mocker.patch("devexy.utils.proc.arun", new_callable=mocker.AsyncMock)
+  assert asyncio.run(_aget_cluster_docs([])) == ({}, set())
+  mock_run.assert_not_called()
+
+
+def test_set_initial_replicas_from_last_applied():
+  resource = _resource("Deployment", "api", "ns-a")
+  _set_initial_replicas(resource, {"ns-a/deployment/api": 1})
+  resource.set_replicas.assert_called_once_with(1)
+
+
+def test_set_initial_replicas_defaults_to_zero():
+  resource = _resource("Deployment", "api", "ns-a")
+  _set_initial_replicas(resource, {})
+  resource.set_replicas.assert_called_once_with(0)
+
+
+def test_diff_frames_finds_changed_cells():
+  previous = [(True, ("a", "b")), (False, ("c", "d"))]
+  current = [(True, ("a", "x")), (False, ("c", "d")), (False, ("e", "f"))]
+  assert list(diff_frames(previous, current)) == [(0, 1), (2, -1)]
+
+
+def test_diff_frames_redraws_rows_when_selection_moves():
+  previous = [(True, ("a",)), (False, ("b",))]
+  current = [(False, ("a",)), (True, ("b",))]
+  assert list(diff_frames(previous, current)) == [(0, -1), (1, -1)]
+
+
+def test_cluster_table_renders_only_changes(monkeypatch):
+  monkeypatch.setattr(
+    "devexy.commands.workon.term",
+    Terminal(kind="xterm-256color", force_styling=True),
+  )
+  resource = _resource("Deployment", "api", "ns-a")
+  resource.name = "api"
+  resource.local_port = 8080
+  resource.k8s_status = {}
+  table = ClusterTable([resource])
+
+  assert table._render_frame()
+  assert table._render_frame() == ""
+  resource.k8s_status = {"availableReplicas": 1}
+  resource.is_proxying = False
+  resource.is_forwarding = True
+  output = table._render_frame()
+  assert "running" not in output
+  assert "💻 -> ☸" in output
+  assert "ns-a" not in output
+
+
+def test_cells_fill_their_columns_in_terminal_width(monkeypatch):
+  term = Terminal(kind="xterm-256color", force_styling=True)
+  monkeypatch.setattr("devexy.commands.workon.term", term)
+  resource = _resource("Deployment", "a-rather-long-deployment-name", "ns-a")
+  resource.name = "a-rather-long-deployment-name"
+  resource.local_port = 8080
+  resource.k8s_status = {"availableReplicas": 1}
+  resource.is_proxying = False
+  resource.is_forwarding = True
+  table = ClusterTable([resource])
+
+  ((_, cells),) = table._get_frame()
+  assert "💻 -> ☸" in cells[4]
+  assert [term.length(cell) for cell in cells] == [width for _, width in table.columns]
+
+
+def test_resource_changes_wake_the_table():
+  table = ClusterTable([])
+  table._dirty = False
+  Resource.add_listener(table.invalidate)
+  try:
+    Resource({"kind": "Service", "metadata": {"name": "api"}})._notify()
+  finally:
+    Resource.remove_listener(table.invalidate)
+  assert table._dirty
+
+
+def test_viewport_follows_selection():
+  viewport = Viewport(row_count=100, height=10)
+  assert viewport.visible == range(10)
+  viewport.select(15)
+  assert viewport.visible == range(6, 16)
+  viewport.select(8)
+  assert viewport.visible == range(6, 16)
+  viewport.select(3)
+  assert viewport.visible == range(3, 13)
+
+
+def test_viewport_paging_and_wrapping():
+  viewport = Viewport(row_count=25, height=10)
+  viewport.page(1)
+  assert viewport.selected == 10
+  viewport.page(5)
+  assert viewport.selected == 24
+  assert viewport.visible == range(15, 25)
+  viewport.move(1)
+  assert viewport.selected == 0
+  viewport.end()
+  assert viewport.selected == 24
+  viewport.home()
+  assert viewport.visible == range(10)
+
+
+def test_viewport_resize_keeps_selection_visible():
+  viewport = Viewport(row_count=100, height=20)
+  viewport.select(50)
+  viewport.resize(height=5)
+  assert viewport.selected in viewport.visible
+  viewport.resize(height=200)
+  assert viewport.visible == range(100)
+
+
+def test_cluster_table_formats_only_visible_rows(monkeypatch, mocker):
+  monkeypatch.setattr(
+    "devexy.commands.workon.term",
+    Terminal(kind="xterm-256color", force_styling=True),
+  )
+  resources = []
+  for i in range(2000):
+    resource = _resource("Deployment", f"app-{i}", "ns-a")
+    resource.name = f"app-{i}"
+    resource.local_port = None
+    resource.k8s_status = {}
+    resources.append(resource)
+  table = ClusterTable(resources)
+  spy = mocker.spy(table, "_get_row_values")
+
+  table._render_frame()
+  assert spy.call_count == table.body_height
+  table._select(table.viewport.end)
+  assert "app-1999" in table._render_frame()
+
+
+def _table_resource(name, namespace, port=None, status=None):
+  resource = _resource("Deployment", name, namespace)
+  resource.name = name
+  resource.local_port = port
+  resource.k8s_status = status or {}
+  return resource
+
+
+def test_table_index_updates_incrementally():
+  resources = [_table_resource(name, "ns") for name in ("c", "a", "b")]
+  index = TableIndex(resources, sort_key=lambda res: res.name)
+  assert [res.name for res in index] == ["a", "b", "c"]
+
+  resources[0].name = "0"
+  assert index.update(resources[0])
+  assert [res.name for res in index] == ["0", "a", "b"]
+  assert not index.update(resources[1])
+  assert index.position(resources[2]) == 2
+
+
+def test_table_index_search_narrows_and_widens():
+  names = ("api", "app", "web")
+  resources = [_table_resource(name, "ns") for name in names]
+  index = TableIndex(resources, search_text=lambda res: res.name)
+  index.search("a")
+  assert [res.name for res in index] == ["api", "app"]
+  index.search("AP")
+  assert [res.name for res in index] == ["api", "app"]
+  index.search("api")
+  assert [res.name for res in index] == ["api"]
+  assert index.position(resources[1]) is None
+  index.search("")
+  assert len(index) == 3
+
+
+def test_cluster_table_sorts_and_keeps_selection(monkeypatch):
+  monkeypatch.setattr(
+    "devexy.commands.workon.term",
+    Terminal(kind="xterm-256color", force_styling=True),
+  )
+  resources = [
+    _table_resource("web", "ns-b", port=8002),
+    _table_resource("api", "ns-a", port=8001),
+    _table_resource("db", "ns-a"),
+  ]
+  table = ClusterTable(resources)
+  table._select(lambda: table.viewport.move(1))
+  assert table.selected_resource.name == "api"
+
+  table.sort_by(3)
+  table._render_frame()
+  assert [res.name for res in table.index] == ["api", "web", "db"]
+  assert table.selected_resource.name == "api"
+
+  table.sort_by(3)
+  table._render_frame()
+  assert [table.index[i].name for i in range(3)] == ["db", "web", "api"]
+  assert table.selected_resource.name == "api"
+
+  resources[2].k8s_status = {"availableReplicas": 1}
+  resources[2].is_proxying = False
+  resources[2].is_forwarding = False
+  table.sort_by(4)
+  table.search("running")
+  table._render_frame()
+  assert [table.index[i].name for i in range(len(table.index))] == ["db"]
+  assert table.selected_resource.name == "db"
+
+
+def test_prepare_cluster_runs_calls_concurrently(mocker):
+  async def slow_create(namespace):
+    await asyncio.sleep(0.2)
+    return True
+
+  async def slow_discover(kinds, namespaces=None):
+    await asyncio.sleep(0.2)
+    return {"ns-a/deployment/api": _cluster_doc("api", "ns-a", 1)}
+
+  kubectl = mocker.patch("devexy.commands.workon.kubectl")
+  kubectl.acreate_namespace_if_not_exists.side_effect = slow_create
+  kubectl.adiscover_resource_docs.side_effect = slow_discover
+  resources = [
+    _resource("Deployment", "api", "ns-a"),
+    _resource("Service", "web", "ns-b", scalable=False),
+    _resource("Service", "db", "ns-c", scalable=False),
+  ]
+
+  started = time.perf_counter()
+  cluster_docs, _ = asyncio.run(_prepare_cluster(resources))
+
+  assert time.perf_counter() - started < 0.4
+  assert list(cluster_docs) == ["ns-a/deployment/api"]
+  assert sorted(
+    call.args[0] for call in kubectl.acreate_namespace_if_not_exists.call_args_list
+  ) == ["ns-a", "ns-b", "ns-c"]
+  kubectl.adiscover_resource_docs.assert_called_once_with(
+    ["deployment.apps", "service"], namespaces=["ns-a", "ns-b", "ns-c"]
+  )
+
+
+def test_prepare_cluster_tolerates_failed_query(mocker):
+  kubectl = mocker.patch("devexy.commands.workon.kubectl")
+  kubectl.acreate_namespace_if_not_exists = mocker.AsyncMock(return_value=False)
+  kubectl.adiscover_resource_docs = mocker.AsyncMock(side_effect=RuntimeError("down"))
+  resources = [_resource("Deployment", "api", "ns-a")]
+  assert asyncio.run(_prepare_cluster(resources)) == ({}, {"deployment.apps"})
+
+
+def test_get_cluster_docs_lists_each_type_when_one_is_unknown(mocker):
+  async def discover(kinds, namespaces=None):
+    if "widget" in kinds:
+      raise RuntimeError("the server doesn't have a resource type widget")
+    return {"ns-a/deployment/api": _cluster_doc("api", "ns-a", 1)}
+
+  kubectl = mocker.patch("devexy.commands.workon.kubectl")
+  kubectl.adiscover_resource_docs.side_effect = discover
+  resources = [
+    _resource("Deployment", "api", "ns-a"),
+    _resource("Widget", "thing", "ns-a", scalable=False),
+  ]
+
+  cluster_docs, unlisted = asyncio.run(_aget_cluster_docs(resources))
+
+  assert list(cluster_docs) == ["ns-a/deployment/api"]
+  assert unlisted == {"widget"}
+  assert [call.args[0] for call in kubectl.adiscover_resource_docs.call_args_list] == [
+    ["deployment.apps", "widget"],
+    ["deployment.apps"],
+    ["widget"],
+  ]
+
+
+@pytest.mark.parametrize(
+  ("unlisted", "replicas"), [({"widget"}, 1), ({"widget", "deployment.apps"}, 0)]
+)
+def test_apply_cluster_config_with_unlisted_types(mocker, tmp_path, unlisted, replicas):
+  (tmp_path / "overlays" / "local").mkdir(parents=True)
+  deployment = _resource("Deployment", "api", "ns-a")
+  widget = _resource("Widget", "thing", "ns-a", scalable=False)
+  cluster_doc = _cluster_doc("api", "ns-a", 1)
+  cluster_docs = {} if "deployment.apps" in unlisted else {deployment.key: cluster_doc}
+  mocker.patch("devexy.commands.workon.kustomize")
+  mocker.patch(
+    "devexy.commands.workon._iter_resources", return_value=iter([widget, deployment])
+  )
+  mocker.patch(
+    "devexy.commands.workon._prepare_cluster",
+    new_callable=mocker.AsyncMock,
+    return_value=(cluster_docs, unlisted),
+  )
+  mocker.patch("devexy.commands.workon.apply_resources", return_value=[True, True])
+  settings.configure(KUSTOMIZE_ROOT=tmp_path, KUSTOMIZE_OVERLAY="local")
+  try:
+    apply_cluster_config()
+  finally:
+    settings.configure(KUSTOMIZE_ROOT=None, KUSTOMIZE_OVERLAY=None)
+
+  widget.forget_applied.assert_called_once_with()
+  widget.observe.assert_not_called()
+  # A type that cannot be listed does not keep the others from starting scaled down
+  deployment.set_replicas.assert_called_once_with(replicas)
+  if replicas:
+    deployment.observe.assert_called_once_with(cluster_doc)
+  else:
+    deployment.forget_applied.assert_called_once_with()
+
+
+def test_forward_status_shows_uptime_and_restarts(mocker):
+  resource = _resource("Deployment", "api", "ns-a")
+  assert ClusterTable.get_forward_status(resource) == ""
+  resource.forward = mocker.Mock(uptime=3725.0, restarts=0)
+  assert ClusterTable.get_forward_status(resource) == "up 1h02m"
+  resource.forward = mocker.Mock(uptime=None, restarts=2)
+  assert ClusterTable.get_forward_status(resource) == "restarting ↻2"
+  assert format_duration(65) == "1m05s"
+  assert format_duration(2 * 86400 + 3600) == "2d01h"
+
+
+def test_forward_is_connecting_until_ready(mocker):
+  resource = _resource("Deployment", "api", "ns-a")
+  resource.forward = mocker.Mock(uptime=5.0, restarts=0)
+  resource.is_forward_ready = False
+  assert ClusterTable.get_forward_status(resource) == "connecting"
+  assert ClusterTable.get_ready_status(resource) == ""
+
+  ready_at = time.mktime((2026, 1, 2, 9, 30, 15, 0, 0, -1))
+  resource.is_forward_ready = True
+  resource.forward_readiness = mocker.Mock(ready_at=ready_at, time_to_ready=0.085)
+  assert ClusterTable.get_forward_status(resource) == "up 5s"
+  assert ClusterTable.get_ready_status(resource) == "09:30:15 +85ms"
+  assert format_latency(2.44) == "2.4s"
+  assert format_latency(200) == "3m20s"
+
+
+def test_prepare_cluster_cancels_query_when_namespaces_fail(mocker):
+  cancelled = []
+
+  async def slow_discover(kinds, namespaces=None):
+    try:
+      await asyncio.sleep(5)
+    except asyncio.CancelledError:
+      cancelled.append(True)
+      raise
+
+  kubectl = mocker.patch("devexy.commands.workon.kubectl")
+  kubectl.acreate_namespace_if_not_exists = mocker.AsyncMock(
+    side_effect=RuntimeError("forbidden")
+  )
+  kubectl.adiscover_resource_docs.side_effect = slow_discover
+  resources = [_resource("Deployment", "api", "ns-a")]
+
+  with pytest.raises(RuntimeError):
+    asyncio.run(_prepare_cluster(resources))
+  assert cancelled == [True]